@@ -1,19 +1,33 @@
 import streamlit as st
 import os
-import json
+import sys
 import datetime
 import time
-import openai
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Make the shared modules under src/ importable. Streamlit re-executes this
+# script on every rerun, so only add the path the first time.
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
 
-# Configure OpenAI
-openai.api_key = os.getenv("OPENAI_API_KEY", "")
+# Imported modules are cached for the life of the process, so .env is read
+# once (by config) rather than on every rerun
+import config
+from ai.model_router import default_router
+from ai.openai_client import OpenAIClient
+from ai.response_cache import ResponseCache
+from ai.semantic_cache import SemanticGoalIndex
+from ai.scheduler import GenerationScheduler
+from storage.backend import create_backend
+from tasks.job_queue import GenerationQueue
+from tasks.local_generator import STARTER_TASKS_NOTICE
+from tasks.task_generator import TASK_PROMPT, TaskGenerator
+from storage.write_buffer import WriteBehindBuffer
+from analytics.goal_stats import StatsTrackingStore, format_rate
+from monitoring.metrics import metrics
 
 # Check if API key is available
-if not openai.api_key:
+if not config.OPENAI_API_KEY:
     st.error("OpenAI API key not found. Please set it in your .env file.")
     st.stop()
 
@@ -27,142 +41,210 @@ if "goal" not in st.session_state:
 if "data_loaded" not in st.session_state:
     st.session_state.data_loaded = False
 
-# File paths
-DATA_DIR = "data"
-USER_DATA_FILE = os.path.join(DATA_DIR, "user_data.json")
+HISTORY_PAGE_SIZES = [10, 25, 50]
 
 # Utility functions
-def ensure_data_file_exists():
-    """Make sure the data directory and file exist"""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    if not os.path.exists(USER_DATA_FILE):
-        with open(USER_DATA_FILE, 'w') as f:
-            json.dump({"goals": []}, f)
-
-def load_data():
-    """Load data from file with proper error handling"""
-    ensure_data_file_exists()
-    try:
-        with open(USER_DATA_FILE, 'r') as f:
-            data = json.load(f)
-            # Ensure the data has the expected structure
-            if "goals" not in data:
-                data["goals"] = []
-            return data
-    except Exception as e:
-        st.error(f"Error loading data: {str(e)}")
-        return {"goals": []}
+@st.cache_resource
+@metrics.timed("startup.init", component="store")
+def get_store():
+    """Storage backend shared by every session in this process
 
-def save_data(data):
-    """Save data to file"""
-    ensure_data_file_exists()
-    try:
-        with open(USER_DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=4)
-        return True
-    except Exception as e:
-        st.error(f"Error saving data: {str(e)}")
-        return False
+    Task toggles are buffered and written in the background, so checkbox clicks
+    never wait on disk I/O, and every write keeps the statistics up to date.
+    """
+    backend = create_backend(config.STORAGE_BACKEND, config.USER_DATA_FILE)
+    return StatsTrackingStore(WriteBehindBuffer(backend, delay=config.WRITE_BEHIND_DELAY))
 
-def save_goal_and_tasks(goal, tasks):
-    """Save the goal and tasks for today"""
-    data = load_data()
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # Remove any existing entry for today
-    data["goals"] = [g for g in data["goals"] if g.get("date") != today]
-    
-    data["goals"].append({
-        "date": today,
-        "goal": goal,
-        "tasks": tasks
-    })
-    
-    return save_data(data)
+@st.cache_resource
+@metrics.timed("startup.init", component="openai_client")
+def get_openai_client():
+    """OpenAI client whose connection pool is shared by every session"""
+    return OpenAIClient(
+        api_key=config.OPENAI_API_KEY,
+        base_url=config.OPENAI_BASE_URL,
+        timeout=config.OPENAI_TIMEOUT,
+        max_retries=config.OPENAI_MAX_RETRIES,
+    )
+
+@st.cache_resource
+@metrics.timed("startup.init", component="scheduler")
+def get_scheduler():
+    """Admission control shared by every session, so concurrent users stay within rate limits"""
+    return GenerationScheduler(
+        get_openai_client(),
+        max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+        requests_per_minute=config.OPENAI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=config.OPENAI_TOKENS_PER_MINUTE,
+    )
+
+@st.cache_resource
+@metrics.timed("startup.init", component="response_cache")
+def get_response_cache():
+    """Cache of generated task lists shared by every session"""
+    return ResponseCache(
+        config.RESPONSE_CACHE_FILE,
+        max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+        max_disk_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+        ttl=config.RESPONSE_CACHE_TTL,
+    )
+
+@st.cache_resource
+@metrics.timed("startup.init", component="similar_goals")
+def get_similar_goals():
+    """Index of every stored goal, for reusing the tasks of a paraphrased goal"""
+    # The history is indexed on a background thread, not while the page is loading
+    index = SemanticGoalIndex(threshold=config.SIMILAR_GOAL_THRESHOLD, store=get_store())
+    index.warm()
+    return index
+
+@st.cache_resource
+def start_metrics_exporter():
+    """Export the process-wide metrics once, however many sessions there are"""
+    return metrics.start_exporter(config.METRICS_FILE, config.METRICS_EXPORT_INTERVAL, config.METRICS_PORT)
+
+@st.cache_resource
+@metrics.timed("startup.init", component="task_generator")
+def get_task_generator():
+    """Task generator shared by every session
+
+    Short goals are tried on the small model first, with the reply budget
+    sized to the goal; the full model takes over when that reply falls short.
+    """
+    router = default_router(config.TASK_MODEL_SMALL, None, TASK_PROMPT, config.TASK_MAX_TOKENS)
+    return TaskGenerator(get_scheduler(), max_tokens=config.TASK_MAX_TOKENS, cache=get_response_cache(),
+                         similar_goals=get_similar_goals(), router=router,
+                         hedge_deadline=config.HEDGE_DEADLINE)
+
+@st.cache_resource
+@metrics.timed("startup.init", component="generation_queue")
+def get_generation_queue():
+    """Generation jobs shared by every session, run off the script thread
+
+    Finished tasks are saved straight to the store, and jobs left unfinished
+    by the last run are resumed.
+    """
+    return GenerationQueue(get_task_generator(), config.GENERATION_JOBS_FILE, store=get_store(),
+                           max_workers=config.GENERATION_WORKERS).start()
+
+def today_str():
+    return datetime.datetime.now().strftime("%Y-%m-%d")
 
 def get_todays_goals_and_tasks():
     """Get today's goal and tasks with proper error handling"""
-    data = load_data()
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    # Check if data has the expected structure
-    if "goals" not in data:
+    entry = get_store().get_entry(today_str())
+    if entry is None:
         return None, []
-    
-    for entry in data["goals"]:
-        if entry.get("date") == today:
-            return entry.get("goal", ""), entry.get("tasks", [])
-    
-    return None, []
+    return entry.get("goal", ""), entry.get("tasks", [])
 
 def update_task_completion(task_index, completed):
     """Update completion status of a task"""
-    data = load_data()
-    today = datetime.datetime.now().strftime("%Y-%m-%d")
-    
-    if "goals" not in data:
+    try:
+        return get_store().set_task_completed(today_str(), task_index, completed)
+    except Exception as e:
+        st.error(f"Error saving data: {str(e)}")
         return False
-    
-    for entry in data["goals"]:
-        if entry.get("date") == today:
-            tasks = entry.get("tasks", [])
-            if isinstance(tasks, list) and 0 <= task_index < len(tasks):
-                tasks[task_index]["completed"] = completed
-                entry["tasks"] = tasks
-                return save_data(data)
-    
-    return False
 
-def generate_tasks(goal):
-    """Generate tasks using OpenAI based on the goal"""
-    if not goal:
+def count_history(start_date=None, end_date=None):
+    """Count history entries in a date range"""
+    try:
+        return get_store().count_history(start_date, end_date)
+    except Exception as e:
+        st.error(f"Error loading data: {str(e)}")
+        return 0
+
+def get_history_page(start_date, end_date, limit, offset):
+    """Load one page of history entries, newest first"""
+    try:
+        return get_store().get_history(start_date, end_date, limit=limit, offset=offset)
+    except Exception as e:
+        st.error(f"Error loading data: {str(e)}")
         return []
+
+def history_date_bounds(date_range):
+    """Turn the date range picker value into (start_date, end_date) strings"""
+    dates = [d.strftime("%Y-%m-%d") for d in date_range]
+    if len(dates) == 2:
+        return dates[0], dates[1]
+    if len(dates) == 1:
+        return dates[0], None
+    return None, None
+
+def jump_to_history_date(start_date, end_date):
+    """Move the history view to the page holding the requested date"""
+    date = st.session_state.history_jump.strip()
+    if not date:
+        return
+    # Entries on or after the date are listed before it, newest first
+    newer = count_history(max(date, start_date or date), end_date)
+    st.session_state.history_page = max(newer - 1, 0) // st.session_state.get("history_page_size", HISTORY_PAGE_SIZES[0]) + 1
+
+def render_history_entry(entry):
+    """Render a single history entry"""
+    date = entry.get("date", "")
+    goal = entry.get("goal", "")
+    tasks = entry.get("tasks", [])
     
-    prompt = (
-        f"Based on the goal: '{goal}', generate a list of 5-7 specific, measurable, "
-        f"achievable tasks for today. Make each task concrete and actionable so the user "
-        f"can check it off when completed. Return ONLY a JSON array where each element is a "
-        f"dictionary with 'task' and 'completed' keys. The 'completed' value should always be false."
-    )
+    st.markdown(f"### {date}")
+    st.markdown(f"**Goal:** {goal}")
     
+    if tasks:
+        st.markdown("**Tasks:**")
+        if isinstance(tasks, list):
+            for task in tasks:
+                if isinstance(task, dict):
+                    status = "✅" if task.get("completed", False) else "⬜"
+                    st.markdown(f"{status} {task.get('task', '')}")
+                else:
+                    st.markdown(f"- {task}")
+        else:
+            st.markdown(tasks)
+    
+    st.markdown("---")
+
+def submit_generation(goal):
+    """Queue task generation for today's goal and follow it in this session"""
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a helpful task planning assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Extract JSON content if it's wrapped in backticks
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0].strip()
-        elif "```" in content:
-            content = content.split("```")[1].strip()
-        
-        # Parse JSON
-        try:
-            tasks = json.loads(content)
-            return tasks
-        except json.JSONDecodeError:
-            # Fall back to text parsing
-            tasks = []
-            for line in content.split('\n'):
-                line = line.strip()
-                if line and (line.startswith('-') or line.startswith('•') or 
-                            line.startswith('*') or 
-                            (len(line) > 2 and line[0].isdigit() and line[1] in ['.', ')'])):
-                    task_text = line.lstrip('- •*0123456789.) ')
-                    tasks.append({"task": task_text, "completed": False})
-            return tasks
-            
+        st.session_state.generation_job = get_generation_queue().submit(goal, date=today_str())
+        st.session_state.pop("generation_seen", None)
+        return True
     except Exception as e:
-        st.error(f"Error generating tasks: {str(e)}")
-        return []
+        st.error(f"Error starting task generation: {str(e)}")
+        return False
+
+@st.fragment(run_every=1)
+def watch_generation():
+    """Show the followed generation job's tasks as they arrive, and reload today's tasks once it saves them
+
+    Runs again once stand-in tasks have been replaced by the generated ones,
+    then stops following the job.
+    """
+    job_id = st.session_state.get("generation_job")
+    job = get_generation_queue().status(job_id) if job_id else None
+    if job is not None and job["status"] in ("queued", "running"):
+        # Generation runs in the background, so the other tabs stay usable
+        st.info(f"Generating tasks for '{job['goal']}'... They are saved under "
+                "'Today's Goals & Tasks' once all are ready.")
+        for task in job["tasks"] or []:
+            st.markdown(f"⬜ {task['task']}")
+        return
+    if job is None:
+        return
+    seen = (job["status"], job["upgrade_pending"])
+    if seen == st.session_state.get("generation_seen"):
+        return
+    st.session_state.generation_seen = seen
+    if job["status"] == "failed" or not job["upgrade_pending"]:
+        del st.session_state.generation_job
+    if job["status"] == "failed":
+        st.session_state.generation_error = job["error"]
+    else:
+        st.session_state.starter_tasks = job["upgrade_pending"]
+        # The checkboxes belong to the previous task list
+        for key in [key for key in st.session_state if str(key).startswith("task_")]:
+            del st.session_state[key]
+        load_today_data()
+    # A new goal changes every tab, so rerun the whole app
+    st.rerun()
 
 def load_today_data():
     """Load today's goal and tasks into session state"""
@@ -177,27 +259,26 @@ def load_today_data():
         st.error(f"Error loading today's data: {str(e)}")
         return False
 
-# Initialize the app
-ensure_data_file_exists()
-
-# App UI
-st.title("Mental Health Goal Tracker")
-st.subheader("Set daily goals and track your progress")
-
-# Check if data should be loaded (only the first time)
-if not st.session_state.data_loaded:
-    load_today_data()
-    st.session_state.data_loaded = True
-
-# Tabs for different sections
-tab1, tab2, tab3 = st.tabs(["Today's Goals & Tasks", "Set New Goal", "History"])
+def render_latency_panel(spans, total):
+    """Sidebar breakdown of where this rerun spent its time"""
+    with st.sidebar.expander("Latency (this rerun)", expanded=True):
+        st.markdown(f"**Total:** {total * 1000:.1f} ms")
+        for name, labels, seconds in spans:
+            detail = ", ".join(f"{k}={v}" for k, v in labels.items())
+            st.text(f"{seconds * 1000:8.2f} ms  {name}" + (f" ({detail})" if detail else ""))
 
-# Tab 1: Today's Goals & Tasks
-with tab1:
+# Each tab body is a fragment: its widgets rerun only that fragment, so
+# toggling a task re-renders the task list, not the history or the stats,
+# and the work per interaction stays flat however long the history grows.
+@st.fragment
+@metrics.timed("ui.fragment", fragment="today")
+def render_todays_tasks():
     if st.session_state.goal:
         st.markdown(f"## Today's Goal\n**{st.session_state.goal}**")
         
         st.markdown("## Tasks")
+        if st.session_state.get("starter_tasks"):
+            st.caption(STARTER_TASKS_NOTICE)
         if st.session_state.current_tasks:
             for i, task in enumerate(st.session_state.current_tasks):
                 col1, col2 = st.columns([0.9, 0.1])
@@ -223,60 +304,120 @@ with tab1:
     else:
         st.info("No goal set for today. Go to 'Set New Goal' tab to create one.")
 
-# Tab 2: Set New Goal
-with tab2:
+@st.fragment
+@metrics.timed("ui.fragment", fragment="new_goal")
+def render_goal_form():
     st.markdown("## Set a New Goal for Today")
     
     new_goal = st.text_input("What's your main goal for today?")
     
     if st.button("Generate Tasks"):
         if new_goal:
-            with st.spinner("Generating tasks..."):
-                tasks = generate_tasks(new_goal)
-                
-                if tasks:
-                    st.session_state.goal = new_goal
-                    st.session_state.current_tasks = tasks
-                    if save_goal_and_tasks(new_goal, tasks):
-                        st.success("Goal and tasks created successfully!")
-                        st.experimental_rerun()
-                    else:
-                        st.error("Failed to save goal and tasks. Please try again.")
-                else:
-                    st.error("Failed to generate tasks. Please try again.")
+            if submit_generation(new_goal):
+                # Start following the job, which happens outside this fragment
+                st.rerun()
         else:
             st.warning("Please enter a goal first.")
+    
+    if "generation_error" in st.session_state:
+        st.error(f"Failed to generate tasks: {st.session_state.pop('generation_error')}")
 
-# Tab 3: History
-with tab3:
+@st.fragment
+@metrics.timed("ui.fragment", fragment="history")
+def render_history():
     st.markdown("## Goal History")
     
-    data = load_data()
-    if data and "goals" in data and data["goals"]:
-        for entry in reversed(data["goals"]):
-            date = entry.get("date", "")
-            goal = entry.get("goal", "")
-            tasks = entry.get("tasks", [])
-            
-            st.markdown(f"### {date}")
-            st.markdown(f"**Goal:** {goal}")
-            
-            if tasks:
-                st.markdown("**Tasks:**")
-                if isinstance(tasks, list):
-                    for task in tasks:
-                        if isinstance(task, dict):
-                            status = "✅" if task.get("completed", False) else "⬜"
-                            st.markdown(f"{status} {task.get('task', '')}")
-                        else:
-                            st.markdown(f"- {task}")
-                else:
-                    st.markdown(tasks)
-            
-            st.markdown("---")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        date_range = st.date_input("Date range", value=(), key="history_range")
+    start_date, end_date = history_date_bounds(date_range)
+    with col2:
+        st.text_input("Jump to date (YYYY-MM-DD)", key="history_jump",
+                      on_change=jump_to_history_date, args=(start_date, end_date))
+    with col3:
+        page_size = st.selectbox("Entries per page", HISTORY_PAGE_SIZES, key="history_page_size")
+    
+    total = count_history(start_date, end_date)
+    if total:
+        pages = (total + page_size - 1) // page_size
+        # Keep the page in range when the filter or page size shrinks the history
+        if st.session_state.get("history_page", 1) > pages:
+            st.session_state.history_page = pages
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, step=1, key="history_page")
+        
+        # Only the entries on the visible page are read and rendered
+        for entry in get_history_page(start_date, end_date, page_size, (page - 1) * page_size):
+            render_history_entry(entry)
     else:
         st.info("No history available yet.")
 
+@st.fragment
+@metrics.timed("ui.fragment", fragment="stats")
+def render_stats():
+    st.markdown("## Your Progress")
+    # Task toggles only rerun the task list, so these figures catch up on
+    # the next full rerun or when refreshed here
+    st.button("Refresh", key="stats_refresh")
+    
+    stats = get_store().goal_stats()
+    if stats["goals"]:
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Today's completion", format_rate(stats["today_rate"]))
+        col2.metric("This week's completion", format_rate(stats["week_rate"]))
+        col3.metric("Overall completion", format_rate(stats["overall_rate"]))
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Current streak", f"{stats['current_streak']} days")
+        col2.metric("Longest streak", f"{stats['longest_streak']} days")
+        col3.metric("Average tasks per goal", f"{stats['average_tasks_per_goal']:.1f}")
+        
+        st.markdown("### Weekly completion rate")
+        weeks = stats["weekly_rates"]
+        st.bar_chart({"Week of": [week for week, _ in weeks],
+                      "Completed %": [round((value or 0) * 100) for _, value in weeks]},
+                     x="Week of", y="Completed %")
+    else:
+        st.info("No statistics yet. Set a goal to get started.")
+
+start_metrics_exporter()
+rerun_started = time.perf_counter()
+rerun_spans = metrics.begin_trace()
+
+# App UI
+st.title("Mental Health Goal Tracker")
+st.subheader("Set daily goals and track your progress")
+
+# Check if data should be loaded (only the first time)
+if not st.session_state.data_loaded:
+    load_today_data()
+    st.session_state.data_loaded = True
+
+# Tabs for different sections
+tab1, tab2, tab3, tab4 = st.tabs(["Today's Goals & Tasks", "Set New Goal", "History", "Stats"])
+
+# Tab 1: Today's Goals & Tasks
+with tab1:
+    render_todays_tasks()
+
+# Tab 2: Set New Goal
+with tab2:
+    render_goal_form()
+    # Polls the generation job, showing its tasks as they are parsed, until they
+    # are saved, and replaced if they are stand-ins
+    if "generation_job" in st.session_state:
+        watch_generation()
+
+# Tab 3: History
+with tab3:
+    render_history()
+
+# Tab 4: Stats
+with tab4:
+    render_stats()
+
 # Footer
 st.markdown("---")
-st.markdown("### Mental Health Goal Tracker - POC")
\ No newline at end of file
+st.markdown("### Mental Health Goal Tracker - POC")
+
+metrics.end_trace()
+if config.SHOW_LATENCY_PANEL:
+    render_latency_panel(rerun_spans, time.perf_counter() - rerun_started)
\ No newline at end of file
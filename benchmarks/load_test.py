@@ -0,0 +1,369 @@
+"""Simulate many concurrent app sessions against one data file.
+
+Each session behaves like a Streamlit user: it sets goals (streaming tasks
+from a local fake of the OpenAI API), toggles tasks and pages through its
+history, through the same stack app.py uses -- a storage backend behind a
+write-behind buffer and a scheduled, cached task generator, shared by every
+session in a process. Sessions can be spread over several processes, like
+several app servers sharing one data directory.
+
+When the run ends, every session's last write is read back through a fresh
+backend (a mismatch is a lost update) and the data files are checked for
+damage. The run exits non-zero if either check fails.
+
+    python benchmarks/load_test.py --sessions 50 --processes 4 --duration 30
+    python benchmarks/load_test.py --backend sqlite --mix goal=1 toggle=8 history=3
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai.fake_server import FakeOpenAIServer
+from ai.openai_client import OpenAIClient
+from ai.response_cache import ResponseCache
+from ai.scheduler import GenerationScheduler
+from run_benchmarks import print_results, summarize
+from storage.backend import create_backend
+from storage.data_cache import shared_cache
+from storage.history_index import HistoryIndex
+from storage.write_buffer import WriteBehindBuffer
+from synthetic import GOALS, write_dataset
+from tasks.task_generator import TaskGenerator
+
+OPERATIONS = ("goal", "toggle", "history")
+
+
+def session_user(session):
+    return f"session-{session}"
+
+
+def session_dates(days):
+    """The dates a session writes to: today and the `days - 1` days before it"""
+    today = datetime.date.today()
+    return [(today - datetime.timedelta(days=n)).strftime("%Y-%m-%d") for n in range(days)]
+
+
+class Session:
+    """One simulated user, remembering the last state it wrote for each date"""
+
+    def __init__(self, number, store, generator, args, deadline):
+        self.user = session_user(number)
+        self.store = store
+        self.generator = generator
+        self.args = args
+        self.deadline = deadline
+        self.rng = random.Random(args.seed * 100003 + number)
+        self.dates = session_dates(args.days_per_session)
+        self.expected = {}
+        self.samples = {op: [] for op in OPERATIONS}
+        self.errors = {}
+        self.stale_reads = 0
+
+    def run(self):
+        ops, weights = zip(*self.args.mix.items())
+        done = 0
+        while time.monotonic() < self.deadline and (not self.args.operations or done < self.args.operations):
+            op = self.rng.choices(ops, weights)[0]
+            if op == "toggle" and not self._toggleable():
+                op = "goal"
+            start = time.perf_counter()
+            try:
+                getattr(self, op)()
+            except Exception as e:
+                self.errors.setdefault(op, []).append(f"{type(e).__name__}: {e}")
+            else:
+                self.samples[op].append(time.perf_counter() - start)
+            done += 1
+            if self.args.think:
+                time.sleep(self.rng.expovariate(1 / self.args.think))
+
+    def _toggleable(self):
+        return [date for date, entry in self.expected.items() if entry["tasks"]]
+
+    def goal(self):
+        date = self.rng.choice(self.dates)
+        goal = self.rng.choice(GOALS)
+        if self.rng.random() < self.args.unique_goals:
+            # A goal no one has asked for, so it misses the response cache
+            goal = f"{goal} ({self.user} #{self.rng.randrange(10 ** 9)})"
+        tasks = list(self.generator.stream_tasks(goal))
+        if not tasks:
+            raise RuntimeError("no tasks generated")
+        if not self.store.save_goal_and_tasks(date, goal, tasks, self.user):
+            raise RuntimeError("save_goal_and_tasks failed")
+        self.expected[date] = {"goal": goal, "tasks": [dict(task) for task in tasks]}
+
+    def toggle(self):
+        date = self.rng.choice(self._toggleable())
+        tasks = self.expected[date]["tasks"]
+        # A burst of checkbox clicks, as when ticking off several tasks in a row
+        for _ in range(self.rng.randint(1, 3)):
+            index = self.rng.randrange(len(tasks))
+            completed = not tasks[index]["completed"]
+            if not self.store.set_task_completed(date, index, completed, self.user):
+                raise RuntimeError("set_task_completed failed")
+            tasks[index]["completed"] = completed
+
+    def history(self):
+        total = self.store.count_history(user=self.user)
+        offset = self.rng.randrange(max(total - 10, 0) + 1)
+        self.store.get_history(limit=10, offset=offset, user=self.user)
+        if self.expected:
+            # This session's own writes must be visible to it straight away
+            date = self.rng.choice(list(self.expected))
+            if not same_state(self.store.get_entry(date, self.user), self.expected[date]):
+                self.stale_reads += 1
+
+
+def same_state(entry, expected):
+    if entry is None or entry.get("goal") != expected["goal"]:
+        return False
+    tasks = entry.get("tasks")
+    if not isinstance(tasks, list) or len(tasks) != len(expected["tasks"]):
+        return False
+    return all(isinstance(got, dict) and got.get("task") == want["task"]
+               and bool(got.get("completed")) == want["completed"]
+               for got, want in zip(tasks, expected["tasks"]))
+
+
+def run_worker(sessions, args, base_url, data_file):
+    """Run `sessions` as threads sharing one store and generator, like one app process"""
+    store = WriteBehindBuffer(create_backend(args.backend, data_file), delay=args.write_delay)
+    client = OpenAIClient("load-test", base_url=base_url)
+    scheduler = GenerationScheduler(client, max_concurrency=args.llm_concurrency,
+                                    requests_per_minute=10 ** 9, tokens_per_minute=10 ** 12)
+    generator = TaskGenerator(scheduler, cache=ResponseCache())
+    deadline = time.monotonic() + args.duration
+    runs = [Session(number, store, generator, args, deadline) for number in sessions]
+    threads = [threading.Thread(target=run.run, name=run.user) for run in runs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Pending toggles must reach the file before the checks read it back
+    store.close()
+    scheduler.close()
+    result = {"samples": {op: [] for op in OPERATIONS}, "errors": {}, "stale_reads": 0, "expected": {},
+              "coalesced": generator.in_flight.stats()["coalesced"]}
+    for run in runs:
+        for op, samples in run.samples.items():
+            result["samples"][op] += samples
+        for op, errors in run.errors.items():
+            result["errors"].setdefault(op, []).extend(errors)
+        result["stale_reads"] += run.stale_reads
+        result["expected"][run.user] = run.expected
+    return result
+
+
+def _worker_main(sessions, args, base_url, data_file, results):
+    try:
+        results.put(run_worker(sessions, args, base_url, data_file))
+    except Exception as e:
+        results.put({"failed": f"{type(e).__name__}: {e}"})
+
+
+def run_processes(args, base_url, data_file):
+    groups = [list(range(args.sessions))[n::args.processes] for n in range(args.processes)]
+    if args.processes == 1:
+        return [run_worker(groups[0], args, base_url, data_file)]
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_worker_main, args=(group, args, base_url, data_file, results))
+               for group in groups if group]
+    for worker in workers:
+        worker.start()
+    # Drain the queue before joining, or a large result can block its sender
+    collected = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    failed = [r["failed"] for r in collected if "failed" in r]
+    if failed:
+        raise RuntimeError(f"worker process failed: {failed[0]}")
+    return collected
+
+
+def find_lost_updates(backend, expected):
+    """Compare each session's last write with what a fresh backend reads back"""
+    lost = []
+    checked = 0
+    for user, dates in expected.items():
+        for date, state in dates.items():
+            checked += 1
+            entry = backend.get_entry(date, user)
+            if not same_state(entry, state):
+                lost.append({"user": user, "date": date, "expected": state, "found": entry})
+    return checked, lost
+
+
+def check_files(kind, data_file, users):
+    """Return a list of problems found in the data files left by the run"""
+    problems = []
+    if kind == "journal":
+        base = os.path.splitext(data_file)[0]
+        try:
+            with open(data_file) as f:
+                data = json.load(f)
+            if not isinstance(data.get("goals"), list):
+                problems.append("snapshot has no goals list")
+        except ValueError as e:
+            problems.append(f"snapshot is not valid JSON: {e}")
+        journal_file = base + ".journal"
+        if os.path.exists(journal_file):
+            with open(journal_file, 'rb') as f:
+                chunk = f.read()
+            if chunk and not chunk.endswith(b"\n"):
+                problems.append("journal ends with a partial record")
+            for number, line in enumerate(chunk.splitlines(), 1):
+                try:
+                    record = json.loads(line)
+                    if "op" not in record or ("date" not in record and record["op"] != "generation"):
+                        problems.append(f"journal line {number} is not a record")
+                except ValueError:
+                    problems.append(f"journal line {number} is not valid JSON")
+        if os.path.exists(base + ".index") and HistoryIndex.load(base + ".index") is None:
+            problems.append("history index is unreadable")
+    else:
+        conn = sqlite3.connect(os.path.splitext(data_file)[0] + ".db")
+        try:
+            result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                problems.append(f"integrity_check: {result}")
+            if conn.execute("PRAGMA foreign_key_check").fetchone() is not None:
+                problems.append("foreign_key_check found orphaned rows")
+        finally:
+            conn.close()
+    # Whatever is on disk must still load through the normal code path
+    shared_cache.clear()
+    backend = create_backend(kind, data_file)
+    try:
+        for user in users:
+            backend.load_all(user)
+    except Exception as e:
+        problems.append(f"load_all failed: {type(e).__name__}: {e}")
+    finally:
+        backend.close()
+    return problems
+
+
+def parse_mix(pairs):
+    mix = {}
+    for pair in pairs:
+        op, _, weight = pair.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation {op!r}; use one of {', '.join(OPERATIONS)}")
+        mix[op] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--processes", type=int, default=1, help="app processes the sessions are spread over")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--operations", type=int, default=0, help="stop each session after this many operations")
+    parser.add_argument("--backend", choices=["journal", "sqlite"], default="journal")
+    parser.add_argument("--history", type=int, default=365, help="days of synthetic history per session")
+    parser.add_argument("--days-per-session", type=int, default=3, help="recent dates each session writes to")
+    parser.add_argument("--mix", nargs="+", default=["goal=1", "toggle=6", "history=3"],
+                        help="relative operation weights, e.g. goal=1 toggle=6 history=3")
+    parser.add_argument("--unique-goals", type=float, default=0.5, help="share of goals that miss the cache")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause between operations in seconds")
+    parser.add_argument("--write-delay", type=float, default=1.0, help="write-behind delay for task toggles")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="generations in flight per process")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="fake LLM delay between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    args = parser.parse_args()
+    args.mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory(prefix="mental-health-load-") as workdir:
+        data_file = os.path.join(workdir, "user_data.json")
+        users = [session_user(n) for n in range(args.sessions)]
+        print(f"Writing {args.history} days of history for {args.sessions} sessions...")
+        write_dataset(data_file, args.history, seed=args.seed, users=users)
+        # Build the files (and run any import) once, before workers race to do it
+        create_backend(args.backend, data_file).close()
+
+        print(f"Running {args.sessions} sessions in {args.processes} process(es) "
+              f"against the {args.backend} backend for {args.duration:g}s...")
+        with FakeOpenAIServer(latency=args.latency, token_latency=args.token_latency) as server:
+            start = time.perf_counter()
+            workers = run_processes(args, server.base_url, data_file)
+            elapsed = time.perf_counter() - start
+            llm_requests = server.requests
+
+        samples = {op: [] for op in OPERATIONS}
+        errors, expected, stale_reads, coalesced = {}, {}, 0, 0
+        for result in workers:
+            for op, values in result["samples"].items():
+                samples[op] += values
+            for op, messages in result["errors"].items():
+                errors.setdefault(op, []).extend(messages)
+            expected.update(result["expected"])
+            stale_reads += result["stale_reads"]
+            coalesced += result["coalesced"]
+
+        shared_cache.clear()
+        backend = create_backend(args.backend, data_file)
+        checked, lost = find_lost_updates(backend, expected)
+        backend.close()
+        problems = check_files(args.backend, data_file, users)
+
+    results = {f"load/{op}": summarize(values) for op, values in samples.items() if values}
+    completed = sum(len(values) for values in samples.values())
+    failed = sum(len(messages) for messages in errors.values())
+    print_results(results)
+    print(f"\nThroughput: {completed / elapsed:.1f} ops/s ({completed} ops in {elapsed:.1f}s, "
+          f"{llm_requests} LLM requests, {coalesced} generations coalesced)")
+    print(f"Errors: {failed}")
+    for op, messages in errors.items():
+        print(f"  {op}: {len(messages)} (first: {messages[0]})")
+    print(f"Stale reads: {stale_reads}")
+    print(f"Lost updates: {len(lost)} of {checked} (user, date) entries")
+    for example in lost[:3]:
+        print(f"  {example['user']} {example['date']}: expected {example['expected']}, found {example['found']}")
+    print(f"File problems: {len(problems)}")
+    for problem in problems[:10]:
+        print(f"  {problem}")
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+            "throughput_ops_per_sec": completed / elapsed,
+            "llm_requests": llm_requests,
+            "coalesced_generations": coalesced,
+            "errors": {op: len(messages) for op, messages in errors.items()},
+            "stale_reads": stale_reads,
+            "lost_updates": len(lost),
+            "entries_checked": checked,
+            "file_problems": problems,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nReport written to {args.output}")
+    if lost or problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
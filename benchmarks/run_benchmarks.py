@@ -0,0 +1,220 @@
+"""Benchmark storage, goal handling, parsing and task generation.
+
+Generates synthetic user_data.json histories, runs each operation against
+them and reports latency percentiles and throughput. Task generation goes to
+a local fake of the OpenAI API, so no network or API key is needed.
+
+    python benchmarks/run_benchmarks.py --sizes 1 1000 100000 --output results.json
+    python benchmarks/run_benchmarks.py --output new.json --compare results.json
+
+With --compare the run exits non-zero if any operation's median got slower
+by more than --threshold (default 20%).
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai.fake_server import FakeOpenAIServer
+from ai.model_router import default_router
+from ai.openai_client import OpenAIClient
+from goals.goal_handler import GoalHandler
+from storage.backend import create_backend
+from storage.data_cache import shared_cache
+from synthetic import write_dataset
+from tasks.task_generator import TASK_PROMPT, TaskGenerator
+from tasks.task_parser import parse_tasks
+
+
+def percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    index = min(int(round(q * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "mean_ms": total / len(ordered) * 1000,
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p90_ms": percentile(ordered, 0.90) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "max_ms": ordered[-1] * 1000,
+        "ops_per_sec": len(ordered) / total if total else 0.0,
+    }
+
+
+def measure(fn, iterations, before=None):
+    """Time `fn` `iterations` times; `before` runs untimed ahead of each call"""
+    samples = []
+    for i in range(iterations):
+        if before is not None:
+            before(i)
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_storage(kind, days, iterations, workdir):
+    data_file = write_dataset(os.path.join(workdir, f"{kind}_{days}", "user_data.json"), days, seed=days)
+    store = create_backend(kind, data_file)
+    today = datetime.date.today()
+    results = {}
+    cold = max(3, iterations // 10)
+
+    def cold_reset(i):
+        shared_cache.clear()
+
+    results["load_data_cold"] = measure(lambda i: create_backend(kind, data_file).load_all(), cold, cold_reset)
+    store.load_all()
+    results["load_data_warm"] = measure(lambda i: store.load_all(), iterations)
+    results["get_entry"] = measure(lambda i: store.get_entry(today.strftime("%Y-%m-%d")), iterations)
+    results["history_first_page"] = measure(lambda i: store.get_history(limit=10), iterations)
+    results["history_middle_page"] = measure(lambda i: store.get_history(limit=10, offset=days // 2), iterations)
+    results["count_history"] = measure(lambda i: store.count_history(), iterations)
+
+    tasks = [{"task": f"Task {n}", "completed": False} for n in range(6)]
+    future = today + datetime.timedelta(days=1)
+    results["save_goal_and_tasks"] = measure(
+        lambda i: store.save_goal_and_tasks((future + datetime.timedelta(days=i)).strftime("%Y-%m-%d"),
+                                            "Benchmark goal", tasks),
+        iterations,
+    )
+    toggle_date = future.strftime("%Y-%m-%d")
+    results["update_task_completion"] = measure(
+        lambda i: store.set_task_completed(toggle_date, i % len(tasks), i % 2 == 0), iterations
+    )
+
+    handler = GoalHandler(store)
+    results["goal_handler.get_todays_goals_and_tasks"] = measure(
+        lambda i: handler.get_todays_goals_and_tasks(), iterations
+    )
+    results["goal_handler.get_history_page"] = measure(lambda i: handler.get_history_page(0, 10), iterations)
+    results["goal_handler.get_goals_history"] = measure(lambda i: handler.get_goals_history(), cold)
+    store.close()
+    return {f"{kind}/{days}/{op}": summarize(samples) for op, samples in results.items()}
+
+
+def bench_generation(latency, token_latency, iterations):
+    results = {}
+    with FakeOpenAIServer(latency=latency, token_latency=token_latency) as server:
+        client = OpenAIClient("benchmark", base_url=server.base_url)
+        generator = TaskGenerator(client)
+        results["generate_tasks"] = measure(lambda i: generator.generate_tasks(f"goal {i}"), iterations)
+        first_task = []
+
+        def stream(i):
+            start = time.perf_counter()
+            tasks = generator.stream_tasks(f"goal {i}")
+            next(tasks)
+            first_task.append(time.perf_counter() - start)
+            list(tasks)
+
+        results["stream_tasks"] = measure(stream, iterations)
+        results["stream_tasks_first_task"] = first_task
+        routed = TaskGenerator(client, router=default_router("small", None, TASK_PROMPT))
+        results["generate_tasks_routed"] = measure(lambda i: routed.generate_tasks(f"goal {i}"), iterations)
+        reply = client.call_openai("goal: 'benchmark'")
+        client.close()
+    results["parse_tasks"] = measure(lambda i: parse_tasks(reply), iterations * 20)
+
+    # One reply in ten is ten times slower; hedging caps the wait at twice the usual latency
+    rng = random.Random(0)
+    with FakeOpenAIServer(latency=lambda: latency * (10 if rng.random() < 0.1 else 1),
+                          token_latency=token_latency) as server:
+        client = OpenAIClient("benchmark", base_url=server.base_url)
+        hedged = TaskGenerator(client, hedge_deadline=latency * 2)
+        first_task = []
+
+        def hedge(i):
+            generation = hedged.hedge(f"goal {i}")
+            generation.result()
+            first_task.append(generation.time_to_first_task)
+
+        results["hedged_tasks"] = measure(hedge, iterations)
+        results["hedged_tasks_first_task"] = first_task
+        client.close()
+    return {f"generation/{op}": summarize(samples) for op, samples in results.items()}
+
+
+def compare(old, new, threshold):
+    """Print median changes between two result files; return the regressed operations"""
+    regressions = []
+    print(f"\n{'operation':60} {'old p50':>10} {'new p50':>10} {'change':>8}")
+    for name, current in sorted(new["results"].items()):
+        previous = old["results"].get(name)
+        if previous is None or not previous["p50_ms"]:
+            continue
+        change = current["p50_ms"] / previous["p50_ms"] - 1
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:60} {previous['p50_ms']:10.3f} {current['p50_ms']:10.3f} {change:+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def print_results(results):
+    print(f"\n{'operation':60} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'ops/s':>10}")
+    for name, summary in results.items():
+        print(f"{name:60} {summary['p50_ms']:10.3f} {summary['p90_ms']:10.3f} "
+              f"{summary['p99_ms']:10.3f} {summary['ops_per_sec']:10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 1000, 10000], help="days of history")
+    parser.add_argument("--backends", nargs="+", default=["journal", "sqlite"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency in seconds")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="fake LLM delay between streamed chunks")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50 slowdown before failing")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="mental-health-bench-") as workdir:
+        for kind in args.backends:
+            for days in args.sizes:
+                print(f"Benchmarking {kind} storage with {days} days of history...")
+                results.update(bench_storage(kind, days, args.iterations, workdir))
+    print("Benchmarking task generation against the fake LLM...")
+    results.update(bench_generation(args.latency, args.token_latency, max(5, args.iterations // 5)))
+    print_results(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), report, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} operation(s) regressed by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
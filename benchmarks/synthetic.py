@@ -0,0 +1,62 @@
+import datetime
+import json
+import os
+import random
+
+GOALS = [
+    "Exercise more", "Drink more water", "Finish my project report", "Sleep earlier",
+    "Read for 30 minutes", "Call my family", "Meditate every morning", "Clean the apartment",
+    "Study for the exam", "Cook a healthy dinner", "Go for a run", "Practice gratitude",
+]
+TASKS = [
+    "Take a 10 minute walk outside", "Drink a glass of water", "Write three things you are grateful for",
+    "Stretch for 5 minutes", "Put your phone away at 10pm", "Prepare tomorrow's clothes",
+    "Read one chapter", "Reply to one important email", "Tidy your desk", "Plan tomorrow's meals",
+    "Spend 25 minutes on the hardest task first", "Text a friend you haven't spoken to",
+]
+
+
+def make_entry(rng, date, user=None):
+    """One day of history in one of the shapes the app has stored over time"""
+    goal = rng.choice(GOALS)
+    count = rng.choice([0, 3, 5, 5, 6, 7, 10])
+    texts = rng.sample(TASKS, min(count, len(TASKS)))
+    shape = rng.random()
+    if shape < 0.8:
+        tasks = [{"task": text, "completed": rng.random() < 0.5} for text in texts]
+    elif shape < 0.9:
+        # Raw model output saved before tasks were structured
+        tasks = "\n".join(f"{i}. {text}" for i, text in enumerate(texts, 1))
+    else:
+        tasks = list(texts)
+    entry = {"date": date, "goal": goal, "tasks": tasks}
+    if user is not None:
+        entry["user"] = user
+    return entry
+
+
+def make_history(days, seed=0, end=None, users=None):
+    """Deterministic {"goals": [...]} covering `days` days up to `end` (default today)"""
+    rng = random.Random(seed)
+    end = end or datetime.date.today()
+    goals = []
+    for offset in range(days - 1, -1, -1):
+        date = (end - datetime.timedelta(days=offset)).strftime("%Y-%m-%d")
+        for user in users or [None]:
+            goals.append(make_entry(rng, date, user))
+    return {"goals": goals}
+
+
+def write_dataset(path, days, seed=0, users=None):
+    """Write a synthetic user_data.json, removing any store files derived from an old one"""
+    base = os.path.splitext(path)[0]
+    for suffix in (".journal", ".index", ".lock", ".db", ".db-wal", ".db-shm"):
+        if os.path.exists(base + suffix):
+            os.remove(base + suffix)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        # The format the app originally wrote
+        json.dump(make_history(days, seed, users=users), f, indent=4)
+    return path
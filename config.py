@@ -6,8 +6,33 @@ load_dotenv()
 
 # Store your configuration settings here
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")  # Get API key from environment variable
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")  # Point at a local stand-in for testing
+OPENAI_TIMEOUT = 30.0  # Overall deadline per request in seconds, retries included
+OPENAI_MAX_RETRIES = 3
+OPENAI_MAX_CONCURRENCY = 4  # Generations in flight at once
+OPENAI_REQUESTS_PER_MINUTE = 500  # Keep below the account's RPM limit
+OPENAI_TOKENS_PER_MINUTE = 10000  # Keep below the account's TPM limit
+TASK_MODEL_SMALL = os.getenv("TASK_MODEL_SMALL", "gpt-4o-mini")  # Tried first for short goals; "" sends every goal to gpt-4
+TASK_MAX_TOKENS = 800  # Ceiling on a task list reply; the budget per goal is estimated below it
+GENERATION_JOBS_FILE = "data/jobs.db"  # Queued and finished generation jobs; unfinished ones resume on restart
+GENERATION_WORKERS = 2  # Generation jobs run at once; the rest wait in the queue
+HEDGE_DEADLINE = 4.0  # Seconds to wait for the model before showing built-in tasks; None always waits
 DEFAULT_ALARM_TIME = "09:00"
+ALARM_DB_FILE = "data/alarms.db"  # Alarms and their firings, shared by every app process
+PREGENERATE_TASKS = True  # Prepare tasks for the likely goal shortly before each alarm
+PREGENERATE_LEAD_TIME = 15 * 60  # Seconds before the alarm to start preparing
 USER_DATA_FILE = "data/user_data.json"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "journal")  # "journal" or "sqlite"
+WRITE_BEHIND_DELAY = 1.0  # Seconds to coalesce task toggles before writing them
+RESPONSE_CACHE_FILE = "data/response_cache.db"  # Generated tasks by goal; survives restarts
+RESPONSE_CACHE_TTL = 7 * 24 * 3600  # Seconds before a cached task list is regenerated
+RESPONSE_CACHE_MAX_ENTRIES = 256  # Task lists kept in memory
+RESPONSE_CACHE_MAX_BYTES = 16 * 1024 * 1024  # Size limit of the on-disk cache
+SIMILAR_GOAL_THRESHOLD = 0.8  # Cosine similarity above which an earlier goal's tasks are reused
+METRICS_FILE = "data/metrics.prom"  # Prometheus text format; use a .json name for JSON
+METRICS_EXPORT_INTERVAL = 15  # Seconds between rewrites of METRICS_FILE
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # Serve /metrics on this port; 0 turns it off
+SHOW_LATENCY_PANEL = os.getenv("SHOW_LATENCY_PANEL", "") == "1"  # Per-rerun timings in the Streamlit sidebar
 
 # Validate API key is available
 if not OPENAI_API_KEY:
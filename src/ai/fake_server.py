@@ -0,0 +1,155 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def default_responder(messages):
+    """Deterministic task list built from the goal quoted in the prompt"""
+    prompt = messages[-1]["content"] if messages else ""
+    match = re.search(r"goal: '(.*?)'", prompt, re.S)
+    goal = match.group(1) if match else "your goal"
+    tasks = [
+        f"Write down why '{goal}' matters to you",
+        f"Spend 15 minutes on the first step towards '{goal}'",
+        "Take a 10 minute walk outside",
+        "Drink a glass of water and stretch",
+        f"Tell someone about your progress on '{goal}'",
+    ]
+    return json.dumps([{"task": t, "completed": False} for t in tasks])
+
+
+class FakeOpenAIServer:
+    """Local stand-in for the chat completions endpoint.
+
+    Serves POST /v1/chat/completions over keep-alive HTTP/1.1 with configurable
+    latency (seconds, or a callable returning seconds) and a random error rate, so
+    the client, benchmarks and load tests can run without the network. The first
+    `fail_first` requests always fail, for deterministic retry tests. Streaming
+    requests get server-sent events of `chunk_size` characters each, spaced
+    `token_latency` seconds apart. Use as a context manager or call
+    start()/stop(); `base_url` is what OpenAIClient takes.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 error_status=503, responder=default_responder, seed=None,
+                 token_latency=0.0, chunk_size=4, fail_first=0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.chunk_size = chunk_size
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.responder = responder
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_outcome(self):
+        with self._lock:
+            self.requests += 1
+            failed = self.requests <= self.fail_first or self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            latency = self.latency() if callable(self.latency) else self.latency
+        return failed, latency
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle hold the body back
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                failed, latency = server._next_outcome()
+                if latency:
+                    time.sleep(latency)
+                if failed:
+                    self._send_json(server.error_status, {"error": {"message": "Injected failure"}})
+                    return
+                content = server.responder(payload.get("messages", []))
+                if payload.get("stream"):
+                    try:
+                        self._send_stream(content, payload.get("model"))
+                    except ConnectionError:
+                        # The client stopped reading part way through
+                        self.close_connection = True
+                    return
+                self._send_json(200, {
+                    "id": "chatcmpl-fake",
+                    "object": "chat.completion",
+                    "model": payload.get("model"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": {
+                        "prompt_tokens": sum(len(m.get("content", "")) for m in payload.get("messages", [])) // 4,
+                        "completion_tokens": len(content) // 4,
+                    },
+                })
+
+            def _send_stream(self, content, model):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(content), server.chunk_size):
+                    if i and server.token_latency:
+                        time.sleep(server.token_latency)
+                    event = {
+                        "id": "chatcmpl-fake",
+                        "object": "chat.completion.chunk",
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": content[i:i + server.chunk_size]}}],
+                    }
+                    self._send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self._send_chunk(b"data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _send_chunk(self, data):
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+            def _send_json(self, status, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
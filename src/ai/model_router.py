@@ -0,0 +1,125 @@
+import re
+import threading
+
+from ai.scheduler import estimate_tokens
+from monitoring.metrics import metrics
+
+# A reply with fewer usable tasks than this is retried on the next route
+MIN_TASKS = 3
+# Upper bound on the tasks either prompt asks for
+MAX_TASKS = 7
+
+COMPACT_TASK_PROMPT = (
+    "Plan today for the goal: '{goal}'. Give 5-7 concrete tasks the user can check off. "
+    'Reply with only a JSON array of {{"task": "...", "completed": false}} objects.'
+)
+
+# Separators that usually mean a goal has several parts
+CLAUSE = re.compile(r",|;|\band\b|\bthen\b|\bwhile\b", re.I)
+
+
+def estimate_completion_tokens(goal, tasks=MAX_TASKS):
+    """Rough token count of a reply listing `tasks` tasks for `goal`"""
+    # An item is about a dozen words plus ten tokens of JSON, and wordier
+    # goals get wordier tasks
+    per_task = 26 + min(estimate_tokens(goal), 40) // 2
+    return 8 + tasks * per_task
+
+
+def goal_complexity(goal):
+    """(words, clauses) of a goal; both grow with how much planning it needs"""
+    text = str(goal)
+    return len(text.split()), len(CLAUSE.findall(text)) + 1
+
+
+class Route:
+    """One way of asking for tasks: a model, a prompt template and a reply budget.
+
+    `max_words`/`max_clauses` bound the goals the route is adequate for (None
+    for any goal). The reply budget is the completion estimate times
+    `headroom`, capped at `max_tokens`, or `max_tokens` itself when `headroom`
+    is None. A `model` of None uses the client's default.
+    """
+
+    def __init__(self, name, model, prompt, max_tokens, max_words=None, max_clauses=None, headroom=1.5):
+        self.name = name
+        self.model = model
+        self.prompt = prompt
+        self.max_tokens = max_tokens
+        self.max_words = max_words
+        self.max_clauses = max_clauses
+        self.headroom = headroom
+
+    def handles(self, goal):
+        words, clauses = goal_complexity(goal)
+        return ((self.max_words is None or words <= self.max_words)
+                and (self.max_clauses is None or clauses <= self.max_clauses))
+
+    def budget(self, goal):
+        if self.headroom is None:
+            return self.max_tokens
+        return min(self.max_tokens, int(estimate_completion_tokens(goal) * self.headroom))
+
+    def __repr__(self):
+        return f"Route({self.name!r}, {self.model!r})"
+
+
+class ModelRouter:
+    """Picks the cheapest adequate route for a goal, with stronger ones as fallbacks.
+
+    `routes` are ordered from cheapest to strongest. `plan(goal)` returns the
+    first route that handles the goal followed by every stronger route;
+    TaskGenerator moves down the plan when a reply fails or has fewer than
+    MIN_TASKS usable tasks. Each attempt's latency and estimated prompt and
+    completion tokens are recorded per route, as `tasks.route` and
+    `tasks.tokens` metrics and in `stats()`.
+    """
+
+    def __init__(self, routes):
+        self.routes = list(routes)
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def plan(self, goal):
+        for i, route in enumerate(self.routes):
+            if route.handles(goal):
+                return self.routes[i:]
+        return self.routes[-1:]
+
+    def record(self, route, seconds, prompt, content, outcome):
+        """Account one attempt; `outcome` is "ok", "rejected" (too few tasks) or "error" """
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(content) if content else 0
+        metrics.observe("tasks.route", seconds, route=route.name, outcome=outcome)
+        metrics.incr("tasks.tokens", prompt_tokens, route=route.name, kind="prompt")
+        metrics.incr("tasks.tokens", completion_tokens, route=route.name, kind="completion")
+        with self._lock:
+            totals = self._totals.setdefault(route.name, {
+                "calls": 0, "ok": 0, "rejected": 0, "error": 0, "seconds": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            totals["calls"] += 1
+            totals[outcome] += 1
+            totals["seconds"] += seconds
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: dict(totals, avg_seconds=totals["seconds"] / totals["calls"])
+                for name, totals in self._totals.items()
+            }
+
+
+def default_router(small_model, large_model, large_prompt, max_tokens=800):
+    """Short goals of one or two parts go to `small_model` with the compact
+    prompt; everything else, and any goal the small model fails on, goes to
+    `large_model`"""
+    routes = []
+    if small_model:
+        routes.append(Route("small", small_model, COMPACT_TASK_PROMPT, max_tokens,
+                            max_words=12, max_clauses=2))
+    # More headroom on the last resort, in case the small reply was cut short
+    routes.append(Route("large", large_model, large_prompt, max_tokens, headroom=2.5))
+    return ModelRouter(routes)
@@ -1,22 +1,261 @@
-import openai
+import json
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from monitoring.metrics import metrics
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+SYSTEM_PROMPT = "You are a helpful task planning assistant."
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class OpenAIError(Exception):
+    """Raised when a chat completion fails for good (after any retries)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class _RetryableError(Exception):
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _ConnectionPool:
+    """Keep-alive HTTP(S) connections to one host, reused across requests"""
+
+    def __init__(self, base_url, size):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.path = parts.path.rstrip("/")
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def acquire(self, timeout):
+        # A deadline that already passed would reach the socket as a negative timeout
+        if timeout <= 0 or not self._slots.acquire(timeout=timeout):
+            raise _RetryableError("Timed out waiting for a free connection")
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            # http.client pulls in ssl and email, so it is imported on the first request
+            import http.client
+            cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+            conn = cls(self.host, self.port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def release(self, conn, reuse=True):
+        if reuse:
+            self._idle.put(conn)
+        else:
+            conn.close()
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
 
 class OpenAIClient:
-    def __init__(self, api_key):
+    """Chat completions client with pooled connections, deadlines and retries.
+
+    Requests go straight to the REST endpoint over a pool of keep-alive
+    connections. Each call gets an overall deadline of `timeout` seconds, which
+    also bounds the retries. 429 and 5xx responses and network errors are retried
+    with exponential backoff and full jitter, honouring Retry-After. Pointing
+    `base_url` at a local stand-in (see ai.fake_server) makes the whole path
+    testable offline. The async variant runs the blocking calls on a thread
+    pool of `pool_size` threads rather than on asyncio streams.
+    """
+
+    def __init__(self, api_key, base_url=DEFAULT_BASE_URL, model="gpt-4", timeout=30.0,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0, pool_size=10):
         self.api_key = api_key
-        openai.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pool = _ConnectionPool(base_url, pool_size)
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="openai")
+
+    def call_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        """Return the assistant's reply to `prompt`; raises OpenAIError on failure"""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+        response = self.chat(messages, model, max_tokens, temperature, timeout)
+        return response["choices"][0]["message"]["content"].strip()
+
+    async def acall_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        """Awaitable wrapper running call_openai on the client's thread pool
+
+        The event loop stays free while the request is in flight, and up to
+        `pool_size` calls run at once; further ones queue for a thread.
+        """
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor,
+            lambda: self.call_openai(prompt, model, max_tokens, temperature, timeout),
+        )
+
+    def stream_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        """Yield the assistant's reply to `prompt` in pieces as they arrive"""
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+        return self.stream_chat(messages, model, max_tokens, temperature, timeout)
+
+    def stream_chat(self, messages, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        """Stream a chat completion, yielding content deltas.
+
+        Failures before the first byte of the reply are retried like chat();
+        once content has been yielded an error raises OpenAIError instead.
+        """
+        import http.client
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": True,
+        }
+        deadline = time.monotonic() + (timeout or self.timeout)
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                conn, response = self._open_stream("/chat/completions", payload, deadline)
+                break
+            except _RetryableError as e:
+                delay = self._retry_delay(e, attempt, deadline)
+                time.sleep(delay)
+                attempt += 1
+
+        metrics.observe("openai.stream_open", time.perf_counter() - start)
+        reuse = False
+        try:
+            for raw in iter(response.readline, b""):
+                line = raw.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    # Drain the terminating chunk so the connection can be reused
+                    response.read()
+                    reuse = not response.will_close
+                    return
+                delta = json.loads(data)["choices"][0].get("delta", {})
+                if delta.get("content"):
+                    yield delta["content"]
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            metrics.incr("openai.errors", kind="stream")
+            raise OpenAIError(f"OpenAI stream interrupted: {type(e).__name__}: {e}") from None
+        finally:
+            self._pool.release(conn, reuse)
+
+    def _open_stream(self, path, payload, deadline):
+        import http.client
+        body = json.dumps(payload).encode("utf-8")
+        conn = self._pool.acquire(deadline - time.monotonic())
+        try:
+            conn.request("POST", self._pool.path + path, body=body, headers=self._headers())
+            response = conn.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            self._pool.release(conn, False)
+            raise _RetryableError(f"{type(e).__name__}: {e}")
+        if response.status != 200:
+            data = response.read()
+            self._pool.release(conn, not response.will_close)
+            self._raise_for_status(response, data)
+        return conn, response
+
+    def _retry_delay(self, error, attempt, deadline):
+        """Backoff before the next attempt, or OpenAIError if there is no time left"""
+        remaining = deadline - time.monotonic()
+        if attempt >= self.max_retries or remaining <= 0:
+            metrics.incr("openai.errors", kind="exhausted")
+            raise OpenAIError(f"OpenAI request failed: {error}", error.status) from None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        if delay >= remaining:
+            metrics.incr("openai.errors", kind="deadline")
+            raise OpenAIError(f"OpenAI request failed: {error}", error.status) from None
+        metrics.incr("openai.retries", status=error.status or "network")
+        return delay
 
-    def call_openai(self, prompt):
+    @metrics.timed("openai.chat")
+    def chat(self, messages, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        """POST a chat completion and return the decoded response body"""
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+        deadline = time.monotonic() + (timeout or self.timeout)
+        attempt = 0
+        while True:
+            try:
+                return self._post("/chat/completions", payload, deadline)
+            except _RetryableError as e:
+                time.sleep(self._retry_delay(e, attempt, deadline))
+                attempt += 1
+
+    def _headers(self):
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _post(self, path, payload, deadline):
+        import http.client
+        body = json.dumps(payload).encode("utf-8")
+        conn = self._pool.acquire(deadline - time.monotonic())
+        reuse = False
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",  # Use the appropriate model
-                messages=[
-                    {"role": "system", "content": "You are a helpful task planning assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=500,
-                temperature=0.7
-            )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            print(f"Error calling OpenAI API: {e}")
-            return "Failed to generate tasks. Please try again."
\ No newline at end of file
+            conn.request("POST", self._pool.path + path, body=body, headers=self._headers())
+            response = conn.getresponse()
+            data = response.read()
+            reuse = not response.will_close
+        except (OSError, http.client.HTTPException) as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}")
+        finally:
+            self._pool.release(conn, reuse)
+        self._raise_for_status(response, data)
+        return json.loads(data)
+
+    def _raise_for_status(self, response, data):
+        if response.status in RETRYABLE_STATUSES:
+            retry_after = response.getheader("Retry-After")
+            try:
+                retry_after = float(retry_after) if retry_after else None
+            except ValueError:
+                retry_after = None
+            raise _RetryableError(f"HTTP {response.status}", response.status, retry_after)
+        if response.status >= 400:
+            raise OpenAIError(f"OpenAI request failed: HTTP {response.status} {data[:200]!r}", response.status)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self._pool.close()
@@ -0,0 +1,175 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from monitoring.metrics import metrics
+from storage.sqlite_backend import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+"""
+
+
+def normalize_goal(goal):
+    """Fold case, whitespace and trailing punctuation so trivially different goals match"""
+    text = re.sub(r"\s+", " ", str(goal)).strip().casefold()
+    return text.strip("'\"").rstrip(".!?;, ").strip()
+
+
+def cache_key(goal, template, model, **params):
+    """Key for a generation: normalized goal, prompt template, model and sampling parameters"""
+    material = json.dumps([normalize_goal(goal), template, model, params], sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier LRU cache of generated responses with a time to live.
+
+    Values must be JSON-serializable. The memory tier keeps up to `max_entries`
+    decoded values in LRU order; when `path` is given every value is also
+    written to a SQLite file, so the cache survives restarts and a memory miss
+    can still be served from disk. The disk tier evicts the least recently used
+    rows once it holds more than `max_disk_bytes`. Entries older than `ttl`
+    seconds are dropped from both tiers on lookup.
+    """
+
+    def __init__(self, path=None, max_entries=256, max_disk_bytes=16 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._db = SQLiteConnections(path, SCHEMA) if path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value for `key`, or None"""
+        now = time.time()
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None:
+                value, size, created = cached
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    metrics.incr("cache.lookups", result="memory")
+                    return value
+                self._drop(key)
+                self.expirations += 1
+            if self._db is not None:
+                row = self._db.conn().execute(
+                    "SELECT value, size, created FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    text, size, created = row
+                    if now - created <= self.ttl:
+                        with self._db.transaction() as conn:
+                            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                        value = json.loads(text)
+                        self._remember(key, value, size, created)
+                        self.disk_hits += 1
+                        metrics.incr("cache.lookups", result="disk")
+                        return value
+                    with self._db.transaction() as conn:
+                        conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self.expirations += 1
+            self.misses += 1
+            metrics.incr("cache.lookups", result="miss")
+            return None
+
+    def put(self, key, value):
+        """Store `value` under `key` in both tiers"""
+        text = json.dumps(value)
+        size = len(text.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, size, now)
+            if self._db is not None:
+                with self._db.transaction() as conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, size, created, accessed) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (key, text, size, now, now),
+                    )
+                    self._evict_disk(conn)
+
+    def _remember(self, key, value, size, created):
+        # Callers hold self._lock
+        if key in self._memory:
+            self._drop(key)
+        self._memory[key] = (value, size, created)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries:
+            oldest = next(iter(self._memory))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, size, _ = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    def _evict_disk(self, conn):
+        # Callers hold self._lock inside a transaction on `conn`
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY accessed"
+        ).fetchall():
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.evictions += 1
+            total -= size
+            if total <= self.max_disk_bytes:
+                return
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._db is not None:
+                with self._db.transaction() as conn:
+                    conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            disk_entries, disk_bytes = 0, 0
+            if self._db is not None:
+                disk_entries, disk_bytes = self._db.conn().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+                "bytes": self._memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
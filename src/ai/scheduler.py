@@ -0,0 +1,179 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+
+from ai.openai_client import OpenAIError
+from monitoring.metrics import metrics
+
+# Lower values are served first
+INTERACTIVE = 0
+SCHEDULED = 1
+
+_priority = contextvars.ContextVar("generation_priority", default=INTERACTIVE)
+
+
+@contextlib.contextmanager
+def generation_priority(level):
+    """Run the calls made inside the block at priority `level`"""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(text):
+    """Rough token count of `text` (about four characters per token)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Refills at `rate` units per second up to `capacity`"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount, now):
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill(now)
+        # A request bigger than the bucket waits for a full bucket rather than forever
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount):
+        self.level -= amount
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class GenerationScheduler:
+    """Admission control in front of an OpenAIClient.
+
+    Calls are admitted in priority order (interactive before scheduled, then
+    first come first served) once fewer than `max_concurrency` are in flight
+    and both the request bucket (`requests_per_minute`) and the token bucket
+    (`tokens_per_minute`, charged with the prompt estimate plus `max_tokens`)
+    allow it. Unused tokens are refunded when a reply comes back, and a 429
+    that survives the client's retries pauses admissions for `cooldown`
+    seconds. Exposes the call_openai/stream_openai interface TaskGenerator uses.
+    """
+
+    def __init__(self, client, max_concurrency=4, requests_per_minute=500,
+                 tokens_per_minute=10000, cooldown=10.0):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self._requests = TokenBucket(requests_per_minute / 60.0, max(requests_per_minute / 60.0, 1.0))
+        # Allow a burst of ten seconds' worth of tokens
+        self._tokens = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 6.0)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._paused_until = 0.0
+        self.admitted = 0
+        self.rate_limited = 0
+        self.max_queue_depth = 0
+        self._wait_totals = {}
+
+    @property
+    def model(self):
+        return self.client.model
+
+    def _admit(self, tokens):
+        priority = _priority.get()
+        with self._cond:
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            self.max_queue_depth = max(self.max_queue_depth, len(self._waiting))
+            enqueued = time.monotonic()
+            while True:
+                if self._waiting[0] == entry and self._active < self.max_concurrency:
+                    now = time.monotonic()
+                    wait = max(self._paused_until - now,
+                               self._requests.delay(1, now),
+                               self._tokens.delay(tokens, now))
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+                else:
+                    self._cond.wait()
+            heapq.heappop(self._waiting)
+            self._requests.take(1)
+            self._tokens.take(tokens)
+            self._active += 1
+            self.admitted += 1
+            count, total, longest = self._wait_totals.get(priority, (0, 0.0, 0.0))
+            waited = time.monotonic() - enqueued
+            metrics.observe("scheduler.wait", waited, priority=priority)
+            self._wait_totals[priority] = (count + 1, total + waited, max(longest, waited))
+            # The next in line may be admissible too
+            self._cond.notify_all()
+
+    def _release(self, charged, used, error=None):
+        with self._cond:
+            self._active -= 1
+            if used is not None and used < charged:
+                self._tokens.give_back(charged - used)
+            if isinstance(error, OpenAIError) and error.status == 429:
+                self.rate_limited += 1
+                self._paused_until = time.monotonic() + self.cooldown
+            self._cond.notify_all()
+
+    def call_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        charged = estimate_tokens(prompt) + max_tokens
+        self._admit(charged)
+        content, error = None, None
+        try:
+            content = self.client.call_openai(prompt, model, max_tokens, temperature, timeout)
+            return content
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            used = estimate_tokens(prompt) + estimate_tokens(content) if content is not None else None
+            self._release(charged, used, error)
+
+    def stream_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        charged = estimate_tokens(prompt) + max_tokens
+        self._admit(charged)
+        received, error = [], None
+        try:
+            for piece in self.client.stream_openai(prompt, model, max_tokens, temperature, timeout):
+                received.append(piece)
+                yield piece
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            used = estimate_tokens(prompt) + estimate_tokens("".join(received))
+            self._release(charged, used, error)
+
+    def stats(self):
+        with self._cond:
+            waits = {}
+            for priority, (count, total, longest) in self._wait_totals.items():
+                name = "interactive" if priority == INTERACTIVE else "scheduled" if priority == SCHEDULED else str(priority)
+                waits[name] = {"count": count, "avg_wait": total / count, "max_wait": longest}
+            return {
+                "queue_depth": len(self._waiting),
+                "max_queue_depth": self.max_queue_depth,
+                "active": self._active,
+                "admitted": self.admitted,
+                "rate_limited": self.rate_limited,
+                "waits": waits,
+            }
+
+    def close(self):
+        self.client.close()
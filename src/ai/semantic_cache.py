@@ -0,0 +1,259 @@
+import threading
+
+from ai.response_cache import normalize_goal
+
+# Width of the folded vectors scanned first, and how many of the best coarse
+# matches are then scored on the full vectors
+COARSE_DIM = 32
+CANDIDATES = 64
+# Goals embedded per batch while indexing a store
+BATCH = 50_000
+
+
+def _mix(np, h):
+    """Scramble 32-bit feature hashes so their low and top bits are well spread"""
+    h ^= h >> np.uint32(16)
+    h *= np.uint32(0x85EBCA6B)
+    h ^= h >> np.uint32(13)
+    h *= np.uint32(0xC2B2AE35)
+    return h ^ (h >> np.uint32(16))
+
+
+def goal_vectors(goals, dim=256, ngram=3):
+    """Unit-length hashed character n-gram and word vectors of many goals, as float32 rows"""
+    return key_vectors([normalize_goal(goal) for goal in goals], dim, ngram)
+
+
+def key_vectors(keys, dim=256, ngram=3):
+    """goal_vectors of already normalized goals
+
+    Every goal's bytes are hashed in one pass of array operations, so
+    embedding a whole history costs about as much as a few NumPy calls.
+    """
+    import numpy as np
+    texts = [f" {key} " for key in keys]
+    if not texts:
+        return np.zeros((0, dim), dtype=np.float32)
+    # "\n" separates the goals; normalized goals never contain one
+    data = np.frombuffer("\n".join(texts).encode("utf-8"), dtype=np.uint8)
+    sep = data == 10
+    row_of = np.cumsum(sep, dtype=np.int64)
+    data = data.astype(np.uint32)
+    # Arithmetic wraps modulo 2**32; the multiplier is odd so it has an inverse
+    prime = np.uint32(0x01000193)
+
+    # Character n-grams that do not cross a separator
+    count = max(len(data) - ngram + 1, 0)
+    valid = np.ones(count, dtype=bool)
+    grams = np.zeros(count, dtype=np.uint32)
+    for j in range(ngram):
+        valid &= ~sep[j:j + count]
+        grams *= prime
+        grams += data[j:j + count]
+    gram_rows = row_of[:count][valid]
+    grams = grams[valid]
+
+    # Whole words too, so shared vocabulary outweighs shared fragments. A word
+    # is hashed as (prefix[end] - prefix[start]) / prime**start
+    in_word = (data != 32) & ~sep
+    edges = np.diff(np.concatenate(([False], in_word, [False])).astype(np.int8))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    one = np.ones(1, dtype=np.uint32)
+    powers = np.concatenate((one, np.cumprod(np.full(len(data) - 1, prime, dtype=np.uint32), dtype=np.uint32)))
+    inverse = np.uint32(pow(int(prime), -1, 1 << 32))
+    inverse_powers = np.concatenate((one, np.cumprod(np.full(len(data) - 1, inverse, dtype=np.uint32),
+                                                     dtype=np.uint32)))
+    prefix = np.concatenate((np.zeros(1, dtype=np.uint32), np.cumsum(data * powers, dtype=np.uint32)))
+    words = (prefix[ends] - prefix[starts]) * inverse_powers[starts] + np.uint32(0x5BD1E995)
+
+    hashes = _mix(np, np.concatenate((grams, words)))
+    rows = np.concatenate((gram_rows, row_of[starts]))
+    # The top bit picks a sign so colliding features tend to cancel out
+    cells = rows * dim + (hashes % np.uint32(dim)).astype(np.int64)
+    signs = np.float32(1) - np.float32(2) * (hashes >> np.uint32(31)).astype(np.float32)
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    np.add.at(vectors.reshape(-1), cells, signs)
+    norms = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))[:, None]
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def goal_vector(goal, dim=256, ngram=3):
+    """Unit-length hashed n-gram vector of one goal, as float32"""
+    return goal_vectors([goal], dim, ngram)[0]
+
+
+def fold(vectors, width=COARSE_DIM):
+    """Sum the vectors down to `width` columns and renormalize, as float32"""
+    import numpy as np
+    folded = vectors.reshape(len(vectors), -1, width).sum(axis=1, dtype=np.float32)
+    norms = np.linalg.norm(folded, axis=1, keepdims=True)
+    np.divide(folded, norms, out=folded, where=norms > 0)
+    return folded
+
+
+class SemanticGoalIndex:
+    """Finds a previously planned goal that is a close paraphrase of a new one.
+
+    Each goal is stored as a hashed character n-gram vector (`dim` float16s,
+    unit length) plus the same vector folded to COARSE_DIM float32s. A lookup
+    scans the folded matrix in one matrix-vector product, then scores its
+    CANDIDATES best rows on the full vectors; `lookup` returns the task list
+    of the most similar goal when its cosine similarity reaches `threshold`.
+    Nothing leaves the process. A `store` passed in is indexed in batches on
+    a background thread, started by `warm()` or by first use; until it
+    finishes, lookups search the goals indexed so far.
+    """
+
+    def __init__(self, threshold=0.8, dim=256, store=None):
+        self.threshold = threshold
+        self.dim = dim
+        # Whether lookups scan the folded vectors first
+        self._folded = dim > COARSE_DIM and dim % COARSE_DIM == 0
+        self._lock = threading.Lock()
+        self._store = store
+        self._warm_lock = threading.Lock()
+        # Set once the store has been indexed (at once without a store)
+        self.ready = threading.Event()
+        if store is None:
+            self.ready.set()
+        self._matrix = None
+        self._coarse = None
+        self._count = 0
+        self._goals = []
+        self._tasks = []
+        self._seen = set()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self._count
+
+    def warm(self):
+        """Start indexing the store on a background thread, if not already done"""
+        if self._store is None:
+            return
+        with self._warm_lock:
+            store, self._store = self._store, None
+        if store is not None:
+            threading.Thread(target=self._index_store, args=(store,), daemon=True,
+                             name="semantic-index").start()
+
+    def _index_store(self, store):
+        try:
+            self.add_store(store)
+        except Exception as e:
+            print(f"Error indexing goal history: {e}")
+        finally:
+            self.ready.set()
+
+    @staticmethod
+    def _task_text(tasks):
+        """Fresh copies of the task texts; a match should start with nothing checked off"""
+        return [
+            {"task": t["task"], "completed": False} if isinstance(t, dict) else {"task": str(t), "completed": False}
+            for t in tasks
+            if not isinstance(t, dict) or t.get("task")
+        ]
+
+    def add(self, goal, tasks):
+        """Index `goal` with its task list; repeats of a known goal are ignored"""
+        self.warm()
+        return self._add_batch([(goal, tasks)]) == 1
+
+    def add_entries(self, entries):
+        """Index a list of stored {"date", "goal", "tasks"} entries"""
+        added = 0
+        for start in range(0, len(entries), BATCH):
+            added += self._add_batch([(entry.get("goal"), entry.get("tasks")) for entry in entries[start:start + BATCH]])
+        return added
+
+    def add_store(self, store):
+        """Index every user's goal history from a storage backend"""
+        return sum(self.add_entries(store.load_all(user).get("goals", [])) for user in store.list_users())
+
+    def _add_batch(self, pairs):
+        """Embed and append the new (goal, tasks) pairs in one go; returns how many were added"""
+        batch, keys = [], set()
+        for goal, tasks in pairs:
+            if not goal or not isinstance(tasks, list) or not tasks:
+                continue
+            key = normalize_goal(goal)
+            if key and key not in keys and key not in self._seen:
+                keys.add(key)
+                # Task lists are copied out on a match, not for every goal indexed
+                batch.append((key, goal, list(tasks)))
+        if not batch:
+            return 0
+        import numpy as np
+        vectors = key_vectors([key for key, _, _ in batch], self.dim)
+        coarse = fold(vectors) if self._folded else vectors
+        with self._lock:
+            # Drop anything another thread indexed meanwhile
+            fresh = [i for i, (key, _, _) in enumerate(batch) if key not in self._seen]
+            if not fresh:
+                return 0
+            needed = self._count + len(fresh)
+            if self._matrix is None or needed > len(self._matrix):
+                capacity = max(1024, needed, 2 * (len(self._matrix) if self._matrix is not None else 0))
+                matrix = np.zeros((capacity, self.dim), dtype=np.float16)
+                folded = np.zeros((capacity, coarse.shape[1]), dtype=np.float32)
+                if self._matrix is not None:
+                    matrix[:self._count] = self._matrix[:self._count]
+                    folded[:self._count] = self._coarse[:self._count]
+                self._matrix, self._coarse = matrix, folded
+            self._matrix[self._count:needed] = vectors[fresh]
+            self._coarse[self._count:needed] = coarse[fresh]
+            for i in fresh:
+                key, goal, tasks = batch[i]
+                self._goals.append(goal)
+                self._tasks.append(tasks)
+                self._seen.add(key)
+            self._count = needed
+        return len(fresh)
+
+    def _scores(self, goal, k):
+        """(rows, cosine similarities) of up to `k` most similar goals, best first"""
+        self.warm()
+        with self._lock:
+            matrix, coarse, count = self._matrix, self._coarse, self._count
+        if not count:
+            return [], []
+        import numpy as np
+        vector = goal_vector(goal, self.dim)
+        if count > CANDIDATES and self._folded:
+            rough = coarse[:count] @ fold(vector[None])[0]
+            rows = np.argpartition(rough, -CANDIDATES)[-CANDIDATES:]
+        else:
+            rows = np.arange(count)
+        # float16 rounding can push an exact match just past 1
+        scores = np.minimum(matrix[rows].astype(np.float32) @ vector, 1.0)
+        best = np.argsort(scores)[::-1][:k]
+        return rows[best], scores[best]
+
+    def search(self, goal, k=1):
+        """Return up to `k` (similarity, goal) pairs, most similar first"""
+        rows, scores = self._scores(goal, k)
+        return [(float(score), self._goals[row]) for row, score in zip(rows, scores)]
+
+    def lookup(self, goal):
+        """Return (tasks, similarity, matched goal) for a close enough goal, or None"""
+        rows, scores = self._scores(goal, 1)
+        if len(rows) and scores[0] >= self.threshold:
+            self.hits += 1
+            i = int(rows[0])
+            return self._task_text(self._tasks[i]), float(scores[0]), self._goals[i]
+        self.misses += 1
+        return None
+
+    def stats(self):
+        self.warm()
+        lookups = self.hits + self.misses
+        return {
+            "goals": self._count,
+            "bytes": self._count * (self.dim * 2 + (COARSE_DIM if self._folded else self.dim) * 4),
+            "indexing": not self.ready.is_set(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,123 @@
+import threading
+
+from monitoring.metrics import metrics
+
+
+class Flight:
+    """One in-flight call whose partial results and outcome are shared.
+
+    The caller running the call `publish`es items as they arrive and `finish`es
+    with the result or the error; everyone else waits on it with `wait` or
+    iterates the items with `follow`. Safe to use from any thread.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.items = []
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def publish(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def finish(self, result=None, error=None):
+        with self._cond:
+            self.result = result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def started(self, timeout=None):
+        """Whether an item was published, or the call finished, within `timeout` seconds"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.done or self.items, timeout)
+
+    def wait(self, timeout=None):
+        """Return the result, or raise the error, once the call has finished"""
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.done, timeout):
+                raise TimeoutError("Timed out waiting for a shared call")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def follow(self):
+        """Yield each published item as it arrives, then the rest of the result"""
+        seen = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or len(self.items) > seen)
+                items, done = self.items[seen:], self.done
+            seen += len(items)
+            yield from items
+            if done:
+                break
+        if self.error is not None:
+            raise self.error
+        if self.result is not None:
+            yield from self.result[seen:]
+
+
+class SingleFlight:
+    """Registry that coalesces concurrent calls for the same key into one.
+
+    `begin(key)` returns (flight, leader): the first caller for a key leads and
+    must `end` the flight with its result or error; callers arriving while it
+    is in flight get the same Flight and wait on it, so they all receive the
+    leader's result or its exception. A key is free again as soon as its
+    flight ends, so later calls are not coalesced with finished ones.
+    """
+
+    def __init__(self, name="flight"):
+        self.name = name
+        self._lock = threading.Lock()
+        self._flights = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    def begin(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                metrics.incr(f"{self.name}.coalesced")
+                return flight, False
+            flight = self._flights[key] = Flight()
+            self.leaders += 1
+            return flight, True
+
+    def end(self, key, flight, result=None, error=None):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(result, error)
+
+    def do(self, key, fn):
+        """Return fn(), or the result of the identical call already in flight"""
+        flight, leader = self.begin(key)
+        if not leader:
+            return flight.wait()
+        try:
+            result = fn()
+        except Exception as e:
+            self.end(key, flight, error=e)
+            raise
+        except BaseException as e:
+            # Waiters should not see a KeyboardInterrupt or SystemExit
+            self.end(key, flight, error=RuntimeError(f"Shared call was interrupted: {type(e).__name__}"))
+            raise
+        self.end(key, flight, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+            }
@@ -1,77 +1,138 @@
-import time
-import threading
 import datetime
 
+from ai.openai_client import OpenAIError
+from ai.response_cache import normalize_goal
+from ai.scheduler import SCHEDULED, generation_priority
+from alarm.timer_scheduler import TimerScheduler
+from storage.backend import DEFAULT_USER
+from tasks.pregenerator import TaskPregenerator
+
 class AlarmManager:
-    def __init__(self, goal_handler, task_generator):
-        self.alarms = []
+    def __init__(self, goal_handler, task_generator, user=DEFAULT_USER, store=None,
+                 pregenerate=False, pregenerate_lead_time=900.0):
+        self.user = user
         self.running = True
         self.goal_handler = goal_handler
         self.task_generator = task_generator
-        self.alarm_thread = threading.Thread(target=self._alarm_loop)
-        self.alarm_thread.daemon = True
-        self.alarm_thread.start()
         # Add a callback that UI can register to handle alarm events
         self.alarm_callback = None
+        # Sleeps until the next due alarm instead of polling every minute; one
+        # handler at a time, since handling an alarm talks to the user. With an
+        # AlarmStore the alarms survive restarts and several processes can run
+        # without firing any alarm twice. Nothing fires until start().
+        self.scheduler = TimerScheduler(self._on_alarm, max_workers=1, store=store, users=[user])
+        # Optionally prepare tasks for the likely goal shortly before each alarm
+        self.pregenerate = pregenerate
+        self.pregenerate_lead_time = pregenerate_lead_time
+        self.pregenerator = None
+    
+    def start(self):
+        """Start firing alarms; call once the UI has registered its callback"""
+        self.scheduler.start()
+        if self.pregenerate and self.pregenerator is None:
+            self.pregenerator = TaskPregenerator(self.task_generator, self.goal_handler, self.next_alarm_due,
+                                                 lead_time=self.pregenerate_lead_time)
+        return self
+    
+    @property
+    def alarms(self):
+        """This user's alarm times, earliest first"""
+        return [alarm.time for alarm in self.scheduler.alarms_for(self.user)]
     
-    def add_alarm(self, time_str):
+    def add_alarm(self, time_str, recurrence="daily"):
         """Add a new alarm with the specified time (HH:MM format)"""
         try:
             alarm_time = datetime.datetime.strptime(time_str, "%H:%M").time()
-            self.alarms.append(alarm_time)
-            self.alarms.sort()
-            return True
         except ValueError:
             print("Invalid time format. Please use HH:MM format.")
             return False
+        try:
+            self.scheduler.add(alarm_time, self.user, recurrence)
+            if self.pregenerator:
+                self.pregenerator.reschedule()
+            return True
+        except ValueError as e:
+            print(f"Invalid recurrence: {e}")
+            return False
     
     def remove_alarm(self, time_str):
         """Remove an alarm with the specified time"""
         try:
             alarm_time = datetime.datetime.strptime(time_str, "%H:%M").time()
-            if alarm_time in self.alarms:
-                self.alarms.remove(alarm_time)
-                return True
-            return False
         except ValueError:
             return False
+        for alarm in self.scheduler.alarms_for(self.user):
+            if alarm.time == alarm_time:
+                removed = self.scheduler.cancel(alarm.id, self.user)
+                if removed and self.pregenerator:
+                    self.pregenerator.reschedule()
+                return removed
+        return False
+    
+    def next_alarm_due(self):
+        """Timestamp of this user's next alarm, or None"""
+        alarms = self.scheduler.alarms_for(self.user)
+        return min(alarm.due for alarm in alarms) if alarms else None
+    
+    def get_goal_and_ready_tasks(self):
+        """Ask for today's goal, offering the one tasks were prepared for.
+        
+        Returns (goal, tasks) where tasks is the prepared list if the user chose
+        that goal, else None and the caller generates them.
+        """
+        candidate = self.pregenerator.take() if self.pregenerator else None
+        if candidate is None:
+            return self.goal_handler.get_goal_from_user(), None
+        goal = self.goal_handler.get_goal_from_user(suggestion=candidate["goal"])
+        accepted = bool(goal) and normalize_goal(goal) == normalize_goal(candidate["goal"])
+        self.pregenerator.record(candidate, accepted)
+        return goal, candidate["tasks"] if accepted else None
     
     def register_alarm_callback(self, callback):
         """Register a callback function to be called when an alarm triggers"""
         self.alarm_callback = callback
     
-    def _alarm_loop(self):
-        """Background thread to check for alarms"""
-        while self.running:
-            now = datetime.datetime.now().time()
-            current_time = datetime.time(now.hour, now.minute)
-            
-            for alarm_time in self.alarms:
-                if alarm_time.hour == current_time.hour and alarm_time.minute == current_time.minute:
-                    self._trigger_alarm()
-            
-            # Sleep until the next minute
-            time.sleep(60 - datetime.datetime.now().second)
+    def _on_alarm(self, alarm):
+        """Called by the scheduler when one of our alarms is due"""
+        if self.running:
+            self._trigger_alarm()
     
     def _trigger_alarm(self):
         """Trigger the alarm process - get goal and generate tasks"""
-        if self.alarm_callback:
-            # Use the callback to handle the alarm in the UI
-            self.alarm_callback()
-        else:
-            # Fallback behavior if no callback is registered
-            self.handle_alarm_now()
+        # Alarm-driven generations queue behind anything a user is waiting on
+        with generation_priority(SCHEDULED):
+            if self.alarm_callback:
+                # Use the callback to handle the alarm in the UI
+                self.alarm_callback()
+            else:
+                # Fallback behavior if no callback is registered
+                self.handle_alarm_now()
     
     def handle_alarm_now(self):
         """Directly handle the alarm (when triggered outside the UI flow)"""
-        goal = self.goal_handler.get_goal_from_user()
+        goal, tasks = self.get_goal_and_ready_tasks()
         if goal:
-            print("\nGenerating tasks based on your goal...")
-            tasks = self.task_generator.generate_tasks(goal)
+            generation = None
+            if tasks is None:
+                print("\nGenerating tasks based on your goal...")
+                try:
+                    generation = self.task_generator.hedge(goal, stream=False)
+                    tasks = generation.result()
+                except OpenAIError as e:
+                    print(f"\nCould not generate tasks: {e}")
+                    return
             self.goal_handler.save_goal_and_tasks(goal, tasks)
+            if generation is not None and generation.local:
+                # Starter tasks for now; the generated ones replace them if still untouched
+                expected = [dict(task) for task in tasks]
+                generation.on_upgrade(lambda generated: self.goal_handler.replace_todays_tasks(expected, generated))
             print("\nYour tasks for today:")
-            print(tasks)
+            for i, task_info in enumerate(tasks, 1):
+                print(f"{i}. [ ] {task_info['task']}")
             input("\nPress Enter to continue...")  # Pause to let the user read the tasks
     
     def stop(self):
-        self.running = False
\ No newline at end of file
+        self.running = False
+        self.scheduler.stop()
+        if self.pregenerator:
+            self.pregenerator.stop()
\ No newline at end of file
@@ -0,0 +1,140 @@
+import time
+
+from storage.sqlite_backend import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarms (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    time TEXT NOT NULL,
+    recurrence TEXT NOT NULL,
+    next_due REAL,
+    cancelled INTEGER NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS alarms_version ON alarms (version);
+CREATE TABLE IF NOT EXISTS firings (
+    alarm_id INTEGER NOT NULL,
+    due REAL NOT NULL,
+    worker TEXT NOT NULL,
+    claimed_at REAL NOT NULL,
+    lease_until REAL NOT NULL,
+    done_at REAL,
+    PRIMARY KEY (alarm_id, due)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS firings_pending ON firings (done_at, lease_until);
+"""
+
+
+class AlarmStore:
+    """Alarms persisted in SQLite and shared by every worker process on the host.
+
+    Every change to an alarm bumps a store-wide version, so workers pick up each
+    other's changes with `changes(since)`. Firing is a compare-and-swap inside
+    an immediate (write-locked) transaction: the worker that moves `next_due`
+    on from the due time it saw claims that occurrence and records it in
+    `firings` with a lease; everyone else's claim fails. A claim that is not
+    completed before its lease runs out can be taken over with `reclaim`, so an
+    occurrence is lost only if every worker dies.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._db = SQLiteConnections(db_file, SCHEMA)
+
+    def _conn(self):
+        return self._db.conn()
+
+    def _write(self, fn):
+        """Run fn(conn, version) in a write transaction with the next version number"""
+        with self._db.transaction() as conn:
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM alarms").fetchone()[0]
+            return fn(conn, version)
+
+    def add(self, user, time_str, recurrence, next_due):
+        """Persist a new alarm and return its id"""
+        return self._write(lambda conn, version: conn.execute(
+            "INSERT INTO alarms (user, time, recurrence, next_due, version) VALUES (?, ?, ?, ?, ?)",
+            (user, time_str, recurrence, next_due, version),
+        ).lastrowid)
+
+    def cancel(self, alarm_id, user=None):
+        def cancel(conn, version):
+            query = "UPDATE alarms SET cancelled = 1, version = ? WHERE id = ? AND cancelled = 0"
+            params = [version, alarm_id]
+            if user is not None:
+                query += " AND user = ?"
+                params.append(user)
+            return conn.execute(query, params).rowcount == 1
+        return self._write(cancel)
+
+    def changes(self, since=0, users=None):
+        """Alarm rows changed after version `since`, and the latest version seen.
+
+        Rows are (id, user, time, recurrence, next_due, cancelled, version).
+        """
+        query = ("SELECT id, user, time, recurrence, next_due, cancelled, version "
+                 "FROM alarms WHERE version > ?")
+        params = [since]
+        if users is not None:
+            users = list(users)
+            query += f" AND user IN ({','.join('?' * len(users))})"
+            params += users
+        rows = self._conn().execute(query + " ORDER BY version", params).fetchall()
+        return rows, (rows[-1][6] if rows else since)
+
+    def claim(self, alarm_id, due, next_due, worker, lease=600.0):
+        """Claim the occurrence of an alarm due at `due`; True if this worker should fire it.
+
+        `next_due` is the following occurrence (None for a one-off alarm).
+        """
+        def claim(conn, version):
+            updated = conn.execute(
+                "UPDATE alarms SET next_due = ?, version = ? WHERE id = ? AND next_due = ? AND cancelled = 0",
+                (next_due, version, alarm_id, due),
+            ).rowcount
+            if updated != 1:
+                return False
+            now = time.time()
+            conn.execute(
+                "INSERT OR IGNORE INTO firings (alarm_id, due, worker, claimed_at, lease_until) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (alarm_id, due, worker, now, now + lease),
+            )
+            return True
+        return self._write(claim)
+
+    def complete(self, alarm_id, due):
+        """Record that the claimed occurrence has been handled"""
+        self._write(lambda conn, version: conn.execute(
+            "UPDATE firings SET done_at = ? WHERE alarm_id = ? AND due = ?",
+            (time.time(), alarm_id, due),
+        ))
+
+    def expired_claims(self, now=None):
+        """(alarm_id, due, user, time, recurrence) of claims whose lease ran out unhandled"""
+        return self._conn().execute(
+            "SELECT f.alarm_id, f.due, a.user, a.time, a.recurrence FROM firings f "
+            "JOIN alarms a ON a.id = f.alarm_id WHERE f.done_at IS NULL AND f.lease_until < ?",
+            (now if now is not None else time.time(),),
+        ).fetchall()
+
+    def reclaim(self, alarm_id, due, worker, lease=600.0):
+        """Take over an expired claim; True if this worker should fire it now"""
+        def reclaim(conn, version):
+            now = time.time()
+            return conn.execute(
+                "UPDATE firings SET worker = ?, claimed_at = ?, lease_until = ? "
+                "WHERE alarm_id = ? AND due = ? AND done_at IS NULL AND lease_until < ?",
+                (worker, now, now + lease, alarm_id, due, now),
+            ).rowcount == 1
+        return self._write(reclaim)
+
+    def firings(self, alarm_id=None, limit=100):
+        """Recorded firings, newest first"""
+        query = "SELECT alarm_id, due, worker, claimed_at, done_at FROM firings"
+        params = []
+        if alarm_id is not None:
+            query += " WHERE alarm_id = ?"
+            params.append(alarm_id)
+        return self._conn().execute(query + " ORDER BY due DESC LIMIT ?", params + [limit]).fetchall()
@@ -0,0 +1,294 @@
+import datetime
+import heapq
+import itertools
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from monitoring.metrics import metrics
+from storage.backend import DEFAULT_USER
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+RECURRENCES = {
+    "daily": frozenset(range(7)),
+    "weekdays": frozenset(range(5)),
+    "weekends": frozenset((5, 6)),
+    "once": None,
+}
+# Re-check the clock at least this often, in case the wall clock jumps (NTP, DST)
+MAX_SLEEP = 60.0
+
+
+def parse_recurrence(rule):
+    """Weekdays (0 = Monday) an alarm repeats on, or None for a one-off alarm.
+
+    `rule` is "daily", "weekdays", "weekends", "once" or a comma separated list
+    of day names such as "mon,wed,fri". Raises ValueError for anything else.
+    """
+    rule = (rule or "daily").strip().lower()
+    if rule in RECURRENCES:
+        return RECURRENCES[rule]
+    days = [day.strip()[:3] for day in rule.split(",")]
+    if not all(day in WEEKDAYS for day in days):
+        raise ValueError(f"Unknown recurrence: {rule!r}")
+    return frozenset(WEEKDAYS.index(day) for day in days)
+
+
+def next_occurrence(alarm_time, days, after):
+    """First local datetime after `after` at `alarm_time` on one of `days`"""
+    for offset in range(8):
+        candidate = datetime.datetime.combine(after.date() + datetime.timedelta(days=offset), alarm_time)
+        if candidate > after and (days is None or candidate.weekday() in days):
+            return candidate
+    raise ValueError("Recurrence has no days")
+
+
+class Alarm:
+    __slots__ = ("id", "user", "time", "recurrence", "days", "due", "cancelled")
+
+    def __init__(self, alarm_id, user, alarm_time, recurrence, days, due):
+        self.id = alarm_id
+        self.user = user
+        self.time = alarm_time
+        self.recurrence = recurrence
+        self.days = days
+        self.due = due
+        self.cancelled = False
+
+    def __repr__(self):
+        return f"Alarm({self.id}, {self.user!r}, {self.time.strftime('%H:%M')}, {self.recurrence!r})"
+
+
+class TimerScheduler:
+    """Fires alarms from a min-heap of due times.
+
+    Adding an alarm is a heap push, cancelling marks it so the heap drops it
+    when it reaches the top (the heap is rebuilt if cancelled entries pile up).
+    One thread sleeps until the earliest due time and is woken early when an
+    earlier alarm is added. Due alarms are handed to `on_fire(alarm)` on a
+    small thread pool so a slow handler never delays the next alarm; repeating
+    alarms are pushed back for their next occurrence, so an alarm fires at most
+    once per occurrence.
+
+    With an AlarmStore, alarms are persisted and shared with other worker
+    processes: the heap is loaded from the store on start (alarms that came due
+    while no worker was running fire once straight away), other workers'
+    changes are picked up every `sync_interval` seconds, and each occurrence
+    is claimed in the store before it fires, so exactly one worker fires it.
+    `users` limits the worker to those users' alarms.
+    """
+
+    def __init__(self, on_fire, max_workers=4, clock=time.time, store=None, users=None,
+                 sync_interval=5.0, lease=600.0, worker_id=None):
+        self.on_fire = on_fire
+        self.clock = clock
+        self.store = store
+        self.users = set(users) if users is not None else None
+        self.sync_interval = sync_interval
+        self.lease = lease
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._cond = threading.Condition()
+        self._heap = []
+        self._alarms = {}
+        self._by_user = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._cancelled = 0
+        self._running = False
+        self._thread = None
+        self._version = 0
+        self._last_sync = 0.0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="alarm")
+        self.fired = 0
+        self.max_lateness = 0.0
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        if self.store is not None:
+            self._sync()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        self._executor.shutdown(wait=False)
+
+    def add(self, alarm_time, user=DEFAULT_USER, recurrence="daily"):
+        """Register an alarm at `alarm_time` (a datetime.time) and return it"""
+        days = parse_recurrence(recurrence)
+        now = datetime.datetime.fromtimestamp(self.clock())
+        due = next_occurrence(alarm_time, days, now).timestamp()
+        if self.store is not None:
+            alarm_id = self.store.add(user, alarm_time.strftime("%H:%M"), recurrence, due)
+        else:
+            alarm_id = next(self._ids)
+        with self._cond:
+            alarm = Alarm(alarm_id, user, alarm_time, recurrence, days, due)
+            self._register(alarm)
+        return alarm
+
+    def _register(self, alarm):
+        # Callers hold self._cond
+        self._alarms[alarm.id] = alarm
+        self._by_user.setdefault(alarm.user, set()).add(alarm.id)
+        self._push(alarm)
+
+    def _push(self, alarm):
+        # Callers hold self._cond
+        entry = (alarm.due, next(self._seq), alarm)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            # New earliest alarm; wake the loop so it sleeps for the right time
+            self._cond.notify()
+
+    def cancel(self, alarm_id, user=None):
+        """Cancel an alarm; with `user`, only if that user owns it"""
+        if self.store is not None and not self.store.cancel(alarm_id, user):
+            return False
+        with self._cond:
+            alarm = self._alarms.get(alarm_id)
+            if alarm is None or (user is not None and alarm.user != user):
+                return self.store is not None
+            self._forget(alarm)
+            self._cancelled += 1
+            if self._cancelled > 64 and self._cancelled > len(self._heap) // 2:
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+            return True
+
+    def _forget(self, alarm):
+        # Callers hold self._cond
+        alarm.cancelled = True
+        del self._alarms[alarm.id]
+        ids = self._by_user.get(alarm.user)
+        if ids is not None:
+            ids.discard(alarm.id)
+            if not ids:
+                del self._by_user[alarm.user]
+
+    def alarms_for(self, user=DEFAULT_USER):
+        """A user's alarms ordered by time of day"""
+        with self._cond:
+            alarms = [self._alarms[i] for i in self._by_user.get(user, ())]
+        return sorted(alarms, key=lambda a: (a.time, a.id))
+
+    def __len__(self):
+        return len(self._alarms)
+
+    def _sync(self):
+        """Apply alarm changes made in the store since the last sync"""
+        rows, version = self.store.changes(self._version, self.users)
+        with self._cond:
+            for alarm_id, user, time_str, recurrence, next_due, cancelled, _ in rows:
+                alarm = self._alarms.get(alarm_id)
+                if cancelled or next_due is None:
+                    if alarm is not None:
+                        self._forget(alarm)
+                        self._cancelled += 1
+                elif alarm is None:
+                    alarm_time = datetime.datetime.strptime(time_str, "%H:%M").time()
+                    self._register(Alarm(alarm_id, user, alarm_time, recurrence,
+                                         parse_recurrence(recurrence), next_due))
+                elif alarm.due != next_due:
+                    # Another worker fired it; follow its schedule
+                    alarm.due = next_due
+                    self._push(alarm)
+            self._version = version
+            self._last_sync = self.clock()
+        # Take over occurrences claimed by a worker that died before handling them
+        for alarm_id, due, user, time_str, recurrence in self.store.expired_claims():
+            if self.users is not None and user not in self.users:
+                continue
+            if self.store.reclaim(alarm_id, due, self.worker_id, self.lease):
+                alarm_time = datetime.datetime.strptime(time_str, "%H:%M").time()
+                alarm = Alarm(alarm_id, user, alarm_time, recurrence, parse_recurrence(recurrence), due)
+                self.fired += 1
+                self._executor.submit(self._fire, alarm, due)
+
+    def _sync_due(self, now):
+        return self.store is not None and now - self._last_sync >= self.sync_interval
+
+    def _run(self):
+        while True:
+            due_now = []
+            with self._cond:
+                while self._running:
+                    while self._heap and (self._heap[0][2].cancelled or self._heap[0][0] != self._heap[0][2].due):
+                        _, _, stale = heapq.heappop(self._heap)
+                        if stale.cancelled:
+                            self._cancelled = max(self._cancelled - 1, 0)
+                    now = self.clock()
+                    if self._sync_due(now):
+                        break
+                    timeout = None if self.store is None else self._last_sync + self.sync_interval - now
+                    if self._heap:
+                        delay = self._heap[0][0] - now
+                        if delay <= 0:
+                            due_now = self._pop_due(now)
+                            break
+                        timeout = min(delay, MAX_SLEEP, timeout if timeout is not None else MAX_SLEEP)
+                    self._cond.wait(timeout)
+                if not self._running:
+                    return
+            if self._sync_due(self.clock()):
+                self._sync()
+            for alarm, due, next_due in due_now:
+                if self.store is not None and not self.store.claim(alarm.id, due, next_due, self.worker_id, self.lease):
+                    # Another worker got this occurrence
+                    continue
+                self.fired += 1
+                self._executor.submit(self._fire, alarm, due)
+
+    def _pop_due(self, now):
+        """Pop every alarm due by `now` and schedule its next occurrence"""
+        # Callers hold self._cond
+        due_now = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, alarm = heapq.heappop(self._heap)
+            if alarm.cancelled:
+                self._cancelled = max(self._cancelled - 1, 0)
+                continue
+            if due != alarm.due:
+                continue
+            self.max_lateness = max(self.max_lateness, now - due)
+            metrics.observe("alarm.lateness", max(now - due, 0.0))
+            if alarm.days is None:
+                next_due = None
+                self._forget(alarm)
+            else:
+                # Alarms missed while nothing was running fire once, not once per missed day
+                after = datetime.datetime.fromtimestamp(max(due, now))
+                next_due = alarm.due = next_occurrence(alarm.time, alarm.days, after).timestamp()
+                self._push(alarm)
+            due_now.append((alarm, due, next_due))
+        return due_now
+
+    def _fire(self, alarm, due):
+        metrics.incr("alarm.fired")
+        try:
+            self.on_fire(alarm)
+        except Exception as e:
+            print(f"Error handling alarm {alarm}: {e}")
+        finally:
+            if self.store is not None:
+                self.store.complete(alarm.id, due)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "alarms": len(self._alarms),
+                "heap_size": len(self._heap),
+                "users": len(self._by_user),
+                "fired": self.fired,
+                "max_lateness": self.max_lateness,
+                "next_due": self._heap[0][0] if self._heap else None,
+            }
@@ -0,0 +1,301 @@
+import bisect
+import datetime
+import threading
+
+from storage.backend import DEFAULT_USER, StorageBackend
+from tasks.task_parser import parse_tasks
+
+# A day extends a streak once at least this many of its tasks are done
+STREAK_MIN_COMPLETED = 1
+
+
+def day_counts(entry):
+    """(tasks, completed tasks) of one history entry"""
+    tasks = entry.get("tasks", [])
+    if not isinstance(tasks, list):
+        # Raw model output stored before tasks were structured
+        tasks = parse_tasks(str(tasks)) if tasks else []
+    completed = sum(1 for task in tasks if isinstance(task, dict) and task.get("completed"))
+    return len(tasks), completed
+
+
+def format_rate(rate):
+    """A completion rate as a whole percentage, or "-" when there was nothing to complete"""
+    return "-" if rate is None else f"{rate:.0%}"
+
+
+def day_number(date):
+    """Proleptic ordinal of a YYYY-MM-DD date, or None if it is not one"""
+    try:
+        return datetime.date.fromisoformat(str(date)).toordinal()
+    except ValueError:
+        return None
+
+
+def week_number(day):
+    # Ordinal 1 (0001-01-01) is a Monday, so weeks run Monday to Sunday
+    return (day - 1) // 7
+
+
+class GoalStats:
+    """Completion aggregates for one user, kept current one day at a time.
+
+    Holds each day's (tasks, completed) counts, running totals, per-week
+    totals and the runs of consecutive streak days, so `summary` reads a
+    handful of dict entries however long the history is. `set_day` applies
+    the change to a single day, and `from_entries` builds everything from a
+    full history with NumPy for backfills.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.weeks = {}
+        self.goals = 0
+        self.tasks = 0
+        self.completed = 0
+        self.longest = 0
+        # Streak runs: sorted starts, start -> end, end -> start, length -> count
+        self._starts = []
+        self._end_of = {}
+        self._start_of = {}
+        self._lengths = {}
+
+    @classmethod
+    def from_entries(cls, entries):
+        import numpy as np
+        stats = cls()
+        counts = {}
+        for entry in entries:
+            day = day_number(entry.get("date"))
+            if day is not None:
+                counts[day] = day_counts(entry)
+        if not counts:
+            return stats
+        days = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        totals = np.fromiter((c[0] for c in counts.values()), dtype=np.int64, count=len(counts))
+        done = np.fromiter((c[1] for c in counts.values()), dtype=np.int64, count=len(counts))
+        stats.days = counts
+        stats.goals = len(counts)
+        stats.tasks = int(totals.sum())
+        stats.completed = int(done.sum())
+
+        weeks, index = np.unique(week_number(days), return_inverse=True)
+        week_tasks = np.bincount(index, weights=totals, minlength=len(weeks))
+        week_done = np.bincount(index, weights=done, minlength=len(weeks))
+        stats.weeks = {int(w): [int(t), int(c)] for w, t, c in zip(weeks, week_tasks, week_done)}
+
+        active = np.sort(days[done >= STREAK_MIN_COMPLETED])
+        if active.size:
+            # A run breaks wherever consecutive active days are more than a day apart
+            breaks = np.flatnonzero(np.diff(active) != 1)
+            starts = np.concatenate((active[:1], active[breaks + 1]))
+            ends = np.concatenate((active[breaks], active[-1:]))
+            stats._starts = starts.tolist()
+            stats._end_of = dict(zip(stats._starts, ends.tolist()))
+            stats._start_of = dict(zip(ends.tolist(), stats._starts))
+            lengths, runs = np.unique(ends - starts + 1, return_counts=True)
+            stats._lengths = dict(zip(lengths.tolist(), runs.tolist()))
+            stats.longest = int(lengths[-1])
+        return stats
+
+    def set_day(self, date, counts):
+        """Record a day's (tasks, completed) counts; None removes the day"""
+        day = day_number(date)
+        if day is None:
+            return
+        old = self.days.get(day)
+        if old == counts:
+            return
+        week = self.weeks.setdefault(week_number(day), [0, 0])
+        if old is not None:
+            self.goals -= 1
+            self.tasks -= old[0]
+            self.completed -= old[1]
+            week[0] -= old[0]
+            week[1] -= old[1]
+            del self.days[day]
+        if counts is not None:
+            self.goals += 1
+            self.tasks += counts[0]
+            self.completed += counts[1]
+            week[0] += counts[0]
+            week[1] += counts[1]
+            self.days[day] = counts
+        was_active = old is not None and old[1] >= STREAK_MIN_COMPLETED
+        is_active = counts is not None and counts[1] >= STREAK_MIN_COMPLETED
+        if is_active and not was_active:
+            self._activate(day)
+        elif was_active and not is_active:
+            self._deactivate(day)
+
+    def _add_run(self, start, end):
+        bisect.insort(self._starts, start)
+        self._end_of[start] = end
+        self._start_of[end] = start
+        length = end - start + 1
+        self._lengths[length] = self._lengths.get(length, 0) + 1
+        self.longest = max(self.longest, length)
+
+    def _drop_run(self, start, end):
+        del self._starts[bisect.bisect_left(self._starts, start)]
+        del self._end_of[start]
+        del self._start_of[end]
+        length = end - start + 1
+        self._lengths[length] -= 1
+        if not self._lengths[length]:
+            del self._lengths[length]
+            if length == self.longest:
+                self.longest = max(self._lengths, default=0)
+
+    def _activate(self, day):
+        start = end = day
+        if day - 1 in self._start_of:
+            start = self._start_of[day - 1]
+            self._drop_run(start, day - 1)
+        if day + 1 in self._end_of:
+            end = self._end_of[day + 1]
+            self._drop_run(day + 1, end)
+        self._add_run(start, end)
+
+    def _deactivate(self, day):
+        start = self._starts[bisect.bisect_right(self._starts, day) - 1]
+        end = self._end_of[start]
+        self._drop_run(start, end)
+        if start < day:
+            self._add_run(start, day - 1)
+        if day < end:
+            self._add_run(day + 1, end)
+
+    def current_streak(self, today):
+        """Length of the streak that ends today, or yesterday if today's is not yet earned"""
+        day = today.toordinal()
+        for end in (day, day - 1):
+            start = self._start_of.get(end)
+            if start is not None:
+                return end - start + 1
+        return 0
+
+    def week_rate(self, week):
+        tasks, completed = self.weeks.get(week, (0, 0))
+        return completed / tasks if tasks else None
+
+    def summary(self, today=None, weeks=8):
+        """Completion rates, streaks and the last `weeks` weekly rates (oldest first)"""
+        today = today or datetime.date.today()
+        day = today.toordinal()
+        tasks, completed = self.days.get(day, (0, 0))
+        this_week = week_number(day)
+        trend = []
+        for week in range(this_week - weeks + 1, this_week + 1):
+            monday = datetime.date.fromordinal(week * 7 + 1)
+            trend.append((monday.strftime("%Y-%m-%d"), self.week_rate(week)))
+        return {
+            "today_rate": completed / tasks if tasks else None,
+            "week_rate": self.week_rate(this_week),
+            "overall_rate": self.completed / self.tasks if self.tasks else None,
+            "current_streak": self.current_streak(today),
+            "longest_streak": self.longest,
+            "goals": self.goals,
+            "average_tasks_per_goal": self.tasks / self.goals if self.goals else 0.0,
+            "weekly_rates": trend,
+        }
+
+
+class StatsTrackingStore(StorageBackend):
+    """Storage wrapper that keeps each user's GoalStats current.
+
+    Every write re-reads the one entry it changed and applies the difference,
+    so the aggregates never need a rescan; a user's are built in bulk from
+    their history the first time they are asked for. When the backend's
+    signature changes for any reason other than these writes (another process
+    wrote to the same data), the aggregates are rebuilt on the next read.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._stats = {}
+        # Backend signature the aggregates are known to reflect
+        self._signature = backend.signature()
+
+    def goal_stats(self, user=DEFAULT_USER, today=None):
+        """Summary of the user's completion aggregates"""
+        with self._lock:
+            signature = self.backend.signature()
+            if signature != self._signature:
+                self._stats.clear()
+                self._signature = signature
+            stats = self._stats.get(user)
+            if stats is None:
+                stats = self._stats[user] = GoalStats.from_entries(self.backend.load_all(user)["goals"])
+            return stats.summary(today)
+
+    def rebuild(self, user=None):
+        """Drop the aggregates of `user` (or everyone) so the next read rebuilds them"""
+        with self._lock:
+            if user is None:
+                self._stats.clear()
+            else:
+                self._stats.pop(user, None)
+
+    def _track(self, date, user, before):
+        # Read and apply under the lock so two writes to a day can't apply out of order
+        with self._lock:
+            stats = self._stats.get(user)
+            if stats is not None:
+                entry = self.backend.get_entry(date, user)
+                stats.set_day(date, day_counts(entry) if entry is not None else None)
+            # Only when nothing else changed the data since the aggregates were
+            # current is the new signature this write's alone
+            if before == self._signature:
+                self._signature = self.backend.signature()
+
+    # Writes update the aggregates
+
+    def save_goal_and_tasks(self, date, goal, tasks, user=DEFAULT_USER, version=None):
+        before = self.backend.signature()
+        result = self.backend.save_goal_and_tasks(date, goal, tasks, user, version)
+        self._track(date, user, before)
+        return result
+
+    def update_tasks(self, date, tasks, user=DEFAULT_USER, version=None):
+        before = self.backend.signature()
+        result = self.backend.update_tasks(date, tasks, user, version)
+        self._track(date, user, before)
+        return result
+
+    def set_task_completed(self, date, index, completed, user=DEFAULT_USER):
+        before = self.backend.signature()
+        result = self.backend.set_task_completed(date, index, completed, user)
+        self._track(date, user, before)
+        return result
+
+    def set_tasks_completed(self, date, changes, user=DEFAULT_USER):
+        before = self.backend.signature()
+        result = self.backend.set_tasks_completed(date, changes, user)
+        self._track(date, user, before)
+        return result
+
+    # Reads go straight through
+
+    def load_all(self, user=DEFAULT_USER):
+        return self.backend.load_all(user)
+
+    def list_users(self):
+        return self.backend.list_users()
+
+    def signature(self):
+        return self.backend.signature()
+
+    def get_entry(self, date, user=DEFAULT_USER):
+        return self.backend.get_entry(date, user)
+
+    def get_history(self, start_date=None, end_date=None, limit=None, offset=0,
+                    newest_first=True, user=DEFAULT_USER):
+        return self.backend.get_history(start_date, end_date, limit, offset, newest_first, user)
+
+    def count_history(self, start_date=None, end_date=None, user=DEFAULT_USER):
+        return self.backend.count_history(start_date, end_date, user)
+
+    def close(self):
+        self.backend.close()
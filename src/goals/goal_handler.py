@@ -1,120 +1,128 @@
-import json
-import os
 import datetime
 
+from analytics.goal_stats import StatsTrackingStore
+from storage.backend import ConflictError, create_backend
+
 class GoalHandler:
-    def __init__(self):
-        self.data_file = os.path.join("data", "user_data.json")
-        self._ensure_data_file_exists()
-    
-    def _ensure_data_file_exists(self):
-        """Make sure the data directory and file exist"""
-        os.makedirs(os.path.dirname(self.data_file), exist_ok=True)
-        if not os.path.exists(self.data_file):
-            with open(self.data_file, 'w') as f:
-                json.dump({"goals": []}, f)
-    
-    def get_goal_from_user(self):
-        """Prompt the user to set their goal for the day"""
+    def __init__(self, store=None):
+        if store is None:
+            # The same backend and data file the Streamlit app is configured with
+            import config
+            store = StatsTrackingStore(create_backend(config.STORAGE_BACKEND, config.USER_DATA_FILE))
+        self.store = store
+
+    def _today(self):
+        return datetime.datetime.now().strftime("%Y-%m-%d")
+
+    def get_goal_from_user(self, suggestion=None):
+        """Prompt the user to set their goal for the day; Enter accepts `suggestion`"""
         print("\n🔔 Alarm triggered! Time to set your goal for today.")
+        if suggestion:
+            goal = input(f"What's your main goal for today? [Enter for '{suggestion}'] ")
+            return goal.strip() or suggestion
         goal = input("What's your main goal for today? ")
         return goal.strip() if goal.strip() else None
-    
+
     def save_goal_and_tasks(self, goal, tasks):
         """Save the goal and associated tasks"""
         try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-            
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            # Remove any existing entry for today before adding new one
-            data["goals"] = [g for g in data["goals"] if g.get("date") != today]
-            
-            data["goals"].append({
-                "date": today,
-                "goal": goal,
-                "tasks": tasks
-            })
-            
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=4)
-            
+            today = self._today()
+            self.store.save_goal_and_tasks(today, goal, tasks)
             print(f"Goal and tasks saved for {today}")
             return True
         except Exception as e:
             print(f"Error saving goal and tasks: {e}")
             return False
-    
+
     def save_goal_and_structured_tasks(self, goal, task_list):
         """Save the goal and associated structured tasks with completion status"""
         try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-            
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            # Remove any existing entry for today before adding new one
-            data["goals"] = [g for g in data["goals"] if g.get("date") != today]
-            
-            data["goals"].append({
-                "date": today,
-                "goal": goal,
-                "tasks": task_list
-            })
-            
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=4)
-            
+            today = self._today()
+            self.store.save_goal_and_tasks(today, goal, task_list)
             print(f"Goal and structured tasks saved for {today}")
             return True
         except Exception as e:
             print(f"Error saving goal and structured tasks: {e}")
             return False
-    
-    def get_todays_goals_and_tasks(self):
-        """Get today's goal and tasks"""
+
+    def get_todays_entry(self):
+        """Get today's entry, including the version to pass back when rewriting it"""
         try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-            
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            for entry in data["goals"]:
-                if entry.get("date") == today:
-                    return entry.get("goal", ""), entry.get("tasks", [])
-            
-            return None
+            return self.store.get_entry(self._today())
         except Exception as e:
             print(f"Error getting today's goals and tasks: {e}")
             return None
-    
-    def update_todays_tasks(self, task_list):
-        """Update today's tasks with new completion statuses"""
+
+    def get_todays_goals_and_tasks(self):
+        """Get today's goal and tasks"""
+        entry = self.get_todays_entry()
+        if entry is None:
+            return None
+        return entry.get("goal", ""), entry.get("tasks", [])
+
+    def update_todays_tasks(self, task_list, version=None):
+        """Update today's tasks; with `version`, only if they have not changed since it was read"""
         try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-            
-            today = datetime.datetime.now().strftime("%Y-%m-%d")
-            
-            for entry in data["goals"]:
-                if entry.get("date") == today:
-                    entry["tasks"] = task_list
-                    break
-            
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=4)
-            
-            return True
+            return self.store.update_tasks(self._today(), task_list, version=version)
+        except ConflictError:
+            print("Today's tasks were changed elsewhere; reload them and try again.")
+            return False
         except Exception as e:
             print(f"Error updating task completion: {e}")
             return False
-    
+
+    def replace_todays_tasks(self, expected, task_list):
+        """Swap in `task_list` if today's tasks are still exactly `expected`
+
+        Used to upgrade stand-in tasks once generated ones arrive, so anything
+        the user has already checked off or edited is left alone.
+        """
+        try:
+            return self.store.replace_tasks(self._today(), expected, task_list)
+        except Exception as e:
+            print(f"Error updating today's tasks: {e}")
+            return False
+
+    def set_task_completed(self, index, completed):
+        """Update the completion status of one of today's tasks"""
+        try:
+            return self.store.set_task_completed(self._today(), index, completed)
+        except Exception as e:
+            print(f"Error updating task completion: {e}")
+            return False
+
+    def get_history_page(self, offset=0, limit=10, start_date=None, end_date=None):
+        """Get one page of history, newest first"""
+        try:
+            return self.store.get_history(start_date, end_date, limit=limit, offset=offset)
+        except Exception as e:
+            print(f"Error getting goal history: {e}")
+            return []
+
+    def count_history(self, start_date=None, end_date=None):
+        """Count history entries between two dates (inclusive)"""
+        try:
+            return self.store.count_history(start_date, end_date)
+        except Exception:
+            return 0
+
+    def get_stats(self):
+        """Completion rates, streaks and averages; None if the store keeps no statistics"""
+        try:
+            return self.store.goal_stats()
+        except AttributeError:
+            return None
+        except Exception as e:
+            print(f"Error getting statistics: {e}")
+            return None
+
+    def close(self):
+        """Flush buffered writes and release the store"""
+        self.store.close()
+
     def get_goals_history(self):
         """Get the history of goals and tasks"""
         try:
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-            return data["goals"]
+            return self.store.load_all()["goals"]
         except Exception:
             return []
\ No newline at end of file
@@ -1,28 +1,125 @@
+import time
+
+# --profile-startup reports the time spent importing from here
+IMPORT_STARTED = time.perf_counter()
+
 import sys
 import os
 
 # Add the parent directory to path so we can import config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from alarm.alarm_manager import AlarmManager
-from goals.goal_handler import GoalHandler
-from tasks.task_generator import TaskGenerator
-from ai.openai_client import OpenAIClient
-from ui.app_interface import AppInterface
+from monitoring.metrics import metrics
 import config
 
-def main():
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+def build_app():
+    """Create every component and the UI, timing each as startup.init
+
+    Each component's modules are imported inside its span, so they load
+    only when the app is built and the profile charges them to it.
+    """
+    def init(component):
+        return metrics.span("startup.init", component=component)
+
     # Initialize OpenAI client
-    openai_client = OpenAIClient(api_key=config.OPENAI_API_KEY)
-    
+    with init("openai_client"):
+        from ai.openai_client import OpenAIClient
+        openai_client = OpenAIClient(
+            api_key=config.OPENAI_API_KEY,
+            base_url=config.OPENAI_BASE_URL,
+            timeout=config.OPENAI_TIMEOUT,
+            max_retries=config.OPENAI_MAX_RETRIES,
+        )
+    with init("scheduler"):
+        from ai.scheduler import GenerationScheduler
+        scheduler = GenerationScheduler(
+            openai_client,
+            max_concurrency=config.OPENAI_MAX_CONCURRENCY,
+            requests_per_minute=config.OPENAI_REQUESTS_PER_MINUTE,
+            tokens_per_minute=config.OPENAI_TOKENS_PER_MINUTE,
+        )
+
     # Initialize components
-    task_generator = TaskGenerator(openai_client)
-    goal_handler = GoalHandler()
-    alarm_manager = AlarmManager(goal_handler, task_generator)
-    
-    # Initialize UI
-    app = AppInterface(alarm_manager, goal_handler)
+    with init("response_cache"):
+        from ai.response_cache import ResponseCache
+        response_cache = ResponseCache(
+            config.RESPONSE_CACHE_FILE,
+            max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+            max_disk_bytes=config.RESPONSE_CACHE_MAX_BYTES,
+            ttl=config.RESPONSE_CACHE_TTL,
+        )
+    with init("store"):
+        from storage.backend import create_backend
+        store = create_backend(config.STORAGE_BACKEND, config.USER_DATA_FILE)
+    with init("task_generator"):
+        from ai.model_router import default_router
+        from ai.semantic_cache import SemanticGoalIndex
+        from tasks.task_generator import TASK_PROMPT, TaskGenerator
+        # The goal history is indexed in the background once startup is done
+        similar_goals = SemanticGoalIndex(threshold=config.SIMILAR_GOAL_THRESHOLD, store=store)
+        router = default_router(config.TASK_MODEL_SMALL, None, TASK_PROMPT, config.TASK_MAX_TOKENS)
+        task_generator = TaskGenerator(scheduler, max_tokens=config.TASK_MAX_TOKENS, cache=response_cache,
+                                       similar_goals=similar_goals, router=router,
+                                       hedge_deadline=config.HEDGE_DEADLINE)
+    with init("goal_handler"):
+        from analytics.goal_stats import StatsTrackingStore
+        from goals.goal_handler import GoalHandler
+        from storage.write_buffer import WriteBehindBuffer
+        goal_handler = GoalHandler(StatsTrackingStore(WriteBehindBuffer(store, delay=config.WRITE_BEHIND_DELAY)))
+    with init("alarm_manager"):
+        from alarm.alarm_manager import AlarmManager
+        from alarm.alarm_store import AlarmStore
+        alarm_manager = AlarmManager(
+            goal_handler,
+            task_generator,
+            store=AlarmStore(config.ALARM_DB_FILE),
+            pregenerate=config.PREGENERATE_TASKS,
+            pregenerate_lead_time=config.PREGENERATE_LEAD_TIME,
+        )
+
+    with init("generation_queue"):
+        from tasks.job_queue import GenerationQueue
+        jobs = GenerationQueue(task_generator, config.GENERATION_JOBS_FILE, store=goal_handler.store,
+                               max_workers=config.GENERATION_WORKERS)
+
+    # Initialize UI, which registers the alarm callback before any alarm can fire
+    with init("ui"):
+        from ui.app_interface import AppInterface
+        app = AppInterface(alarm_manager, goal_handler, jobs=jobs)
+    with init("alarms"):
+        alarm_manager.start()
+    with init("generation_jobs"):
+        # Resumes jobs left unfinished by the last run
+        jobs.start()
+    similar_goals.warm()
+    return app
+
+def print_startup_profile(spans, total):
+    """Print where launch time went: imports, then each component"""
+    print("Startup profile")
+    print(f"{IMPORT_SECONDS * 1000:9.1f} ms  imports")
+    for name, labels, seconds in spans:
+        if name == "startup.init":
+            print(f"{seconds * 1000:9.1f} ms  {labels['component']}")
+    print(f"{(IMPORT_SECONDS + total) * 1000:9.1f} ms  total")
+    print("Run with python -X importtime for a per-module import breakdown.")
+
+def main():
+    profile = "--profile-startup" in sys.argv[1:]
+    started = time.perf_counter()
+    with metrics.trace() as spans:
+        app = build_app()
+    if profile:
+        # Report and exit without entering the menu loop
+        print_startup_profile(spans, time.perf_counter() - started)
+        app.alarm_manager.stop()
+        app.jobs.stop()
+        app.goal_handler.close()
+        return
+    metrics.start_exporter(config.METRICS_FILE, config.METRICS_EXPORT_INTERVAL, config.METRICS_PORT)
     app.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,209 @@
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+from storage.atomic_file import atomic_write
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _Timer:
+    __slots__ = ("count", "sum", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+
+class _Span:
+    __slots__ = ("metrics", "name", "labels", "start")
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class Metrics:
+    """Process-wide counters and timing histograms for the hot paths.
+
+    Recording is a dict lookup and a few additions under one lock, cheap
+    enough to leave on everywhere. `span` times a block; inside `trace()` the
+    spans recorded by the current thread are also collected in order, which
+    is how the Streamlit debug panel breaks down a single rerun. Export with
+    `write` (Prometheus text, or JSON for a .json path), or `start_exporter`
+    to rewrite a file periodically and/or serve /metrics over HTTP.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+    def incr(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            timer = self._timers.get(key)
+            if timer is None:
+                timer = self._timers[key] = _Timer()
+            timer.count += 1
+            timer.sum += seconds
+            timer.max = max(timer.max, seconds)
+            timer.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        spans = getattr(self._local, "spans", None)
+        if spans is not None:
+            spans.append((name, labels, seconds))
+
+    def span(self, name, **labels):
+        """Context manager timing the enclosed block as `name`"""
+        return _Span(self, name, labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of span"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def begin_trace(self):
+        """Start collecting the (name, labels, seconds) of every span this thread records"""
+        self._local.spans = spans = []
+        return spans
+
+    def end_trace(self):
+        self._local.spans = None
+
+    @contextlib.contextmanager
+    def trace(self):
+        """Collect the spans this thread records in the block; see begin_trace"""
+        previous = getattr(self._local, "spans", None)
+        spans = self.begin_trace()
+        try:
+            yield spans
+        finally:
+            self._local.spans = previous
+
+    def snapshot(self):
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            timers = []
+            for (name, labels), timer in sorted(self._timers.items()):
+                cumulative, buckets = 0, {}
+                for bound, count in zip(BUCKETS + (float("inf"),), timer.buckets):
+                    cumulative += count
+                    buckets["+Inf" if bound == float("inf") else repr(bound)] = cumulative
+                timers.append({
+                    "name": name, "labels": dict(labels), "count": timer.count,
+                    "sum": timer.sum, "max": timer.max, "buckets": buckets,
+                })
+        return {"timestamp": time.time(), "counters": counters, "timers": timers}
+
+    def prometheus_text(self):
+        def series(name, labels, extra=None):
+            labels = dict(labels, **(extra or {}))
+            if not labels:
+                return name
+            return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+        lines, typed = [], set()
+        snapshot = self.snapshot()
+        for counter in snapshot["counters"]:
+            name = counter["name"].replace(".", "_") + "_total"
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{series(name, counter['labels'])} {counter['value']}")
+        for timer in snapshot["timers"]:
+            name = timer["name"].replace(".", "_") + "_seconds"
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in timer["buckets"].items():
+                lines.append(f"{series(name + '_bucket', timer['labels'], {'le': bound})} {count}")
+            lines.append(f"{series(name + '_sum', timer['labels'])} {timer['sum']}")
+            lines.append(f"{series(name + '_count', timer['labels'])} {timer['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write the metrics to `path` atomically (JSON if it ends in .json)"""
+        if path.endswith(".json"):
+            text = json.dumps(self.snapshot(), indent=2)
+        else:
+            text = self.prometheus_text()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with atomic_write(path) as f:
+            f.write(text)
+
+    def start_exporter(self, path=None, interval=15.0, port=None):
+        """Rewrite `path` every `interval` seconds and/or serve /metrics on `port`"""
+        if path:
+            def export():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.write(path)
+                    except OSError as e:
+                        print(f"Error writing metrics: {e}")
+            threading.Thread(target=export, daemon=True, name="metrics-export").start()
+        if port:
+            from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+            metrics = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def log_message(self, format, *args):
+                    pass
+
+                def do_GET(self):
+                    if self.path.startswith("/metrics.json"):
+                        body, kind = json.dumps(metrics.snapshot()).encode("utf-8"), "application/json"
+                    elif self.path.startswith("/metrics"):
+                        body, kind = metrics.prometheus_text().encode("utf-8"), "text/plain; version=0.0.4"
+                    else:
+                        self.send_error(404)
+                        return
+                    self.send_response(200)
+                    self.send_header("Content-Type", kind)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+            server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+            return server
+
+
+# Shared by every module so one export covers the whole process
+metrics = Metrics()
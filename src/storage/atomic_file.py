@@ -0,0 +1,46 @@
+import contextlib
+import os
+import tempfile
+
+
+def fsync_directory(directory):
+    """Persist a rename in `directory` (a no-op where directories can't be opened)"""
+    try:
+        fd = os.open(directory or ".", os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    """Write `path` so readers and crashes see either the old file or the new one.
+
+    The content goes to a uniquely named temporary file in the same directory,
+    which is flushed and fsynced before it is renamed over `path`; the rename is
+    then made durable by syncing the directory. If the block raises, `path` is
+    left untouched.
+    """
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            # mkstemp creates the file owner-only; keep the mode of the file being replaced
+            try:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+    fsync_directory(directory)
@@ -0,0 +1,85 @@
+import os
+
+DEFAULT_USER = "default"
+
+
+class ConflictError(Exception):
+    """A write lost to a concurrent write of the same entry"""
+
+
+class StorageBackend:
+    """Interface shared by every goal data store.
+
+    Entries are dicts with "date", "goal" and "tasks" keys and are identified by
+    (user, date). Methods that return entries hand back copies unless noted.
+    Each entry also carries a "version" that every write to it increments;
+    passing the version an entry was read at as `version` turns a write into a
+    compare-and-swap that raises ConflictError if the entry changed since.
+    """
+
+    def load_all(self, user=DEFAULT_USER):
+        """Return {"goals": [...]} with every entry for `user`; treat it as read-only"""
+        raise NotImplementedError
+
+    def list_users(self):
+        """Return every user that has at least one entry"""
+        raise NotImplementedError
+
+    def get_entry(self, date, user=DEFAULT_USER):
+        """Return the entry for `date`, or None"""
+        raise NotImplementedError
+
+    def save_goal_and_tasks(self, date, goal, tasks, user=DEFAULT_USER, version=None):
+        """Set the goal and tasks for `date`, replacing any existing entry"""
+        raise NotImplementedError
+
+    def update_tasks(self, date, tasks, user=DEFAULT_USER, version=None):
+        """Replace the task list of an existing entry"""
+        raise NotImplementedError
+
+    def set_task_completed(self, date, index, completed, user=DEFAULT_USER):
+        """Set the completion status of a single task"""
+        raise NotImplementedError
+
+    def signature(self):
+        """Token that changes whenever the stored data does, whichever process wrote it; None if unknown"""
+        return None
+
+    def replace_tasks(self, date, expected, tasks, user=DEFAULT_USER):
+        """Replace the task list only while it still equals `expected`; True if replaced"""
+        entry = self.get_entry(date, user)
+        if entry is None or entry.get("tasks") != expected:
+            return False
+        try:
+            return bool(self.update_tasks(date, tasks, user, version=entry.get("version")))
+        except ConflictError:
+            return False
+
+    def set_tasks_completed(self, date, changes, user=DEFAULT_USER):
+        """Apply {task index: completed} changes for one day in a single write"""
+        for index, completed in changes.items():
+            self.set_task_completed(date, index, completed, user)
+        return True
+
+    def get_history(self, start_date=None, end_date=None, limit=None, offset=0,
+                    newest_first=True, user=DEFAULT_USER):
+        """Return entries with start_date <= date <= end_date, one page at a time"""
+        raise NotImplementedError
+
+    def count_history(self, start_date=None, end_date=None, user=DEFAULT_USER):
+        """Count the entries get_history would page through"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release any files or connections held by the backend"""
+
+
+def create_backend(kind, data_file):
+    """Build the storage backend named by `kind` ("journal" or "sqlite")"""
+    if kind == "journal":
+        from storage.journal_store import JournalStore
+        return JournalStore(data_file)
+    if kind == "sqlite":
+        from storage.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(os.path.splitext(data_file)[0] + ".db", import_from=data_file)
+    raise ValueError(f"Unknown storage backend: {kind}")
\ No newline at end of file
@@ -0,0 +1,81 @@
+import os
+import threading
+
+
+class DataCache:
+    """Process-wide cache of parsed data keyed by file path.
+
+    Each value is stored with the signature of the files it was parsed from
+    (inode, size, mtime) and the path's generation counter, which writers bump
+    through `invalidate`. A lookup whose signature and generation still match
+    returns the cached value without reading or parsing anything. On a miss the
+    loader is called with the stale value (or None) so it can update it
+    incrementally instead of starting over.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, signature, loader, variant=None):
+        """Return the value cached for `path`, reloading it if the files changed"""
+        path = os.path.abspath(path)
+        key = (path, variant)
+        with self._lock:
+            generation = self._generations.get(path, 0)
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == signature and cached[1] == generation:
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        value = loader(cached[2] if cached is not None else None)
+        with self._lock:
+            self._entries[key] = (signature, generation, value)
+        return value
+
+    def peek(self, path, signature, variant=None):
+        """Return the cached value if it is still current, else None without loading"""
+        path = os.path.abspath(path)
+        with self._lock:
+            cached = self._entries.get((path, variant))
+            if cached is not None and cached[0] == signature and cached[1] == self._generations.get(path, 0):
+                self.hits += 1
+                return cached[2]
+            return None
+
+    def invalidate(self, path):
+        """Bump the generation of `path` so every cached variant reloads"""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._generations[path] = self._generations.get(path, 0) + 1
+
+    def clear(self):
+        """Drop every cached value, so the next lookups parse from scratch"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+def file_signature(path):
+    """Identify a file version by inode, size and modification time"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+# Shared by every backend in the process so Streamlit sessions and reruns reuse it
+shared_cache = DataCache()
@@ -0,0 +1,92 @@
+import bisect
+import json
+import os
+
+from storage.atomic_file import atomic_write
+from storage.backend import DEFAULT_USER
+from storage.data_cache import file_signature
+
+
+class HistoryIndex:
+    """Per-user sorted date -> (byte offset, length) index over a snapshot file.
+
+    The index records the signature of the snapshot it was built for, so a reader
+    can tell when it no longer matches the file and fall back to a full load,
+    and the snapshot's generation, so the journal can be checked against it
+    without parsing the snapshot.
+    """
+
+    def __init__(self, snapshot_sig, users, generation=0):
+        self.snapshot_sig = snapshot_sig
+        self.users = users
+        self.generation = generation
+
+    def dates(self, user=DEFAULT_USER):
+        return self.users.get(user, {}).get("dates", [])
+
+    def locate(self, date, user=DEFAULT_USER):
+        """Return (offset, length) of the entry for `date`, or None"""
+        columns = self.users.get(user)
+        if not columns:
+            return None
+        i = bisect.bisect_left(columns["dates"], date)
+        if i < len(columns["dates"]) and columns["dates"][i] == date:
+            return columns["offsets"][i], columns["lengths"][i]
+        return None
+
+    def read_entries(self, data_file, keys):
+        """Read only the entries for `keys` ((user, date) pairs) from the snapshot"""
+        entries = {}
+        with open(data_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            if (st.st_ino, st.st_size, st.st_mtime_ns) != self.snapshot_sig:
+                return None
+            for user, date in keys:
+                location = self.locate(date, user)
+                if location is None:
+                    continue
+                f.seek(location[0])
+                entries[(user, date)] = json.loads(f.read(location[1]))
+        return entries
+
+    @classmethod
+    def load(cls, index_file):
+        try:
+            with open(index_file, 'r') as f:
+                raw = json.load(f)
+            return cls(tuple(raw["snapshot"]), raw["users"], raw.get("generation", 0))
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+
+def write_indexed_snapshot(data_file, index_file, data):
+    """Write the snapshot one entry per line and persist the offsets of each entry.
+
+    The output is still a plain {"goals": [...]} JSON document, so anything that
+    reads the whole file keeps working.
+    """
+    extra = {k: v for k, v in data.items() if k != "goals"}
+    header = json.dumps(extra)[:-1] if extra else "{"
+    if extra:
+        header += ", "
+    header += '"goals": [\n'
+    locations = []
+    with atomic_write(data_file, 'wb') as f:
+        f.write(header.encode("utf-8"))
+        goals = data.get("goals", [])
+        for i, entry in enumerate(goals):
+            encoded = json.dumps(entry).encode("utf-8")
+            locations.append((entry.get("user", DEFAULT_USER), entry.get("date"), f.tell(), len(encoded)))
+            f.write(encoded)
+            f.write(b",\n" if i < len(goals) - 1 else b"\n")
+        f.write(b"]}\n")
+
+    users = {}
+    for user, date, offset, length in sorted(locations, key=lambda l: (l[0], l[1] or "")):
+        columns = users.setdefault(user, {"dates": [], "offsets": [], "lengths": []})
+        columns["dates"].append(date)
+        columns["offsets"].append(offset)
+        columns["lengths"].append(length)
+    with atomic_write(index_file) as f:
+        json.dump({"snapshot": file_signature(data_file), "generation": data.get("generation", 0),
+                   "users": users}, f)
@@ -0,0 +1,556 @@
+import bisect
+import copy
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from storage.backend import DEFAULT_USER, ConflictError, StorageBackend
+from storage.atomic_file import atomic_write
+from storage.data_cache import file_signature, shared_cache
+from storage.history_index import HistoryIndex, write_indexed_snapshot
+from monitoring.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; fall back to in-process locking only
+    fcntl = None
+
+
+class _FileLock:
+    """Advisory lock shared by every process that touches the same data file"""
+
+    def __init__(self, path, exclusive):
+        self.path = path
+        self.exclusive = exclusive
+        self.handle = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.handle = open(self.path, 'a')
+            fcntl.flock(self.handle, fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH)
+        return self
+
+    def __exit__(self, *exc):
+        if self.handle is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+            self.handle = None
+
+
+# Data files with a compaction in progress in this process
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+# Outcomes of recent conditional records kept per state, for their writers to check
+MAX_OUTCOMES = 4096
+
+
+class _JournalState:
+    """Parsed snapshot plus replayed journal, shared by every store on one file"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.data = None
+        self.by_key = {}
+        self.dates = {}
+        self.snapshot_sig = None
+        self.journal_offset = 0
+        self.journal_records = 0
+        self.generation = 0
+        self.stale_journal = False
+        self.outcomes = OrderedDict()
+
+    def user_dates(self, user):
+        return self.dates.get(user, [])
+
+    def entries(self, user, dates):
+        with self.lock:
+            return [copy.deepcopy(self.by_key[(user, d)]) for d in dates if (user, d) in self.by_key]
+
+
+class _IndexedView:
+    """Reads served from the persisted history index plus the journal alone.
+
+    Only the journal is replayed; entries it does not touch are read straight
+    from their offsets in the snapshot, so a page of history costs page-size
+    reads instead of parsing the whole file. Each append is replayed onto the
+    same view, so a write costs the new journal lines, not the history.
+    """
+
+    def __init__(self, data_file, index, journal_ino):
+        self.data_file = data_file
+        self.index = index
+        self.journal_ino = journal_ino
+        self.overlay = _JournalState()
+        self.overlay.data = {"goals": []}
+        self.overlay.generation = index.generation
+        self.overlay.stale_journal = index.generation != 0
+        self._merged_dates = {}
+
+    @property
+    def journal_records(self):
+        return self.overlay.journal_records
+
+    def preload(self, keys):
+        """Copy the snapshot entries for `keys` into the overlay before replaying onto them"""
+        overlay = self.overlay
+        missing = [key for key in keys if key not in overlay.by_key]
+        found = self.index.read_entries(self.data_file, missing) if missing else {}
+        if found is None:
+            return False
+        for (user, date), entry in found.items():
+            overlay.data["goals"].append(entry)
+            overlay.by_key[(user, date)] = entry
+            bisect.insort(overlay.dates.setdefault(user, []), date)
+        return True
+
+    def add_dates(self, keys):
+        """Merge dates the journal added that the index does not know about"""
+        for user, date in keys:
+            if (user, date) not in self.overlay.by_key or self.index.locate(date, user) is not None:
+                continue
+            dates = self._merged_dates.get(user)
+            if dates is None:
+                dates = self._merged_dates[user] = list(self.index.dates(user))
+            i = bisect.bisect_left(dates, date)
+            if i == len(dates) or dates[i] != date:
+                dates.insert(i, date)
+
+    def user_dates(self, user):
+        return self._merged_dates.get(user) or self.index.dates(user)
+
+    def entries(self, user, dates):
+        with self.overlay.lock:
+            missing = [(user, d) for d in dates if (user, d) not in self.overlay.by_key]
+            found = self.index.read_entries(self.data_file, missing) if missing else {}
+            if found is None:
+                return None
+            result = []
+            for d in dates:
+                entry = self.overlay.by_key.get((user, d))
+                if entry is not None:
+                    result.append(copy.deepcopy(entry))
+                elif (user, d) in found:
+                    result.append(found[(user, d)])
+            return result
+
+
+class JournalStore(StorageBackend):
+    """Goal data kept as a snapshot plus an append-only journal of mutations.
+
+    Every mutation is appended to the journal as one small JSON line, so toggling
+    a task writes a constant number of bytes however long the history is. The
+    current state is the snapshot with the journal tail replayed on top, and once
+    the journal grows past `compact_threshold` records a background thread folds
+    it into a fresh snapshot.
+
+    The parsed state lives in the process-wide data cache, so every store opened
+    on the same file shares it, and a read that finds both files unchanged costs
+    two stat calls and no parsing. Each snapshot is written together with a
+    date -> offset index, which lets entry and history reads skip loading the
+    full snapshot when it is not already in memory.
+
+    Writers never take an exclusive lock. Each record names the entry version
+    it was made against and replay applies it only if the entry is still at
+    that version, so of two racing writers exactly one wins; the loser sees
+    its record rejected, re-reads and tries again, up to `max_retries` times.
+    Replaying a record twice is therefore harmless too, and every journal
+    append and snapshot is fsynced before it is acknowledged.
+    """
+
+    def __init__(self, data_file, compact_threshold=500, max_retries=8):
+        self.data_file = data_file
+        base = os.path.splitext(data_file)[0]
+        self.journal_file = base + ".journal"
+        self.lock_file = base + ".lock"
+        self.index_file = base + ".index"
+        self.compact_threshold = compact_threshold
+        self.max_retries = max_retries
+        self._ensure_files()
+
+    def _ensure_files(self):
+        """Make sure the data directory and snapshot file exist"""
+        directory = os.path.dirname(self.data_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.data_file):
+            with _FileLock(self.lock_file, exclusive=True):
+                if not os.path.exists(self.data_file):
+                    self._write_snapshot({"goals": []})
+
+    def signature(self):
+        return (file_signature(self.data_file), file_signature(self.journal_file))
+
+    def _state(self):
+        """Return the shared state, catching up with the files if they changed"""
+        signature = (file_signature(self.data_file), file_signature(self.journal_file))
+        return shared_cache.get(self.data_file, signature, self._refresh)
+
+    def _reader(self):
+        """Return the full state if it is loaded and current, else the indexed view"""
+        signature = (file_signature(self.data_file), file_signature(self.journal_file))
+        state = shared_cache.peek(self.data_file, signature)
+        if state is not None:
+            return state
+        view = shared_cache.get(self.index_file, signature, self._refresh_view)
+        return view if view is not None else self._state()
+
+    def _history_index(self):
+        """Return the parsed index, parsing it again only when the index file changes"""
+        return shared_cache.get(self.index_file, file_signature(self.index_file),
+                                lambda stale: HistoryIndex.load(self.index_file), variant="parsed")
+
+    def _refresh_view(self, view):
+        """Replay the journal tail onto the view, building a new one only after a compaction"""
+        index = self._history_index()
+        if index is None:
+            return None
+        with _FileLock(self.lock_file, exclusive=False):
+            if index.snapshot_sig != file_signature(self.data_file):
+                # Snapshots written before the index existed get one on the next compaction
+                return None
+            journal_sig = file_signature(self.journal_file)
+            journal_ino, journal_size = journal_sig[:2] if journal_sig else (None, 0)
+            if (view is None or view.index is not index or view.journal_ino != journal_ino
+                    or journal_size < view.overlay.journal_offset):
+                view = _IndexedView(self.data_file, index, journal_ino)
+            overlay = view.overlay
+            with overlay.lock:
+                if journal_size <= overlay.journal_offset:
+                    return view
+                lines, end = self._read_journal(overlay.journal_offset)
+                records = []
+                for line in lines:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        pass
+                keys = {(r.get("user", DEFAULT_USER), r["date"]) for r in records if "date" in r}
+                if not view.preload(keys):
+                    return None
+                for record in records:
+                    self._apply(overlay, record)
+                view.add_dates(keys)
+                overlay.journal_records += len(lines)
+                overlay.journal_offset = end
+        return view
+
+    def _refresh(self, state):
+        state = state or _JournalState()
+        with state.lock:
+            with _FileLock(self.lock_file, exclusive=False):
+                self._sync(state)
+        return state
+
+    # Reading
+
+    def load_all(self, user=DEFAULT_USER):
+        """Return the full data dict; callers must treat it as read-only"""
+        state = self._state()
+        with state.lock:
+            if set(state.dates) <= {user}:
+                return state.data
+            return {"goals": [e for e in state.data["goals"] if e.get("user", DEFAULT_USER) == user]}
+
+    def list_users(self):
+        state = self._state()
+        with state.lock:
+            return sorted(state.dates)
+
+    def get_entry(self, date, user=DEFAULT_USER):
+        """Return a copy of the entry for `date`, or None"""
+        entries = self._read_entries(self._reader(), user, [date])
+        return entries[0] if entries else None
+
+    def get_history(self, start_date=None, end_date=None, limit=None, offset=0,
+                    newest_first=True, user=DEFAULT_USER):
+        """Return one page of entries, reading only the entries on that page"""
+        reader = self._reader()
+        dates = reader.user_dates(user)
+        lo, hi = self._range_bounds(dates, start_date, end_date)
+        if newest_first:
+            stop = hi - offset
+            start = lo if limit is None else max(stop - limit, lo)
+            page = dates[start:stop][::-1] if stop > start else []
+        else:
+            start = lo + offset
+            stop = hi if limit is None else min(start + limit, hi)
+            page = dates[start:stop] if stop > start else []
+        return self._read_entries(reader, user, page)
+
+    def count_history(self, start_date=None, end_date=None, user=DEFAULT_USER):
+        lo, hi = self._range_bounds(self._reader().user_dates(user), start_date, end_date)
+        return hi - lo
+
+    def _read_entries(self, reader, user, dates):
+        entries = reader.entries(user, dates)
+        if entries is None:
+            # The snapshot was replaced under the view; fall back to the full state
+            entries = self._state().entries(user, dates)
+        return entries
+
+    def _range_bounds(self, dates, start_date, end_date):
+        lo = bisect.bisect_left(dates, start_date) if start_date else 0
+        hi = bisect.bisect_right(dates, end_date) if end_date else len(dates)
+        return lo, hi
+
+    def _sync(self, state):
+        # Callers hold the file lock, so the snapshot and journal are consistent
+        snapshot_sig = file_signature(self.data_file)
+        journal_size = os.path.getsize(self.journal_file) if os.path.exists(self.journal_file) else 0
+        if (state.data is None or snapshot_sig != state.snapshot_sig
+                or journal_size < state.journal_offset):
+            self._load_snapshot(state, snapshot_sig)
+        if journal_size > state.journal_offset:
+            self._replay_journal(state)
+
+    @metrics.timed("storage.load_snapshot", backend="journal")
+    def _load_snapshot(self, state, snapshot_sig):
+        try:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading data snapshot: {e}")
+            data = {}
+        if not isinstance(data.get("goals"), list):
+            data["goals"] = []
+        state.data = data
+        state.generation = data.get("generation", 0)
+        # Until the journal's header says otherwise, a journal next to a
+        # compacted snapshot is the one left behind by a crash mid-compaction
+        state.stale_journal = state.generation != 0
+        state.by_key = {}
+        state.dates = {}
+        for entry in data["goals"]:
+            self._index_entry(state, entry)
+        for dates in state.dates.values():
+            dates.sort()
+        state.snapshot_sig = snapshot_sig
+        state.journal_offset = 0
+        state.journal_records = 0
+
+    @metrics.timed("storage.replay_journal", backend="journal")
+    def _replay_journal(self, state):
+        lines, end = self._read_journal(state.journal_offset)
+        for line in lines:
+            try:
+                self._apply(state, json.loads(line))
+            except Exception as e:
+                print(f"Skipping unreadable journal record: {e}")
+            state.journal_records += 1
+        state.journal_offset = end
+
+    def _read_journal(self, offset):
+        """Return the complete journal lines after `offset` and the offset past them"""
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        # Only consume complete lines; a trailing partial line is a write in progress
+        end = chunk.rfind(b"\n") + 1
+        return [line for line in chunk[:end].splitlines() if line.strip()], offset + end
+
+    def _index_entry(self, state, entry):
+        user = entry.get("user", DEFAULT_USER)
+        date = entry.get("date")
+        if (user, date) not in state.by_key:
+            state.dates.setdefault(user, []).append(date)
+        state.by_key[(user, date)] = entry
+
+    def _apply(self, state, record):
+        op = record.get("op")
+        if op == "generation":
+            # Compaction starts each journal with the generation of its snapshot;
+            # records in a journal of an older generation are already folded in
+            state.stale_journal = record.get("generation") != state.generation
+            return
+        if state.stale_journal:
+            return
+        date = record.get("date")
+        user = record.get("user", DEFAULT_USER)
+        existing = state.by_key.get((user, date))
+        version = existing.get("version", 0) if existing is not None else 0
+        if "if" in record:
+            applied = record["if"] == version and (op == "goal" or existing is not None)
+            state.outcomes[record.get("id")] = applied
+            if len(state.outcomes) > MAX_OUTCOMES:
+                state.outcomes.popitem(last=False)
+            if not applied:
+                return
+        if op == "goal":
+            entry = {"date": date, "goal": record.get("goal"), "tasks": record.get("tasks", []),
+                     "version": version + 1}
+            if user != DEFAULT_USER:
+                entry["user"] = user
+            if existing is not None:
+                existing.clear()
+                existing.update(entry)
+            else:
+                state.data["goals"].append(entry)
+                state.by_key[(user, date)] = entry
+                bisect.insort(state.dates.setdefault(user, []), date)
+        elif op == "tasks":
+            if existing is not None:
+                existing["tasks"] = record.get("tasks", [])
+                existing["version"] = version + 1
+        elif op == "done":
+            tasks = existing.get("tasks") if existing is not None else None
+            changes = record.get("changes") or [[record.get("index"), record.get("completed")]]
+            for index, completed in changes:
+                if isinstance(tasks, list) and isinstance(index, int) and 0 <= index < len(tasks):
+                    if isinstance(tasks[index], dict):
+                        tasks[index]["completed"] = bool(completed)
+            if existing is not None:
+                existing["version"] = version + 1
+
+    # Writing
+
+    def save_goal_and_tasks(self, date, goal, tasks, user=DEFAULT_USER, version=None):
+        """Set the goal and tasks for `date`, replacing any existing entry"""
+        return self._write({"op": "goal", "date": date, "goal": goal, "tasks": tasks}, user, version)
+
+    def update_tasks(self, date, tasks, user=DEFAULT_USER, version=None):
+        """Replace the task list of an existing entry"""
+        return self._write({"op": "tasks", "date": date, "tasks": tasks}, user, version,
+                           lambda entry: entry is not None)
+
+    def set_task_completed(self, date, index, completed, user=DEFAULT_USER):
+        """Set the completion status of a single task"""
+        def valid(entry):
+            tasks = entry.get("tasks") if entry else None
+            return isinstance(tasks, list) and 0 <= index < len(tasks)
+        record = {"op": "done", "date": date, "index": index, "completed": bool(completed)}
+        return self._write(record, user, check=valid)
+
+    def set_tasks_completed(self, date, changes, user=DEFAULT_USER):
+        """Apply several completion changes to one day as a single journal record"""
+        if not changes:
+            return True
+        pairs = [[index, bool(completed)] for index, completed in sorted(changes.items())]
+        return self._write({"op": "done", "date": date, "changes": pairs}, user,
+                           check=lambda entry: entry is not None)
+
+    def _write(self, record, user, version=None, check=None):
+        """Append `record` as a compare-and-swap on its entry's version, retrying lost races"""
+        date = record["date"]
+        for attempt in range(self.max_retries):
+            entries = self._read_entries(self._reader(), user, [date])
+            entry = entries[0] if entries else None
+            if check is not None and not check(entry):
+                return False
+            current = entry.get("version", 0) if entry is not None else 0
+            if version is not None and version != current:
+                raise ConflictError(f"Entry for {date} is at version {current}, not {version}")
+            record["if"] = current
+            record["id"] = os.urandom(8).hex()
+            # The view that replayed the record answers both questions below
+            reader = self._append(record, user)
+            if self._outcome(reader, record["id"]):
+                return True
+            if self._overlay(reader).stale_journal:
+                # A compaction crashed before replacing the journal; finish that first
+                self._restart_journal()
+                continue
+            metrics.incr("storage.conflicts", backend="journal")
+            # Back off a little so the racing writers spread out
+            time.sleep(random.uniform(0, 0.001 * 2 ** attempt))
+        raise ConflictError(f"Gave up writing {date} after {self.max_retries} conflicting attempts")
+
+    def _overlay(self, reader):
+        """The state a reader replays the journal into"""
+        return reader.overlay if isinstance(reader, _IndexedView) else reader
+
+    def _journal_header(self, generation):
+        return json.dumps({"op": "generation", "generation": generation}, separators=(",", ":")) + "\n"
+
+    def _restart_journal(self):
+        """Replace a journal already folded into the snapshot with an empty one"""
+        state = self._state()
+        with state.lock:
+            with _FileLock(self.lock_file, exclusive=True):
+                self._sync(state)
+                if not state.stale_journal:
+                    return
+                header = self._journal_header(state.generation)
+                with atomic_write(self.journal_file) as f:
+                    f.write(header)
+                state.stale_journal = False
+                state.journal_offset = len(header)
+                state.journal_records = 0
+
+    def _outcome(self, reader, record_id):
+        """Whether the journal applied the record, once `reader` has replayed it"""
+        state = self._overlay(reader)
+        with state.lock:
+            # Unknown means a compaction folded the record away before it was
+            # seen here; report a conflict and let the caller re-read
+            return state.outcomes.pop(record_id, False)
+
+    @metrics.timed("storage.write", backend="journal")
+    def _append(self, record, user=DEFAULT_USER):
+        """Append `record` and return a reader that has replayed it"""
+        if user != DEFAULT_USER:
+            record["user"] = user
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with _FileLock(self.lock_file, exclusive=False):
+            # A single write on an O_APPEND handle keeps concurrent records whole
+            with open(self.journal_file, 'ab') as f:
+                if f.tell() == 0:
+                    generation = self._overlay(self._reader()).generation
+                    if generation:
+                        # The journal went missing; restart it with its header
+                        line = self._journal_header(generation) + line
+                f.write(line.encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+        # Readers replay the journal rather than this store applying the record
+        # directly, so records from other processes stay in order
+        reader = self._reader()
+        if reader.journal_records >= self.compact_threshold:
+            with _compacting_lock:
+                start = self.data_file not in _compacting
+                _compacting.add(self.data_file)
+            if start:
+                threading.Thread(target=self._background_compact, daemon=True).start()
+        return reader
+
+    # Compaction
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        except Exception as e:
+            print(f"Error compacting journal: {e}")
+        finally:
+            with _compacting_lock:
+                _compacting.discard(self.data_file)
+
+    @metrics.timed("storage.compact", backend="journal")
+    def compact(self):
+        """Fold the journal into a new snapshot and truncate it"""
+        state = self._state()
+        with state.lock:
+            with _FileLock(self.lock_file, exclusive=True):
+                self._sync(state)
+                # Drop entries superseded by a later one for the same (user, date)
+                goals = [e for e in state.data["goals"]
+                         if state.by_key.get((e.get("user", DEFAULT_USER), e.get("date"))) is e]
+                state.data["goals"] = goals
+                generation = state.generation + 1
+                state.data["generation"] = generation
+                self._write_snapshot(state.data)
+                # A crash before the journal is replaced leaves the old one next
+                # to the new snapshot, and its older header marks it as folded in
+                header = self._journal_header(generation)
+                with atomic_write(self.journal_file) as f:
+                    f.write(header)
+                state.generation = generation
+                state.stale_journal = False
+                state.snapshot_sig = file_signature(self.data_file)
+                state.journal_offset = len(header)
+                state.journal_records = 0
+
+    def _write_snapshot(self, data):
+        write_indexed_snapshot(self.data_file, self.index_file, data)
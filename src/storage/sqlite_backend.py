@@ -0,0 +1,288 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+from storage.backend import DEFAULT_USER, ConflictError, StorageBackend
+from storage.data_cache import file_signature, shared_cache
+from monitoring.metrics import metrics
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS goals (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    goal TEXT,
+    raw_tasks TEXT,
+    version INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (user, date)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    goal_id INTEGER NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    task TEXT NOT NULL,
+    completed INTEGER,
+    PRIMARY KEY (goal_id, position)
+) WITHOUT ROWID;
+"""
+
+class SQLiteConnections:
+    """Per-thread WAL connections to one SQLite database shared by worker processes.
+
+    Connections are in autocommit mode, so reads never hold a transaction
+    open; `transaction()` opens an immediate (write-locked) one, which makes
+    a read-check-write inside it a compare-and-swap against every other
+    connection, in this process or another.
+    """
+
+    def __init__(self, db_file, schema=None, pragmas=()):
+        self.db_file = db_file
+        # Extra per-connection settings, e.g. "foreign_keys=ON"
+        self.pragmas = pragmas
+        self._local = threading.local()
+        directory = os.path.dirname(db_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if schema:
+            self.conn().executescript(schema)
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for pragma in self.pragmas:
+                conn.execute(f"PRAGMA {pragma}")
+            self._local.conn = conn
+        return conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Yield the thread's connection inside a write transaction, committed on success"""
+        conn = self.conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class SQLiteBackend(StorageBackend):
+    """Goals and tasks in normalized SQLite tables indexed by (user, date).
+
+    Tasks that are plain strings rather than {"task", "completed"} dicts are kept
+    with a NULL `completed`, and a goal whose tasks are a single block of text
+    stores it in `raw_tasks`. Each thread gets its own connection; WAL mode lets
+    readers proceed while another connection writes.
+    """
+
+    def __init__(self, db_file, import_from=None):
+        self.db_file = db_file
+        self._db = SQLiteConnections(db_file, SCHEMA, pragmas=("foreign_keys=ON",))
+        conn = self._conn()
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(goals)")]
+        if "version" not in columns:
+            # Databases created before entries were versioned
+            with self._db.transaction() as conn:
+                conn.execute("ALTER TABLE goals ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        if import_from and os.path.exists(import_from):
+            empty = conn.execute("SELECT 1 FROM goals LIMIT 1").fetchone() is None
+            if empty:
+                self._import_json(import_from)
+
+    def _conn(self):
+        return self._db.conn()
+
+    def _import_json(self, data_file):
+        """One-off migration of the JSON data file into the database"""
+        from storage.journal_store import JournalStore
+        store = JournalStore(data_file)
+        with self._db.transaction() as conn:
+            for user in store.list_users():
+                for entry in store.load_all(user)["goals"]:
+                    self._save(conn, entry.get("date"), entry.get("goal"), entry.get("tasks", []), user)
+        shared_cache.invalidate(self.db_file)
+
+    # Reading
+
+    def _entries(self, rows):
+        """Attach task lists to goal rows with one query per page"""
+        entries = []
+        by_id = {}
+        for goal_id, date, goal, raw_tasks, version in rows:
+            entry = {"date": date, "goal": goal, "tasks": raw_tasks if raw_tasks is not None else [],
+                     "version": version}
+            entries.append(entry)
+            by_id[goal_id] = entry
+        if by_id:
+            placeholders = ",".join("?" * len(by_id))
+            task_rows = self._conn().execute(
+                f"SELECT goal_id, task, completed FROM tasks WHERE goal_id IN ({placeholders}) "
+                "ORDER BY goal_id, position",
+                list(by_id),
+            )
+            for goal_id, task, completed in task_rows:
+                tasks = by_id[goal_id]["tasks"]
+                if completed is None:
+                    tasks.append(task)
+                else:
+                    tasks.append({"task": task, "completed": bool(completed)})
+        return entries
+
+    def signature(self):
+        # Writes from other processes land in the WAL file (or the database after
+        # a checkpoint), so together their signatures tell whether to re-query
+        return (file_signature(self.db_file), file_signature(self.db_file + "-wal"))
+
+    def load_all(self, user=DEFAULT_USER):
+        return shared_cache.get(self.db_file, self.signature(), lambda stale: self._load_all(user), variant=user)
+
+    @metrics.timed("storage.load_all", backend="sqlite")
+    def _load_all(self, user):
+        rows = self._conn().execute(
+            "SELECT id, date, goal, raw_tasks, version FROM goals WHERE user = ? ORDER BY date", (user,)
+        ).fetchall()
+        return {"goals": self._entries(rows)}
+
+    def list_users(self):
+        return [row[0] for row in self._conn().execute("SELECT DISTINCT user FROM goals ORDER BY user")]
+
+    def get_entry(self, date, user=DEFAULT_USER):
+        rows = self._conn().execute(
+            "SELECT id, date, goal, raw_tasks, version FROM goals WHERE user = ? AND date = ?", (user, date)
+        ).fetchall()
+        entries = self._entries(rows)
+        return entries[0] if entries else None
+
+    def _range_clause(self, start_date, end_date, user):
+        clause = "WHERE user = ?"
+        params = [user]
+        if start_date:
+            clause += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            clause += " AND date <= ?"
+            params.append(end_date)
+        return clause, params
+
+    def get_history(self, start_date=None, end_date=None, limit=None, offset=0,
+                    newest_first=True, user=DEFAULT_USER):
+        clause, params = self._range_clause(start_date, end_date, user)
+        order = "DESC" if newest_first else "ASC"
+        rows = self._conn().execute(
+            f"SELECT id, date, goal, raw_tasks, version FROM goals {clause} ORDER BY date {order} LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+        return self._entries(rows)
+
+    def count_history(self, start_date=None, end_date=None, user=DEFAULT_USER):
+        clause, params = self._range_clause(start_date, end_date, user)
+        return self._conn().execute(f"SELECT COUNT(*) FROM goals {clause}", params).fetchone()[0]
+
+    # Writing
+
+    def _write_tasks(self, conn, goal_id, tasks):
+        conn.execute("DELETE FROM tasks WHERE goal_id = ?", (goal_id,))
+        rows = []
+        for position, task in enumerate(tasks):
+            if isinstance(task, dict):
+                rows.append((goal_id, position, task.get("task", ""), int(bool(task.get("completed", False)))))
+            else:
+                rows.append((goal_id, position, str(task), None))
+        conn.executemany("INSERT INTO tasks (goal_id, position, task, completed) VALUES (?, ?, ?, ?)", rows)
+
+    def _save(self, conn, date, goal, tasks, user, version=None):
+        raw_tasks = None if isinstance(tasks, list) else str(tasks)
+        if version is None:
+            conn.execute(
+                "INSERT INTO goals (user, date, goal, raw_tasks, version) VALUES (?, ?, ?, ?, 1) "
+                "ON CONFLICT (user, date) DO UPDATE SET goal = excluded.goal, raw_tasks = excluded.raw_tasks, "
+                "version = goals.version + 1",
+                (user, date, goal, raw_tasks),
+            )
+        else:
+            # The version check is part of the write, so the transaction makes
+            # the compare-and-swap atomic without a separate read
+            cursor = conn.execute(
+                "UPDATE goals SET goal = ?, raw_tasks = ?, version = version + 1 "
+                "WHERE user = ? AND date = ? AND version = ?",
+                (goal, raw_tasks, user, date, version),
+            )
+            if cursor.rowcount == 0 and version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO goals (user, date, goal, raw_tasks, version) VALUES (?, ?, ?, ?, 1)",
+                    (user, date, goal, raw_tasks),
+                )
+            if cursor.rowcount == 0:
+                raise ConflictError(f"Entry for {date} is no longer at version {version}")
+        goal_id = conn.execute(
+            "SELECT id FROM goals WHERE user = ? AND date = ?", (user, date)
+        ).fetchone()[0]
+        self._write_tasks(conn, goal_id, tasks if isinstance(tasks, list) else [])
+
+    @metrics.timed("storage.write", backend="sqlite")
+    def save_goal_and_tasks(self, date, goal, tasks, user=DEFAULT_USER, version=None):
+        with self._db.transaction() as conn:
+            self._save(conn, date, goal, tasks, user, version)
+        shared_cache.invalidate(self.db_file)
+        return True
+
+    @metrics.timed("storage.write", backend="sqlite")
+    def update_tasks(self, date, tasks, user=DEFAULT_USER, version=None):
+        with self._db.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, version FROM goals WHERE user = ? AND date = ?", (user, date)
+            ).fetchone()
+            if row is None:
+                return False
+            raw_tasks = None if isinstance(tasks, list) else str(tasks)
+            cursor = conn.execute(
+                "UPDATE goals SET raw_tasks = ?, version = version + 1 WHERE id = ? AND (? IS NULL OR version = ?)",
+                (raw_tasks, row[0], version, version),
+            )
+            if cursor.rowcount == 0:
+                raise ConflictError(f"Entry for {date} is at version {row[1]}, not {version}")
+            self._write_tasks(conn, row[0], tasks if isinstance(tasks, list) else [])
+        shared_cache.invalidate(self.db_file)
+        return True
+
+    @metrics.timed("storage.write", backend="sqlite")
+    def set_task_completed(self, date, index, completed, user=DEFAULT_USER):
+        with self._db.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET completed = ? WHERE position = ? AND completed IS NOT NULL "
+                "AND goal_id = (SELECT id FROM goals WHERE user = ? AND date = ?)",
+                (int(bool(completed)), index, user, date),
+            )
+            updated = cursor.rowcount > 0
+            if updated:
+                conn.execute("UPDATE goals SET version = version + 1 WHERE user = ? AND date = ?", (user, date))
+        shared_cache.invalidate(self.db_file)
+        return updated
+
+    @metrics.timed("storage.write", backend="sqlite")
+    def set_tasks_completed(self, date, changes, user=DEFAULT_USER):
+        with self._db.transaction() as conn:
+            row = conn.execute("SELECT id FROM goals WHERE user = ? AND date = ?", (user, date)).fetchone()
+            if row is None:
+                return False
+            conn.executemany(
+                "UPDATE tasks SET completed = ? WHERE goal_id = ? AND position = ? AND completed IS NOT NULL",
+                [(int(bool(completed)), row[0], index) for index, completed in changes.items()],
+            )
+            conn.execute("UPDATE goals SET version = version + 1 WHERE id = ?", (row[0],))
+        shared_cache.invalidate(self.db_file)
+        return True
+
+    def close(self):
+        self._db.close()
\ No newline at end of file
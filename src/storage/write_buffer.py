@@ -0,0 +1,171 @@
+import atexit
+import threading
+import time
+
+from storage.backend import DEFAULT_USER, StorageBackend
+from monitoring.metrics import metrics
+
+
+class WriteBehindBuffer(StorageBackend):
+    """Storage wrapper that defers task completion toggles and coalesces them.
+
+    Toggles are kept in memory per (user, date) and written with one
+    `set_tasks_completed` call per day once no toggle has arrived for `delay`
+    seconds, or at the latest `max_delay` seconds after the first pending one.
+    Reads see pending toggles, any other write to a day flushes that day first,
+    and everything left is flushed at interpreter exit.
+    """
+
+    def __init__(self, backend, delay=1.0, max_delay=5.0):
+        self.backend = backend
+        self.delay = delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._inflight = {}
+        self._first_pending = None
+        self._timer = None
+        # (signature reported before our last flush, backend signature after it)
+        self._flushed = None
+        self.toggles = 0
+        self.writes = 0
+        atexit.register(self.flush)
+
+    # Buffered writes
+
+    def set_task_completed(self, date, index, completed, user=DEFAULT_USER):
+        with self._lock:
+            self._pending.setdefault((user, date), {})[index] = bool(completed)
+            self.toggles += 1
+            if self._first_pending is None:
+                self._first_pending = time.monotonic()
+            self._schedule()
+        return True
+
+    def set_tasks_completed(self, date, changes, user=DEFAULT_USER):
+        for index, completed in changes.items():
+            self.set_task_completed(date, index, completed, user)
+        return True
+
+    def _schedule(self):
+        # Callers hold self._lock
+        if self._timer is not None:
+            self._timer.cancel()
+        remaining = self.max_delay - (time.monotonic() - self._first_pending)
+        self._timer = threading.Timer(max(min(self.delay, remaining), 0), self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    @metrics.timed("storage.flush")
+    def flush(self, key=None):
+        """Write pending toggles, for one (user, date) key or for every day"""
+        with self._flush_lock:
+            with self._lock:
+                if key is None:
+                    self._inflight, self._pending = self._pending, {}
+                elif key in self._pending:
+                    self._inflight = {key: self._pending.pop(key)}
+                else:
+                    return
+                if not self._pending:
+                    self._first_pending = None
+                    if self._timer is not None:
+                        self._timer.cancel()
+                        self._timer = None
+            try:
+                if self._inflight:
+                    reported = self.signature()
+                for (user, date), changes in self._inflight.items():
+                    self.backend.set_tasks_completed(date, changes, user)
+                    self.writes += 1
+                if self._inflight:
+                    # Readers already saw these toggles, so the flush is not a change to them
+                    with self._lock:
+                        self._flushed = (reported, self.backend.signature())
+            except Exception as e:
+                print(f"Error flushing task completion updates: {e}")
+                # Put the changes back so the next flush retries them
+                with self._lock:
+                    for k, changes in self._inflight.items():
+                        self._pending[k] = {**changes, **self._pending.get(k, {})}
+                    if self._first_pending is None:
+                        self._first_pending = time.monotonic()
+                    self._schedule()
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "toggles": self.toggles,
+                "writes": self.writes,
+                "pending_days": len(self._pending),
+            }
+
+    # Reads see pending toggles
+
+    def _unwritten(self):
+        # Taken before reading the backend: a flush finishing in between then
+        # only means the changes are applied twice, never that they are missed
+        with self._lock:
+            unwritten = {key: dict(changes) for key, changes in self._inflight.items()}
+            for key, changes in self._pending.items():
+                unwritten[key] = {**unwritten.get(key, {}), **changes}
+            return unwritten
+
+    def _overlay(self, entry, user, unwritten):
+        changes = unwritten.get((user, entry.get("date")), {})
+        tasks = entry.get("tasks")
+        for index, completed in changes.items():
+            if isinstance(tasks, list) and 0 <= index < len(tasks) and isinstance(tasks[index], dict):
+                tasks[index]["completed"] = completed
+        if changes:
+            # Flushing them is one more write, so a compare-and-swap made against
+            # this view still matches once they are on disk
+            entry["version"] = entry.get("version", 0) + 1
+        return entry
+
+    def get_entry(self, date, user=DEFAULT_USER):
+        unwritten = self._unwritten()
+        entry = self.backend.get_entry(date, user)
+        return self._overlay(entry, user, unwritten) if entry is not None else None
+
+    def get_history(self, start_date=None, end_date=None, limit=None, offset=0,
+                    newest_first=True, user=DEFAULT_USER):
+        unwritten = self._unwritten()
+        entries = self.backend.get_history(start_date, end_date, limit, offset, newest_first, user)
+        return [self._overlay(entry, user, unwritten) for entry in entries]
+
+    def count_history(self, start_date=None, end_date=None, user=DEFAULT_USER):
+        return self.backend.count_history(start_date, end_date, user)
+
+    def load_all(self, user=DEFAULT_USER):
+        # The full data is shared and read-only, so write pending toggles through
+        self.flush()
+        return self.backend.load_all(user)
+
+    def signature(self):
+        signature = self.backend.signature()
+        with self._lock:
+            if self._flushed is not None and signature == self._flushed[1]:
+                return self._flushed[0]
+        return signature
+
+    def list_users(self):
+        return self.backend.list_users()
+
+    # Other writes go straight through once the day's toggles are written
+
+    def save_goal_and_tasks(self, date, goal, tasks, user=DEFAULT_USER, version=None):
+        self.flush((user, date))
+        return self.backend.save_goal_and_tasks(date, goal, tasks, user, version)
+
+    def update_tasks(self, date, tasks, user=DEFAULT_USER, version=None):
+        self.flush((user, date))
+        return self.backend.update_tasks(date, tasks, user, version)
+
+    def close(self):
+        self.flush()
+        self.backend.close()
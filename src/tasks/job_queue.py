@@ -0,0 +1,326 @@
+import contextvars
+import datetime
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from monitoring.metrics import metrics
+from storage.backend import DEFAULT_USER
+from storage.sqlite_backend import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    goal TEXT NOT NULL,
+    status TEXT NOT NULL,
+    source TEXT,
+    upgrade_pending INTEGER NOT NULL DEFAULT 0,
+    tasks TEXT,
+    error TEXT,
+    worker TEXT,
+    lease_until REAL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, lease_until);
+"""
+
+COLUMNS = ("id", "user", "date", "goal", "status", "source", "upgrade_pending", "tasks", "error",
+           "created", "updated")
+
+# Statuses a job goes through; "done" and "failed" are final
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Seconds between polls of a job run by another process
+POLL_INTERVAL = 0.5
+
+
+class JobStore:
+    """Generation jobs persisted in SQLite, shared by every app process on the host.
+
+    A job is claimed by moving it from queued to running inside an immediate
+    (write-locked) transaction, so only one worker runs it; the claim carries
+    a lease, and a running job whose lease ran out (its process died) can be
+    claimed again.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._db = SQLiteConnections(db_file, SCHEMA)
+
+    def _conn(self):
+        return self._db.conn()
+
+    def _write(self, query, params):
+        with self._db.transaction() as conn:
+            return conn.execute(query, params).rowcount
+
+    def add(self, job_id, user, date, goal):
+        now = time.time()
+        self._write("INSERT INTO jobs (id, user, date, goal, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, user, date, goal, QUEUED, now, now))
+
+    def get(self, job_id):
+        """The job as a dict, with its tasks decoded, or None"""
+        row = self._conn().execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(COLUMNS, row))
+        job["tasks"] = json.loads(job["tasks"]) if job["tasks"] is not None else None
+        job["upgrade_pending"] = bool(job["upgrade_pending"])
+        return job
+
+    def claim(self, job_id, worker, lease):
+        """Start a queued job, or one whose lease ran out; True if this worker should run it"""
+        now = time.time()
+        return self._write(
+            "UPDATE jobs SET status = ?, worker = ?, lease_until = ?, updated = ? "
+            "WHERE id = ? AND (status = ? OR (status = ? AND lease_until < ?))",
+            (RUNNING, worker, now + lease, now, job_id, QUEUED, RUNNING, now),
+        ) == 1
+
+    def progress(self, job_id, tasks, source):
+        """Record the tasks a running job has parsed so far"""
+        self._write("UPDATE jobs SET tasks = ?, source = ?, updated = ? WHERE id = ? AND status = ?",
+                    (json.dumps(tasks), source, time.time(), job_id, RUNNING))
+
+    def finish(self, job_id, status, tasks=None, source=None, upgrade_pending=False, error=None):
+        self._write(
+            "UPDATE jobs SET status = ?, tasks = ?, source = ?, upgrade_pending = ?, error = ?, "
+            "lease_until = NULL, updated = ? WHERE id = ?",
+            (status, json.dumps(tasks) if tasks is not None else None, source, int(upgrade_pending),
+             error, time.time(), job_id),
+        )
+
+    def upgraded(self, job_id, tasks=None):
+        """Clear the pending upgrade, recording the tasks that replaced the stand-ins if any"""
+        if tasks is None:
+            self._write("UPDATE jobs SET upgrade_pending = 0, updated = ? WHERE id = ?", (time.time(), job_id))
+        else:
+            self._write("UPDATE jobs SET upgrade_pending = 0, tasks = ?, source = 'model', updated = ? WHERE id = ?",
+                        (json.dumps(tasks), time.time(), job_id))
+
+    def runnable(self, now=None):
+        """Ids of queued jobs and of running jobs whose lease ran out, oldest first"""
+        return [row[0] for row in self._conn().execute(
+            "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?) ORDER BY created",
+            (QUEUED, RUNNING, now if now is not None else time.time()),
+        )]
+
+    def prune(self, older_than):
+        """Delete finished jobs last updated before `older_than`"""
+        return self._write("DELETE FROM jobs WHERE status IN (?, ?) AND updated < ?", (DONE, FAILED, older_than))
+
+    def counts(self):
+        return dict(self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class GenerationQueue:
+    """Runs task generation off the interaction thread, on a bounded worker pool.
+
+    `submit` records a job and returns its id straight away; at most
+    `max_workers` jobs generate at once and the rest wait their turn. Each job
+    runs a streamed, hedged generation (see TaskGenerator.hedge) and saves the
+    goal and tasks to `store` for the job's user and date, so the result lands
+    even if nobody is waiting for it. Every task is recorded on the job as soon
+    as it is parsed, so a running job's status already lists the tasks so far.
+    Follow a job with `status`, `wait`, task callbacks or done callbacks. When
+    the job finished with stand-in tasks, its worker stays on
+    it until the model answers, swaps the model's tasks in if the stand-ins
+    are untouched, and then clears `upgrade_pending`.
+
+    Jobs live in SQLite at `db_file`, so `start` resumes the ones a previous
+    run left queued, or left running when it died (after `lease` seconds).
+    """
+
+    def __init__(self, task_generator, db_file, store=None, max_workers=2, lease=300.0,
+                 keep_finished=7 * 24 * 3600, worker_id=None):
+        self.task_generator = task_generator
+        self.store = store
+        self.jobs = JobStore(db_file)
+        self.max_workers = max_workers
+        self.lease = lease
+        self.keep_finished = keep_finished
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self._executor = None
+        self._lock = threading.Lock()
+        # Jobs submitted or resumed here: job id -> (finished event, done callbacks, task callbacks)
+        self._waiting = {}
+
+    def start(self):
+        """Start the workers and resume unfinished jobs; returns self"""
+        with self._lock:
+            if self._executor is not None:
+                return self
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="generation-job")
+        self.jobs.prune(time.time() - self.keep_finished)
+        with self._lock:
+            # Jobs submitted before start() also have callbacks to call
+            waiting = list(self._waiting)
+        for job_id in dict.fromkeys(self.jobs.runnable() + waiting):
+            self._schedule(job_id, contextvars.copy_context())
+        return self
+
+    def stop(self):
+        """Stop taking jobs; unstarted ones stay queued for the next start()"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, goal, user=DEFAULT_USER, date=None, on_done=None, on_task=None):
+        """Queue a generation for `goal` and return the job id
+
+        `on_task(index, task)` is called from a worker thread for each task as
+        soon as it is parsed, and `on_done(job)` with the job's status dict
+        once its tasks are saved, or once it has failed.
+        """
+        job_id = uuid.uuid4().hex
+        self.jobs.add(job_id, user, date or datetime.datetime.now().strftime("%Y-%m-%d"), goal)
+        metrics.incr("jobs.submitted")
+        # Copy the context so the job keeps the caller's priority
+        self._schedule(job_id, contextvars.copy_context(), on_done, on_task)
+        return job_id
+
+    def _schedule(self, job_id, context, on_done=None, on_task=None):
+        with self._lock:
+            _, callbacks, task_callbacks = self._waiting.setdefault(job_id, (threading.Event(), [], []))
+            if on_done is not None:
+                callbacks.append(on_done)
+            if on_task is not None:
+                task_callbacks.append(on_task)
+            if self._executor is not None:
+                self._executor.submit(context.run, self._run, job_id, time.perf_counter())
+
+    def status(self, job_id):
+        """The job's status dict (see COLUMNS), or None for an unknown job
+
+        While the job runs, its tasks are the ones parsed so far.
+        """
+        return self.jobs.get(job_id)
+
+    def add_done_callback(self, job_id, callback):
+        """Call `callback(job)` once a job of this queue is done or failed; at once if it already is
+
+        Jobs run by another process can only be polled.
+        """
+        with self._lock:
+            waiting = self._waiting.get(job_id)
+            if waiting is not None:
+                waiting[1].append(callback)
+                return
+        job = self.status(job_id)
+        if job is None or job["status"] not in (DONE, FAILED):
+            raise ValueError(f"Generation job {job_id} is not run by this queue")
+        self._notify(callback, job)
+
+    def wait(self, job_id, timeout=None):
+        """Block until the job is done or failed and return its status dict
+
+        Jobs run by another process are polled. Raises TimeoutError.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            finished = self._waiting.get(job_id, (threading.Event(),))[0]
+        while True:
+            job = self.status(job_id)
+            if job is None or job["status"] in (DONE, FAILED):
+                return job
+            remaining = deadline - time.monotonic() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError(f"Timed out waiting for generation job {job_id}")
+            finished.wait(POLL_INTERVAL if remaining is None else min(POLL_INTERVAL, remaining))
+
+    def _run(self, job_id, queued_at):
+        if not self.jobs.claim(job_id, self.worker_id, self.lease):
+            # Another process resumed it first, or it already finished; watch
+            # it off the pool so callbacks registered here still get its outcome
+            threading.Thread(target=self._watch, args=(job_id, contextvars.copy_context()),
+                             daemon=True, name="generation-job-watch").start()
+            return
+        metrics.observe("jobs.wait", time.perf_counter() - queued_at)
+        job = self.jobs.get(job_id)
+        try:
+            with metrics.span("jobs.run"):
+                generation = self.task_generator.hedge(job["goal"])
+                tasks = []
+                for task in generation.tasks():
+                    tasks.append(task)
+                    self.jobs.progress(job_id, tasks, "local" if generation.local else "model")
+                    self._task_parsed(job_id, len(tasks) - 1, task)
+                if not tasks:
+                    raise ValueError("No tasks could be generated")
+                if self.store is not None:
+                    self.store.save_goal_and_tasks(job["date"], job["goal"], tasks, user=job["user"])
+        except Exception as e:
+            metrics.incr("jobs.completed", status=FAILED)
+            self.jobs.finish(job_id, FAILED, error=str(e))
+            self._done(job_id)
+            return
+        upgrade = generation.local and self.store is not None
+        metrics.incr("jobs.completed", status=DONE)
+        self.jobs.finish(job_id, DONE, tasks, "local" if generation.local else "model", upgrade_pending=upgrade)
+        self._done(job_id)
+        if upgrade:
+            self._upgrade(job, tasks, generation)
+
+    def _watch(self, job_id, context):
+        """Poll a job another process runs and hand its outcome to the callbacks here"""
+        deadline = time.monotonic() + self.lease
+        job = self.status(job_id)
+        while job is not None and job["status"] not in (DONE, FAILED):
+            if time.monotonic() >= deadline:
+                # Its process may have died with the lease; try to claim it again
+                self._schedule(job_id, context)
+                return
+            time.sleep(POLL_INTERVAL)
+            job = self.status(job_id)
+        # Task callbacks registered here get the whole list at once
+        for index, task in enumerate((job or {}).get("tasks") or []):
+            self._task_parsed(job_id, index, task)
+        self._done(job_id)
+
+    def _upgrade(self, job, tasks, generation):
+        """Swap the model's tasks in for the untouched stand-ins once it answers
+
+        Runs on the generation's thread, so no worker waits for the model.
+        """
+        expected = [dict(task) for task in tasks]
+        replaced = []
+
+        def replace(generated):
+            if self.store.replace_tasks(job["date"], expected, generated, user=job["user"]):
+                replaced.append(generated)
+
+        generation.on_upgrade(replace)
+        generation.on_finished(lambda: self.jobs.upgraded(job["id"], replaced[0] if replaced else None))
+
+    def _task_parsed(self, job_id, index, task):
+        with self._lock:
+            callbacks = list(self._waiting.get(job_id, (None, None, ()))[2])
+        for callback in callbacks:
+            self._notify(callback, index, dict(task))
+
+    def _done(self, job_id):
+        job = self.status(job_id)
+        with self._lock:
+            event, callbacks, _ = self._waiting.pop(job_id, (threading.Event(), [], []))
+        event.set()
+        for callback in callbacks:
+            self._notify(callback, job)
+
+    def _notify(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error in generation job callback: {e}")
+
+    def stats(self):
+        counts = self.jobs.counts()
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
@@ -0,0 +1,119 @@
+import re
+
+from ai.response_cache import normalize_goal
+
+# Shown with stand-in tasks until the model's tasks replace them
+STARTER_TASKS_NOTICE = ("These are starter tasks while your tailored ones are prepared. "
+                        "They are swapped in automatically unless you have started on these.")
+
+# (category, keywords, tasks); the first category whose keywords appear in
+# the goal wins. "{goal}" in a task is replaced with the goal as written.
+CATEGORIES = [
+    ("fitness", r"run|jog|walk|gym|workout|exercise|train|fit|yoga|swim|bike|cycl|lift|stretch|steps|hike", [
+        "Lay out your clothes and gear for '{goal}'",
+        "Warm up for 5 minutes before you start",
+        "Do the main session for '{goal}', even if it is shorter than planned",
+        "Drink a full glass of water afterwards",
+        "Stretch for 5 minutes to cool down",
+        "Write down how long you went and how it felt",
+    ]),
+    ("study", r"stud|learn|exam|test|course|class|homework|revis|read|book|language|practi[cs]e|lesson", [
+        "Pick the one topic or chapter for '{goal}' you will cover today",
+        "Clear your desk and put your phone in another room",
+        "Work for 25 minutes, then take a 5 minute break",
+        "Write a short summary of what you covered from memory",
+        "Note one question you still have and where to find the answer",
+        "Plan what you will cover in the next session",
+    ]),
+    ("work", r"work|project|report|deadline|email|meeting|present|slides|client|code|ship|launch|finish|submit", [
+        "Write down what 'done' looks like for '{goal}'",
+        "Break '{goal}' into three concrete steps",
+        "Block 60 minutes in your calendar for the first step",
+        "Turn off notifications while you work on it",
+        "Send a short update to anyone waiting on it",
+        "Decide the first step for tomorrow before you stop",
+    ]),
+    ("home", r"clean|tidy|declutter|laundry|organi[sz]e|kitchen|room|house|home|garden|cook|meal|groceries|dishes", [
+        "Choose the one area you will tackle for '{goal}'",
+        "Set a 20 minute timer and start with the most visible mess",
+        "Put away everything that already has a place",
+        "Bag up anything to throw away or give away",
+        "Wipe down the surfaces you cleared",
+        "Take a moment to enjoy the result and note what is left",
+    ]),
+    ("sleep", r"sleep|bed|rest|tired|nap|wake", [
+        "Set a bedtime for tonight and an alarm 30 minutes before it",
+        "Stop caffeine after early afternoon",
+        "Get 10 minutes of daylight outside this morning",
+        "Put screens away 30 minutes before bed",
+        "Keep your bedroom cool, dark and quiet",
+        "Write down anything on your mind before you lie down",
+    ]),
+    ("calm", r"stress|anxi|calm|relax|meditat|mindful|breath|mood|mental|journal|gratitude|overwhelm", [
+        "Take 5 slow breaths before you start your day",
+        "Write down three things that are on your mind",
+        "Go for a 10 minute walk without your phone",
+        "Do a 5 minute guided meditation",
+        "Reach out to someone you trust for a short chat",
+        "Write down one thing you are grateful for tonight",
+    ]),
+    ("social", r"friend|family|call|visit|connect|partner|kids|parent|social|date|message", [
+        "Decide who you want to connect with for '{goal}'",
+        "Send them a message to find a time",
+        "Put the call or visit in your calendar",
+        "Think of one thing you want to ask them about",
+        "Give them your full attention, with your phone away",
+        "Note anything you promised to follow up on",
+    ]),
+    ("money", r"money|budget|sav|spend|bill|debt|tax|bank|invest|financ", [
+        "Gather the statements or bills you need for '{goal}'",
+        "List this month's income and fixed costs",
+        "Check last week's spending against your plan",
+        "Pay or schedule any bill that is due soon",
+        "Pick one expense to cut or pause",
+        "Move a small amount into savings",
+    ]),
+    ("creative", r"write|writing|draw|paint|music|guitar|piano|sing|design|photo|craft|create|blog|story", [
+        "Set up your space and materials for '{goal}'",
+        "Spend 10 minutes warming up without judging the result",
+        "Work on the main piece for 30 focused minutes",
+        "Capture any ideas that come up in a notebook",
+        "Share a small piece with someone or save a snapshot of progress",
+        "Note where you will pick up next time",
+    ]),
+]
+
+GENERIC_TASKS = [
+    "Write down why '{goal}' matters to you today",
+    "Break '{goal}' into three small, concrete steps",
+    "Do the first step for 15 focused minutes",
+    "Take a short break to stretch and drink some water",
+    "Do the next step, or finish the first one",
+    "Review what you got done and plan the next step",
+]
+
+_COMPILED = [(name, re.compile(rf"\b(?:{keywords})", re.I), tasks) for name, keywords, tasks in CATEGORIES]
+
+
+class LocalTaskGenerator:
+    """Builds a task list for a goal from templates, without the network.
+
+    Goals are matched to a category by keyword and get that category's six
+    tasks, with the goal filled in; anything unmatched gets generic planning
+    steps. Deterministic and takes microseconds, so it can stand in whenever
+    the model is slow or unavailable.
+    """
+
+    def _match(self, goal):
+        text = normalize_goal(goal)
+        for name, pattern, tasks in _COMPILED:
+            if pattern.search(text):
+                return name, tasks
+        return "generic", GENERIC_TASKS
+
+    def category(self, goal):
+        return self._match(goal)[0]
+
+    def generate_tasks(self, goal):
+        goal = str(goal).strip()
+        return [{"task": task.format(goal=goal), "completed": False} for task in self._match(goal)[1]]
@@ -0,0 +1,137 @@
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+
+from ai.openai_client import OpenAIError
+from ai.response_cache import normalize_goal
+from ai.scheduler import SCHEDULED, generation_priority
+
+# Re-check the next alarm at least this often
+MAX_SLEEP = 60.0
+
+
+class TaskPregenerator:
+    """Generates tasks for the goal a user is likely to set before their alarm rings.
+
+    A background thread wakes `lead_time` seconds before the next alarm (plus a
+    random offset within `window`, so alarms set for the same minute don't all
+    hit the API together), predicts the goal from recent history and generates
+    its tasks at scheduled priority. When the alarm rings the prediction is
+    offered to the user; if they take it the tasks are served straight away.
+    `next_due` is a callable returning the next alarm's timestamp or None.
+    """
+
+    def __init__(self, task_generator, goal_handler, next_due, lead_time=900.0, window=600.0,
+                 history_days=14):
+        self.task_generator = task_generator
+        self.goal_handler = goal_handler
+        self.next_due = next_due
+        self.lead_time = lead_time
+        self.window = window
+        self.history_days = history_days
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._running = True
+        self._candidate = None
+        self._prepared_for = None
+        self.generated = 0
+        self.offered = 0
+        self.accepted = 0
+        self.saved_seconds = 0.0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def predict_goal(self):
+        """The goal set most often in the last `history_days` days, or the latest one if none repeats"""
+        since = (datetime.date.today() - datetime.timedelta(days=self.history_days)).strftime("%Y-%m-%d")
+        history = self.goal_handler.get_history_page(0, None, start_date=since)
+        goals = [entry.get("goal") for entry in history if entry.get("goal")]
+        if not goals:
+            return None
+        counts = Counter(normalize_goal(goal) for goal in goals)
+        best, count = counts.most_common(1)[0]
+        if count < 2:
+            return goals[0]
+        # History is newest first, so this is the latest wording of the recurring goal
+        return next(goal for goal in goals if normalize_goal(goal) == best)
+
+    def pregenerate(self):
+        """Predict a goal and generate its tasks now; returns the candidate or None"""
+        goal = self.predict_goal()
+        if goal is None:
+            return None
+        start = time.perf_counter()
+        try:
+            with generation_priority(SCHEDULED):
+                tasks = self.task_generator.generate_tasks(goal)
+        except OpenAIError as e:
+            print(f"Could not prepare tasks ahead of the alarm: {e}")
+            return None
+        if not tasks:
+            return None
+        candidate = {
+            "goal": goal,
+            "tasks": tasks,
+            "date": datetime.date.today(),
+            "generation_time": time.perf_counter() - start,
+        }
+        with self._lock:
+            self._candidate = candidate
+            self.generated += 1
+        return candidate
+
+    def take(self):
+        """Hand out today's prepared candidate once, or None"""
+        with self._lock:
+            candidate, self._candidate = self._candidate, None
+        if candidate is None or candidate["date"] != datetime.date.today():
+            return None
+        with self._lock:
+            self.offered += 1
+        return candidate
+
+    def record(self, candidate, accepted):
+        """Note whether the user took the offered candidate"""
+        if accepted:
+            with self._lock:
+                self.accepted += 1
+                self.saved_seconds += candidate["generation_time"]
+
+    def reschedule(self):
+        """Re-read the next alarm time (call after alarms change)"""
+        self._wake.set()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()
+            due = self.next_due()
+            now = time.time()
+            if due is None or due == self._prepared_for:
+                # Nothing to prepare until an alarm is added or this one passes
+                timeout = None if due is None else max(due - now, 0) + 1
+                self._wake.wait(min(timeout, MAX_SLEEP) if timeout is not None else None)
+                continue
+            # The same offset for the same alarm on every pass through the loop
+            start_at = due - self.lead_time + random.Random(due).uniform(0, self.window)
+            if start_at > now:
+                self._wake.wait(min(start_at - now, MAX_SLEEP))
+                continue
+            self._prepared_for = due
+            if due - now > 0:
+                self.pregenerate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "generated": self.generated,
+                "offered": self.offered,
+                "accepted": self.accepted,
+                "hit_rate": self.accepted / self.offered if self.offered else 0.0,
+                "saved_seconds": self.saved_seconds,
+            }
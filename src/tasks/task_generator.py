@@ -1,8 +1,306 @@
+import contextvars
+import threading
+import time
+
+from ai.model_router import MIN_TASKS, ModelRouter, Route
+from ai.openai_client import OpenAIError
+from ai.response_cache import cache_key
+from ai.single_flight import Flight, SingleFlight
+from monitoring.metrics import metrics
+from tasks.local_generator import LocalTaskGenerator
+from tasks.task_parser import IncrementalTaskParser, parse_tasks
+
+TASK_PROMPT = (
+    "Based on the goal: '{goal}', generate a list of 5-7 specific, measurable, "
+    "achievable tasks for today. Make each task concrete and actionable so the user "
+    "can check it off when completed. Return ONLY a JSON array where each element is a "
+    "dictionary with 'task' and 'completed' keys. The 'completed' value should always be false."
+)
+
+class HedgedGeneration:
+    """A model generation raced against the local generator.
+
+    The model's tasks are produced on a background thread. `tasks()` yields
+    them as they arrive if the first one comes within `deadline` seconds;
+    otherwise, or if the model fails or returns nothing before then, it
+    yields the local list at once and sets `local`. The model's list, if it
+    arrives later, is then passed to the `on_upgrade` callbacks so the local
+    one can be replaced, after which the `on_finished` callbacks run. A
+    `deadline` of None waits for the model.
+    """
+
+    def __init__(self, produce, fallback, deadline):
+        self.deadline = deadline
+        self.fallback = fallback
+        self.local = False
+        self.time_to_first_task = None
+        self.total_time = None
+        # Set once the model has finished and any upgrade has been handed over
+        self.finished = threading.Event()
+        self._flight = Flight()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._finished_callbacks = []
+        self._start = time.perf_counter()
+        # Copy the context so the generation keeps the caller's priority
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._run, produce), daemon=True,
+                         name="hedged-generation").start()
+
+    def _run(self, produce):
+        error = None
+        try:
+            for task in produce():
+                self._flight.publish(task)
+        except Exception as e:
+            error = e
+        self._flight.finish(None if error else list(self._flight.items), error)
+        with self._lock:
+            callbacks, self._callbacks = self._callbacks, None
+        for callback in callbacks:
+            self._upgrade(callback)
+        with self._lock:
+            self.finished.set()
+            callbacks, self._finished_callbacks = self._finished_callbacks, None
+        for callback in callbacks:
+            self._notify(callback)
+
+    def _upgrade(self, callback):
+        flight = self._flight
+        if self.local and flight.error is None and flight.result:
+            metrics.incr("tasks.upgraded")
+            self._notify(callback, [dict(task) for task in flight.result])
+
+    def _notify(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            print(f"Error applying generated tasks: {e}")
+
+    def on_upgrade(self, callback):
+        """Call `callback(tasks)` with the model's list once it replaces the local one"""
+        with self._lock:
+            if self._callbacks is not None:
+                self._callbacks.append(callback)
+                return
+        self._upgrade(callback)
+
+    def on_finished(self, callback):
+        """Call `callback()` once the model has finished and every upgrade has been handed over"""
+        with self._lock:
+            if self._finished_callbacks is not None:
+                self._finished_callbacks.append(callback)
+                return
+        self._notify(callback)
+
+    def tasks(self):
+        flight = self._flight
+        answered = flight.started(self.deadline)
+        if answered and not (flight.done and (flight.error is not None or not flight.items)):
+            tasks = flight.follow()
+        else:
+            self.local = True
+            metrics.incr("tasks.source", source="local")
+            tasks = self.fallback()
+        for task in tasks:
+            if self.time_to_first_task is None:
+                self.time_to_first_task = time.perf_counter() - self._start
+            yield task
+        self.total_time = time.perf_counter() - self._start
+
+    def result(self):
+        """The whole task list; see tasks()"""
+        return list(self.tasks())
+
+
 class TaskGenerator:
-    def __init__(self, openai_client):
+    def __init__(self, openai_client, max_tokens=800, temperature=0.7, cache=None, similar_goals=None,
+                 router=None, local=None, hedge_deadline=None):
         self.openai_client = openai_client
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        # Optional ai.response_cache.ResponseCache of parsed task lists
+        self.cache = cache
+        # Optional ai.semantic_cache.SemanticGoalIndex of earlier goals
+        self.similar_goals = similar_goals
+        # Optional ai.model_router.ModelRouter picking the model, prompt and
+        # max_tokens for each goal; without one every goal gets TASK_PROMPT
+        self.router = router or ModelRouter([Route("default", None, TASK_PROMPT, max_tokens, headroom=None)])
+        # Concurrent requests for the same normalized goal, from any session
+        # or the alarm thread, share one generation; see in_flight.stats()
+        self.in_flight = SingleFlight("tasks")
+        # Template-based stand-in for the model, and how many seconds hedge()
+        # waits for the model before using it (None waits for the model)
+        self.local = local or LocalTaskGenerator()
+        self.hedge_deadline = hedge_deadline
 
+    def build_prompt(self, goal):
+        return TASK_PROMPT.format(goal=goal)
+
+    def cache_key(self, goal):
+        """Key covering the goal and the model, prompt and budget of every route that may answer it"""
+        routes = self.router.routes
+        return cache_key(goal, [route.prompt for route in routes],
+                         [route.model or self.openai_client.model for route in routes],
+                         max_tokens=[[route.max_tokens, route.headroom] for route in routes],
+                         temperature=self.temperature)
+
+    def hedge(self, goal, deadline=None, stream=True):
+        """Generate tasks for `goal`, falling back to local ones after the deadline
+
+        Returns a HedgedGeneration; `deadline` defaults to hedge_deadline.
+        """
+        if deadline is None:
+            deadline = self.hedge_deadline
+        if stream:
+            produce = lambda: self.stream_tasks(goal)
+        else:
+            produce = lambda: self.generate_tasks(goal)
+        return HedgedGeneration(produce, lambda: self.local.generate_tasks(goal), deadline)
+
+    def cached_tasks(self, goal):
+        """Return a fresh copy of known tasks for `goal` or a close paraphrase, or None"""
+        if self.cache is not None:
+            tasks = self.cache.get(self.cache_key(goal))
+            if tasks is not None:
+                metrics.incr("tasks.source", source="cache")
+                return [dict(task) for task in tasks]
+        if self.similar_goals is not None:
+            match = self.similar_goals.lookup(goal)
+            if match is not None:
+                metrics.incr("tasks.source", source="similar")
+                tasks = match[0]
+                if self.cache is not None:
+                    self.cache.put(self.cache_key(goal), [dict(task) for task in tasks])
+                return tasks
+        return None
+
+    def _store(self, goal, tasks, usable):
+        metrics.incr("tasks.source", source="model")
+        # A list that fell short on every route is still returned, but it is
+        # not kept for the whole TTL or reused for similar goals
+        if not usable:
+            return
+        if self.cache is not None:
+            self.cache.put(self.cache_key(goal), [dict(task) for task in tasks])
+        if self.similar_goals is not None:
+            self.similar_goals.add(goal, tasks)
+
+    def _attempt(self, route, goal):
+        """(prompt, call arguments) for one route"""
+        prompt = route.prompt.format(goal=goal)
+        return prompt, dict(model=route.model, max_tokens=route.budget(goal), temperature=self.temperature)
+
+    @metrics.timed("tasks.generate")
     def generate_tasks(self, goal):
-        prompt = f"Based on the goal: '{goal}', generate a list of tasks for the day."
-        tasks = self.openai_client.call_openai(prompt)
-        return tasks
\ No newline at end of file
+        """Generate the full task list for a goal
+
+        A call for a goal already being generated waits for that generation
+        and gets its result, or its error.
+        """
+        tasks = self.in_flight.do(self.cache_key(goal), lambda: self._generate(goal))
+        # Every caller gets its own copy to check off
+        return [dict(task) for task in tasks]
+
+    def _generate(self, goal):
+        tasks = self.cached_tasks(goal)
+        if tasks is not None:
+            return tasks
+        plan = self.router.plan(goal)
+        for route in plan:
+            last = route is plan[-1]
+            prompt, kwargs = self._attempt(route, goal)
+            start = time.perf_counter()
+            try:
+                content = self.openai_client.call_openai(prompt, **kwargs)
+            except OpenAIError:
+                self.router.record(route, time.perf_counter() - start, prompt, None, "error")
+                if last:
+                    raise
+                continue
+            tasks = parse_tasks(content)
+            usable = len(tasks) >= MIN_TASKS
+            self.router.record(route, time.perf_counter() - start, prompt, content, "ok" if usable else "rejected")
+            if usable or last:
+                break
+        self._store(goal, tasks, usable)
+        return tasks
+
+    def stream_tasks(self, goal):
+        """Yield each task as soon as the model has finished writing it
+
+        A call for a goal already being generated follows that generation,
+        receiving each task as the first caller does.
+        """
+        key = self.cache_key(goal)
+        flight, leader = self.in_flight.begin(key)
+        if not leader:
+            for task in flight.follow():
+                yield dict(task)
+            return
+        finished, error = False, None
+        try:
+            for task in self._stream(goal):
+                flight.publish(dict(task))
+                yield task
+            finished = True
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if not finished and error is None:
+                # The caller stopped reading; whoever was waiting can't get the rest
+                error = OpenAIError("The generation was abandoned before it finished")
+            self.in_flight.end(key, flight, flight.items if finished else None, error)
+
+    def _stream(self, goal):
+        """Yield the tasks for a goal as they arrive
+
+        When a route falls back, the stronger model's list only tops up the
+        tasks already shown instead of repeating them.
+        """
+        # Timings are kept per call: the generator is shared by every session
+        start = time.perf_counter()
+        cached = self.cached_tasks(goal)
+        if cached is not None:
+            yield from cached
+            return
+        first_task = None
+        shown = []
+        plan = self.router.plan(goal)
+        for route in plan:
+            last = route is plan[-1]
+            prompt, kwargs = self._attempt(route, goal)
+            attempt_start = time.perf_counter()
+            parser = IncrementalTaskParser()
+            received = []
+            try:
+                pieces = self.openai_client.stream_openai(prompt, **kwargs)
+                for task in self._parse(parser, pieces, received):
+                    if len(parser.tasks) > len(shown):
+                        if first_task is None:
+                            first_task = time.perf_counter() - start
+                        shown.append(task)
+                        yield task
+            except OpenAIError:
+                self.router.record(route, time.perf_counter() - attempt_start, prompt, "".join(received), "error")
+                if last:
+                    raise
+                continue
+            usable = len(parser.tasks) >= MIN_TASKS
+            self.router.record(route, time.perf_counter() - attempt_start, prompt, "".join(received),
+                               "ok" if usable else "rejected")
+            if usable or last:
+                break
+        # Only a reply that was read to the end is worth caching
+        self._store(goal, shown, usable)
+        if first_task is not None:
+            metrics.observe("tasks.first_task", first_task)
+        metrics.observe("tasks.stream", time.perf_counter() - start)
+
+    def _parse(self, parser, pieces, received):
+        """Tasks completed by each streamed piece, then those left at the end"""
+        for piece in pieces:
+            received.append(piece)
+            yield from parser.feed(piece)
+        yield from parser.close()
@@ -0,0 +1,209 @@
+import functools
+import json
+import re
+
+from monitoring.metrics import metrics
+
+TASK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "task": {"type": "string", "minLength": 1},
+        "completed": {"type": "boolean"},
+    },
+    "required": ["task"],
+}
+TASK_LIST_SCHEMA = {"type": "array", "items": TASK_SCHEMA, "minItems": 1}
+
+
+@functools.lru_cache(maxsize=None)
+def validators():
+    """(task, task list) validators, compiled once on first use"""
+    # jsonschema is slow to import, so a launch that never parses a reply skips it
+    from jsonschema import Draft7Validator
+    return Draft7Validator(TASK_SCHEMA), Draft7Validator(TASK_LIST_SCHEMA)
+
+
+# "- task", "• task", "* task", "1. task", "2) task", "1.task" (but not "1.5 hours")
+LIST_ITEM = re.compile(r"^\s*(?:[-•*]|\d+[.)](?!\d))\s*(.*?)\s*$")
+# A ``` or ```json fenced block anywhere in the reply
+FENCED = re.compile(r"```[\w-]*[ \t]*\n(.*?)\n?[ \t]*```", re.S)
+# Keys models sometimes use instead of "task"
+SALVAGE_KEYS = ("title", "name", "description", "text", "action")
+
+
+def make_task(item):
+    """Normalize a parsed item into a {"task", "completed"} dict, or None"""
+    if isinstance(item, dict):
+        if validators()[0].is_valid(item):
+            return {"task": item["task"].strip(), "completed": item.get("completed", False)}
+        # Salvage an item with the text under another key or of another type
+        text = item.get("task")
+        if text is None or isinstance(text, (dict, list)):
+            text = next((item[k] for k in SALVAGE_KEYS if isinstance(item.get(k), str)), None)
+        if text is None or not str(text).strip():
+            return None
+        return {"task": str(text).strip(), "completed": item.get("completed") is True}
+    if isinstance(item, str) and item.strip():
+        return {"task": item.strip(), "completed": False}
+    return None
+
+
+def parse_list_line(line):
+    """Return the task text of a bullet or numbered list line, or None"""
+    match = LIST_ITEM.match(line)
+    return (match.group(1) or None) if match else None
+
+
+class IncrementalTaskParser:
+    """Parse a model reply into tasks while it is still streaming in.
+
+    Handles a JSON array or {"tasks": [...]} object (optionally inside a ```
+    fence) and bullet/numbered lists, after any lines of prose. `feed` returns the tasks completed by the
+    new text, so each one can be shown as soon as its closing brace or line
+    break arrives; `close` returns whatever was left at the end of the reply.
+    Every object found in an array is validated on its own, so one malformed
+    item or a reply cut off part way still yields the good items; `rejected`
+    counts the items that could not be used.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.mode = None
+        self.tasks = []
+        self.rejected = 0
+        self._pos = 0
+        self._stack = []
+        self._open_items = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        if self.mode is None:
+            self._detect_mode()
+        if self.mode == "json":
+            return self._scan_json()
+        if self.mode == "list":
+            return self._scan_lines(final=False)
+        return []
+
+    def close(self):
+        """Finish parsing and return the tasks not yet returned by feed"""
+        if self.mode is None:
+            self.mode = "list"
+        if self.mode == "list":
+            return self._scan_lines(final=True)
+        found = self._scan_json()
+        if not self.tasks:
+            # Not usable JSON after all; fall back to reading it as a list
+            self.mode = "list"
+            self._pos = 0
+            return self._scan_lines(final=True)
+        return found
+
+    def _detect_mode(self):
+        """Skip prose and fence lines up to the first JSON or list line"""
+        while self.mode is None:
+            end = self.buffer.find("\n", self._pos)
+            line = self.buffer[self._pos:] if end < 0 else self.buffer[self._pos:end]
+            stripped = line.strip()
+            if stripped[:1] in ("[", "{"):
+                # JSON is scanned from here as it streams, possibly all on one line
+                self._pos += len(line) - len(line.lstrip())
+                self.mode = "json"
+            elif end < 0:
+                # Wait for the rest of the line
+                return
+            elif parse_list_line(line):
+                self.mode = "list"
+            else:
+                # "Sure! Here is the JSON:", a ```json fence or a blank line
+                self._pos = end + 1
+
+    def _emit(self, item):
+        task = make_task(item)
+        if task is None:
+            self.rejected += 1
+            return []
+        self.tasks.append(task)
+        return [task]
+
+    def _scan_json(self):
+        found = []
+        buffer = self.buffer
+        stack = self._stack
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_start is not None:
+                        # A bare string element of the top-level array
+                        found += self._emit(self._decode(buffer[self._string_start:i + 1]))
+                        self._string_start = None
+            elif ch == '"':
+                self._in_string = True
+                if len(stack) == 1 and stack[0][0] == "[":
+                    self._string_start = i
+            elif ch == "[" or ch == "{":
+                # Objects directly inside an array are the items, unless they
+                # are nested in an item themselves
+                is_item = ch == "{" and bool(stack) and stack[-1][0] == "[" and not self._open_items
+                if is_item:
+                    self._open_items += 1
+                stack.append((ch, i, is_item))
+            elif (ch == "]" or ch == "}") and stack:
+                _, start, is_item = stack.pop()
+                if is_item:
+                    self._open_items -= 1
+                    found += self._emit(self._decode(buffer[start:i + 1]))
+            i += 1
+        self._pos = i
+        return found
+
+    def _decode(self, text):
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
+
+    def _scan_lines(self, final):
+        found = []
+        end = len(self.buffer) if final else self.buffer.rfind("\n") + 1
+        if end <= self._pos:
+            return found
+        for line in self.buffer[self._pos:end].split("\n"):
+            text = parse_list_line(line)
+            if text:
+                found += self._emit(text)
+        self._pos = end
+        return found
+
+
+@metrics.timed("tasks.parse")
+def parse_tasks(content):
+    """Parse a complete model reply (or stored task text) into a list of task dicts"""
+    match = FENCED.search(content)
+    text = match.group(1) if match else content
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get("tasks")
+    if isinstance(data, list) and validators()[1].is_valid(data):
+        # Fast path: one C-level decode and one schema check
+        return [{"task": item["task"].strip(), "completed": item.get("completed", False)} for item in data]
+    # Salvage whatever items are usable, item by item
+    metrics.incr("tasks.parse_salvaged")
+    parser = IncrementalTaskParser()
+    tasks = parser.feed(content) + parser.close()
+    if parser.rejected:
+        metrics.incr("tasks.items_rejected", parser.rejected)
+    return tasks
@@ -1,15 +1,22 @@
-import time
-from ai.openai_client import OpenAIClient
+import threading
+from analytics.goal_stats import format_rate
+from tasks.local_generator import STARTER_TASKS_NOTICE
+from tasks.task_parser import parse_tasks
 
 class AppInterface:
-    def __init__(self, alarm_manager, goal_handler):
+    def __init__(self, alarm_manager, goal_handler, jobs):
         self.alarm_manager = alarm_manager
         self.goal_handler = goal_handler
+        # tasks.job_queue.GenerationQueue that generates tasks off the alarm flow
+        self.jobs = jobs
         self.running = True
         # Register the alarm callback
         self.alarm_manager.register_alarm_callback(self.handle_alarm)
         # Flag to determine if we're in the alarm flow
         self.handling_alarm = False
+        # Set whenever no alarm flow is using the terminal
+        self.alarm_finished = threading.Event()
+        self.alarm_finished.set()
     
     def display_prompt(self, message):
         print(message)
@@ -31,7 +38,8 @@ class AppInterface:
         print("5. View today's tasks")
         print("6. Update task completion")
         print("7. Trigger alarm now")
-        print("8. Exit")
+        print("8. View statistics")
+        print("9. Exit")
         print("============================")
     
     def run(self):
@@ -42,7 +50,7 @@ class AppInterface:
         while self.running:
             if not self.handling_alarm:
                 self.display_menu()
-                choice = input("Enter your choice (1-8): ")  # Updated prompt
+                choice = input("Enter your choice (1-9): ")
                 
                 if choice == "1":
                     self.set_alarm()
@@ -58,13 +66,15 @@ class AppInterface:
                     self.update_task_completion()
                 elif choice == "7":
                     self.trigger_alarm_manually()  
-                elif choice == "8":  
+                elif choice == "8":
+                    self.view_stats()
+                elif choice == "9":  
                     self.exit_app()
                 else:
                     print("Invalid choice. Please try again.")
             else:
-                # We're in the alarm handling flow, do nothing and wait for it to complete
-                time.sleep(0.1)
+                # We're in the alarm handling flow, wait for it to complete
+                self.alarm_finished.wait()
     
     def view_todays_tasks(self):
         """View today's tasks and their completion status"""
@@ -92,30 +102,24 @@ class AppInterface:
     
     def update_task_completion(self):
         """Update completion status of today's tasks"""
-        today_goal_tasks = self.goal_handler.get_todays_goals_and_tasks()
+        entry = self.goal_handler.get_todays_entry()
         
-        if not today_goal_tasks:
+        if not entry:
             print("\nNo tasks set for today yet. Use 'Trigger alarm now' to set today's goals and tasks.")
             return
             
-        goal, tasks_data = today_goal_tasks
+        tasks_data = entry.get("tasks", [])
         
         # Convert tasks to list format if it's not already
         task_list = []
         if not isinstance(tasks_data, list):
             # Parse tasks from text if needed
-            lines = tasks_data.split('\n')
-            for line in lines:
-                line = line.strip()
-                if line and (line.startswith('-') or line.startswith('•') or 
-                            line.startswith('*') or 
-                            (len(line) > 2 and line[0].isdigit() and line[1] in ['.', ')'])):
-                    task_text = line.lstrip('- •*0123456789.) ')
-                    task_list.append({"task": task_text, "completed": False})
+            task_list = parse_tasks(tasks_data)
             
-            # Update the goal handler with the parsed task list
-            if task_list:
-                self.goal_handler.update_todays_tasks(task_list)
+            # Update the goal handler with the parsed task list, unless another
+            # session rewrote today's entry since we read it
+            if task_list and not self.goal_handler.update_todays_tasks(task_list, entry.get("version")):
+                return
         else:
             task_list = tasks_data
         
@@ -140,8 +144,8 @@ class AppInterface:
                 # Toggle completion status
                 task_list[task_num-1]["completed"] = not task_list[task_num-1].get("completed", False)
                 
-                # Update the goal handler with the modified task list
-                self.goal_handler.update_todays_tasks(task_list)
+                # Record just the toggled task rather than rewriting the whole list
+                self.goal_handler.set_task_completed(task_num-1, task_list[task_num-1]["completed"])
                 
                 # Confirm the update
                 status = "completed" if task_list[task_num-1].get("completed", False) else "not completed"
@@ -159,59 +163,51 @@ class AppInterface:
     def handle_alarm(self):
         """Handle alarm event"""
         self.handling_alarm = True
+        self.alarm_finished.clear()
         try:
-            # Get goal from user
-            goal = self.goal_handler.get_goal_from_user()
-            if goal:
-                print("\nGenerating tasks based on your goal...")
-                # Generate improved prompt for more specific tasks
-                prompt = (
-                    f"Based on the goal: '{goal}', generate a list of 5-7 specific, measurable, "
-                    f"achievable tasks for today. Make each task concrete and actionable so the user "
-                    f"can check it off when completed. Format as a numbered list."
-                )
-                
-                # Generate tasks based on the improved prompt
-                tasks = self.alarm_manager.task_generator.generate_tasks(prompt)
-                
-                # Try to parse the tasks into a list if it's a string
-                task_list = []
-                if isinstance(tasks, str):
-                    # Try to extract tasks from the OpenAI response
-                    for line in tasks.split('\n'):
-                        line = line.strip()
-                        if line and (line.startswith('-') or line.startswith('•') or 
-                                    line.startswith('*') or 
-                                    (len(line) > 2 and line[0].isdigit() and line[1] in ['.', ')'])):
-                            task_text = line.lstrip('- •*0123456789.) ')
-                            task_list.append({"task": task_text, "completed": False})
-                
-                # Save the goal and tasks
-                if task_list:
-                    self.goal_handler.save_goal_and_structured_tasks(goal, task_list)
-                else:
-                    self.goal_handler.save_goal_and_tasks(goal, tasks)
-                
-                # Display the tasks in a user-friendly way
-                print("\nYour tasks for today:")
-                if task_list:
-                    for i, task_info in enumerate(task_list, 1):
-                        print(f"{i}. [{' '}] {task_info['task']}")
-                else:
-                    print(tasks)  # Print raw response if parsing failed
-                
+            # Get goal from user, offering the one tasks were prepared for
+            goal, prepared = self.alarm_manager.get_goal_and_ready_tasks()
+            if goal and prepared:
+                print("\nYour tasks for today (prepared before your alarm):")
+                for i, task_info in enumerate(prepared, 1):
+                    print(f"{i}. [{' '}] {task_info['task']}")
+                self.goal_handler.save_goal_and_structured_tasks(goal, prepared)
                 print("\nYou can check off tasks as you complete them throughout the day.")
                 input("\nPress Enter to continue...")  # Wait for user acknowledgment
+            elif goal:
+                # Generate in the background so the menu stays usable meanwhile
+                self.jobs.submit(goal, on_done=self.show_generated_tasks, on_task=self.show_generated_task)
+                print("\nGenerating tasks based on your goal in the background.")
+                print("Each one is shown here as soon as it is ready, and under 'View today's tasks' once all are.")
         finally:
             self.handling_alarm = False
+            self.alarm_finished.set()
+    
+    def show_generated_task(self, index, task_info):
+        """Print one task of a background generation job as soon as it is parsed (called from a worker thread)"""
+        if index == 0:
+            print("\n\nYour tasks for today:")
+        print(f"{index + 1}. [{' '}] {task_info['task']}")
+    
+    def show_generated_tasks(self, job):
+        """Print the outcome of a background generation job (called from a worker thread)"""
+        if job["status"] != "done":
+            print(f"\n\nCould not generate tasks for '{job['goal']}': {job['error']}")
+            print("Please try again later.")
+            return
+        print(f"\nAll {len(job['tasks'])} tasks for '{job['goal']}' are saved.")
+        if job["source"] == "local":
+            print(f"\n({STARTER_TASKS_NOTICE})")
+        print("\nYou can check off tasks as you complete them throughout the day.")
     
     def set_alarm(self):
         """Set a new alarm"""
         time_str = input("Enter alarm time (HH:MM format): ")
-        if self.alarm_manager.add_alarm(time_str):
+        recurrence = input("Repeat on (daily, weekdays, weekends, once or e.g. mon,wed,fri) [daily]: ").strip()
+        if self.alarm_manager.add_alarm(time_str, recurrence or "daily"):
             print(f"Alarm set for {time_str}")
         else:
-            print("Failed to set alarm. Please use HH:MM format.")
+            print("Failed to set alarm.")
     
     def view_alarms(self):
         """View all set alarms"""
@@ -221,6 +217,11 @@ class AppInterface:
             print("\nCurrent alarms:")
             for i, alarm in enumerate(self.alarm_manager.alarms, 1):
                 print(f"{i}. {alarm.strftime('%H:%M')}")
+        pregenerator = self.alarm_manager.pregenerator
+        if pregenerator and pregenerator.offered:
+            stats = pregenerator.stats()
+            print(f"\nPrepared tasks used {stats['accepted']} of {stats['offered']} times "
+                  f"({stats['hit_rate']:.0%}), saving {stats['saved_seconds']:.1f}s of waiting")
     
     def remove_alarm(self):
         """Remove an existing alarm"""
@@ -232,33 +233,75 @@ class AppInterface:
             else:
                 print(f"No alarm found at {time_str}.")
     
-    def view_goal_history(self):
-        """View history of goals and tasks"""
-        goals = self.goal_handler.get_goals_history()
-        if not goals:
+    def view_goal_history(self, page_size=5):
+        """View history of goals and tasks one page at a time, newest first"""
+        total = self.goal_handler.count_history()
+        if not total:
             print("No goal history found.")
-        else:
-            print("\n=== Goal History ===")
-            for entry in goals:
-                print(f"\nDate: {entry['date']}")
-                print(f"Goal: {entry['goal']}")
-                print("Tasks:")
-                
-                # Handle both structured task lists and raw text
-                tasks_data = entry.get('tasks', [])
-                if isinstance(tasks_data, list):
-                    for i, task_info in enumerate(tasks_data, 1):
-                        if isinstance(task_info, dict):
-                            status = "✓" if task_info.get("completed", False) else "□"
-                            task = task_info.get("task", "")
-                            print(f"{i}. [{status}] {task}")
-                        else:
-                            print(f"{i}. {task_info}")
+            return
+        
+        page = 0
+        pages = (total + page_size - 1) // page_size
+        while True:
+            print(f"\n=== Goal History (page {page + 1} of {pages}) ===")
+            for entry in self.goal_handler.get_history_page(page * page_size, page_size):
+                self.display_history_entry(entry)
+            
+            choice = input("\n[n]ext, [p]revious, [j]ump to date, [q]uit: ").strip().lower()
+            if choice == "n" and page + 1 < pages:
+                page += 1
+            elif choice == "p" and page > 0:
+                page -= 1
+            elif choice == "j":
+                date = input("Jump to date (YYYY-MM-DD): ").strip()
+                # Entries on or after the date come first when listing newest first
+                newer = self.goal_handler.count_history(start_date=date)
+                page = max(newer - 1, 0) // page_size
+            elif choice in ("q", ""):
+                return
+    
+    def view_stats(self):
+        """Show completion rates, streaks and the weekly trend"""
+        stats = self.goal_handler.get_stats()
+        if not stats or not stats["goals"]:
+            print("\nNo statistics yet. Set a goal to get started.")
+            return
+        
+        print("\n=== Statistics ===")
+        print(f"Today's completion:     {format_rate(stats['today_rate'])}")
+        print(f"This week's completion: {format_rate(stats['week_rate'])}")
+        print(f"Overall completion:     {format_rate(stats['overall_rate'])}")
+        print(f"Current streak:         {stats['current_streak']} day(s)")
+        print(f"Longest streak:         {stats['longest_streak']} day(s)")
+        print(f"Average tasks per goal: {stats['average_tasks_per_goal']:.1f}")
+        print("\nWeekly completion:")
+        for week, value in stats["weekly_rates"]:
+            bar = "#" * round((value or 0) * 20)
+            print(f"  {week}  {format_rate(value):>4}  {bar}")
+    
+    def display_history_entry(self, entry):
+        """Print a single history entry"""
+        print(f"\nDate: {entry['date']}")
+        print(f"Goal: {entry['goal']}")
+        print("Tasks:")
+        
+        # Handle both structured task lists and raw text
+        tasks_data = entry.get('tasks', [])
+        if isinstance(tasks_data, list):
+            for i, task_info in enumerate(tasks_data, 1):
+                if isinstance(task_info, dict):
+                    status = "✓" if task_info.get("completed", False) else "□"
+                    task = task_info.get("task", "")
+                    print(f"{i}. [{status}] {task}")
                 else:
-                    print(tasks_data)
+                    print(f"{i}. {task_info}")
+        else:
+            print(tasks_data)
     
     def exit_app(self):
         """Exit the application"""
         self.running = False
         self.alarm_manager.stop()
+        self.jobs.stop()
+        self.goal_handler.close()
         print("Thank you for using Mental Health App. Goodbye!")
\ No newline at end of file
@@ -0,0 +1,83 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from alarm.alarm_store import AlarmStore
+from alarm.timer_scheduler import TimerScheduler
+
+
+@pytest.fixture
+def store(tmp_path):
+    return AlarmStore(str(tmp_path / "alarms.db"))
+
+
+def start_workers(store, fired, count=2):
+    lock = threading.Lock()
+
+    def on_fire(worker):
+        def record(alarm):
+            with lock:
+                fired.append((worker, alarm.id))
+        return record
+
+    return [TimerScheduler(on_fire(i), store=store, sync_interval=0.05, worker_id=f"worker-{i}").start()
+            for i in range(count)]
+
+
+def soon(seconds=0.5):
+    return (datetime.datetime.now() + datetime.timedelta(seconds=seconds)).time()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_one_off_alarm_fires_once_across_workers(store):
+    fired = []
+    workers = start_workers(store, fired)
+    try:
+        alarm = workers[0].add(soon(), recurrence="once")
+        # Both workers hold the alarm before it comes due
+        assert wait_for(lambda: len(workers[1]) == 1)
+        assert wait_for(lambda: fired)
+        time.sleep(0.3)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    assert [alarm_id for _, alarm_id in fired] == [alarm.id]
+    assert len(store.firings(alarm.id)) == 1
+
+
+def test_repeating_alarm_is_claimed_once_per_occurrence(store):
+    fired = []
+    workers = start_workers(store, fired)
+    try:
+        alarm = workers[1].add(soon(), recurrence="daily")
+        assert wait_for(lambda: len(workers[0]) == 1)
+        due = alarm.due
+        assert wait_for(lambda: fired)
+        time.sleep(0.3)
+    finally:
+        for worker in workers:
+            worker.stop()
+
+    assert len(fired) == 1
+    (firing,) = store.firings(alarm.id)
+    assert firing[1] == due and firing[4] is not None
+    # The store moved the alarm on to tomorrow for every worker
+    rows, _ = store.changes(0)
+    assert rows[0][4] == pytest.approx(due + 24 * 3600, abs=3600)
+
+
+def test_claim_is_a_compare_and_swap(store):
+    alarm_id = store.add("default", "07:00", "once", 100.0)
+
+    assert store.claim(alarm_id, 100.0, None, "a")
+    assert not store.claim(alarm_id, 100.0, None, "b")
+    assert [row[2] for row in store.firings(alarm_id)] == ["a"]
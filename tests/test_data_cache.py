@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+from storage.data_cache import DataCache, file_signature, shared_cache
+from storage.journal_store import JournalStore
+
+DATE = "2026-10-01"
+
+
+class Loader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, stale):
+        self.calls.append(stale)
+        return len(self.calls)
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "user_data.json"
+    path.write_text("{}")
+    yield str(path)
+    shared_cache.clear()
+
+
+def write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+    return path
+
+
+def test_an_unchanged_signature_is_a_hit(path):
+    cache, load = DataCache(), Loader()
+
+    assert cache.get(path, file_signature(path), load) == 1
+    assert cache.get(path, file_signature(path), load) == 1
+    assert cache.peek(path, file_signature(path)) == 1
+    assert load.calls == [None]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_a_changed_file_reloads_from_the_stale_value(path):
+    cache, load = DataCache(), Loader()
+    cache.get(path, file_signature(path), load)
+    with open(path, "a") as f:
+        f.write("\n")
+
+    assert cache.peek(path, file_signature(path)) is None
+    assert cache.get(path, file_signature(path), load) == 2
+    assert load.calls == [None, 1]
+
+
+def test_invalidate_reloads_every_variant(path):
+    cache, load = DataCache(), Loader()
+    signature = file_signature(path)
+    cache.get(path, signature, load, variant="a")
+    cache.get(path, signature, load, variant="b")
+    assert cache.get(path, signature, load, variant="a") == 1
+
+    cache.invalidate(path)
+
+    assert cache.peek(path, signature, variant="a") is None
+    assert cache.get(path, signature, load, variant="a") == 3
+    assert cache.get(path, signature, load, variant="b") == 4
+
+
+def test_file_signature_tracks_replacement(path):
+    before = file_signature(path)
+    os.replace(write(path + ".tmp", "{}"), path)
+
+    assert file_signature(path) != before
+    assert file_signature(path + ".missing") is None
+
+
+def test_stores_on_one_file_share_the_parsed_data(path, monkeypatch):
+    os.remove(path)
+    JournalStore(path).save_goal_and_tasks(DATE, "run", [{"task": "a", "completed": False}])
+    shared_cache.clear()
+    loads = []
+    load_snapshot = JournalStore._load_snapshot
+
+    def counted(self, *args):
+        loads.append(args)
+        return load_snapshot(self, *args)
+
+    monkeypatch.setattr(JournalStore, "_load_snapshot", counted)
+
+    first = JournalStore(path).load_all()
+    second = JournalStore(path).load_all()
+
+    assert first is second
+    assert len(loads) == 1
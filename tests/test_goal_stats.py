@@ -0,0 +1,121 @@
+import datetime
+import random
+
+import pytest
+
+from analytics.goal_stats import GoalStats, StatsTrackingStore, format_rate
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+
+TODAY = datetime.date(2026, 10, 18)
+
+
+def date(days_ago):
+    return (TODAY - datetime.timedelta(days=days_ago)).isoformat()
+
+
+def tasks(done, total=3):
+    return [{"task": str(i), "completed": i < done} for i in range(total)]
+
+
+def assert_same(incremental, rebuilt):
+    for weeks in (1, 8, 30):
+        assert incremental.summary(TODAY, weeks) == rebuilt.summary(TODAY, weeks)
+    assert incremental.days == rebuilt.days
+    assert incremental._starts == rebuilt._starts
+    assert incremental._end_of == rebuilt._end_of
+    assert incremental._lengths == rebuilt._lengths
+    assert incremental.longest == rebuilt.longest
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_day_by_day_updates_match_a_rebuild(seed):
+    rng = random.Random(seed)
+    stats = GoalStats()
+    entries = {}
+    for _ in range(400):
+        day = date(rng.randrange(60))
+        if rng.random() < 0.15:
+            entries.pop(day, None)
+            stats.set_day(day, None)
+        else:
+            total = rng.randrange(4)
+            entries[day] = {"date": day, "tasks": tasks(rng.randrange(total + 1), total)}
+            stats.set_day(day, (total, sum(t["completed"] for t in entries[day]["tasks"])))
+        if rng.random() < 0.05:
+            assert_same(stats, GoalStats.from_entries(list(entries.values())))
+
+    assert_same(stats, GoalStats.from_entries(list(entries.values())))
+
+
+def test_streaks_split_and_merge():
+    stats = GoalStats()
+    for days_ago in range(5):
+        stats.set_day(date(days_ago), (3, 1))
+    assert stats.current_streak(TODAY) == stats.longest == 5
+
+    stats.set_day(date(2), (3, 0))
+    assert stats.current_streak(TODAY) == stats.longest == 2
+
+    stats.set_day(date(0), None)
+    # Today has nothing done yet, so the streak ending yesterday still counts
+    assert stats.current_streak(TODAY) == 1
+    stats.set_day(date(2), (3, 3))
+    assert stats.current_streak(TODAY) == stats.longest == 4
+
+
+def test_summary_rates():
+    stats = GoalStats.from_entries([{"date": date(0), "tasks": tasks(1, 4)},
+                                    {"date": date(8), "tasks": tasks(2, 2)},
+                                    {"date": "not a date", "tasks": tasks(1)}])
+    summary = stats.summary(TODAY, weeks=2)
+
+    assert summary["today_rate"] == 0.25
+    assert summary["overall_rate"] == 0.5
+    assert summary["goals"] == 2
+    assert [rate for _, rate in summary["weekly_rates"]] == [1.0, 0.25]
+    assert format_rate(summary["today_rate"]) == "25%"
+    assert format_rate(None) == "-"
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    yield str(tmp_path / "user_data.json")
+    shared_cache.clear()
+
+
+def test_the_store_keeps_stats_current_without_rescanning(data_file, monkeypatch):
+    store = StatsTrackingStore(JournalStore(data_file))
+    for days_ago in range(10):
+        store.save_goal_and_tasks(date(days_ago), "run", tasks(days_ago % 2))
+    store.goal_stats(today=TODAY)
+    loads = []
+    load_all = store.backend.load_all
+
+    def counted(user="default"):
+        loads.append(user)
+        return load_all(user)
+
+    monkeypatch.setattr(store.backend, "load_all", counted)
+
+    store.set_task_completed(date(1), 2, True)
+    store.set_tasks_completed(date(2), {0: True, 1: True})
+    store.update_tasks(date(3), tasks(0, 5))
+    store.save_goal_and_tasks(date(20), "read", tasks(1), user="sam")
+    summary = store.goal_stats(today=TODAY)
+
+    assert loads == []
+    store.rebuild()
+    assert store.goal_stats(today=TODAY) == summary
+    assert loads == ["default"]
+
+
+def test_a_write_from_elsewhere_triggers_a_rebuild(data_file):
+    store = StatsTrackingStore(JournalStore(data_file))
+    store.save_goal_and_tasks(date(0), "run", tasks(0))
+    assert store.goal_stats(today=TODAY)["today_rate"] == 0.0
+
+    # Another process toggles a task on the same file
+    JournalStore(data_file).set_task_completed(date(0), 0, True)
+
+    assert store.goal_stats(today=TODAY)["today_rate"] == pytest.approx(1 / 3)
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from tasks.local_generator import LocalTaskGenerator
+from tasks.task_generator import HedgedGeneration
+
+MODEL_TASKS = [{"task": f"Model task {i}", "completed": False} for i in range(3)]
+LOCAL_TASKS = [{"task": "Local task", "completed": False}]
+
+
+def model(delay=0.0, error=None, tasks=MODEL_TASKS):
+    def produce():
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        for task in tasks:
+            yield dict(task)
+    return produce
+
+
+def hedge(produce, deadline):
+    return HedgedGeneration(produce, lambda: [dict(task) for task in LOCAL_TASKS], deadline)
+
+
+class Recorder:
+    def __init__(self, generation):
+        self.events = []
+        self.done = threading.Event()
+        generation.on_upgrade(lambda tasks: self.events.append(("upgrade", tasks)))
+        generation.on_finished(self.finished)
+
+    def finished(self):
+        self.events.append(("finished",))
+        self.done.set()
+
+
+def test_a_prompt_model_is_used_and_nothing_is_upgraded():
+    generation = hedge(model(), deadline=1.0)
+    recorder = Recorder(generation)
+
+    assert generation.result() == MODEL_TASKS
+    assert not generation.local
+    assert recorder.done.wait(5)
+    assert recorder.events == [("finished",)]
+    assert generation.time_to_first_task <= generation.total_time
+
+
+def test_a_slow_model_is_raced_by_local_tasks_and_then_upgrades_them():
+    generation = hedge(model(delay=0.3), deadline=0.05)
+    recorder = Recorder(generation)
+
+    start = time.perf_counter()
+    assert generation.result() == LOCAL_TASKS
+    assert time.perf_counter() - start < 0.25
+    assert generation.local
+
+    assert recorder.done.wait(5)
+    assert generation.finished.is_set()
+    assert recorder.events == [("upgrade", MODEL_TASKS), ("finished",)]
+
+
+def test_a_failing_model_falls_back_without_waiting_for_the_deadline():
+    generation = hedge(model(error=RuntimeError("down")), deadline=5.0)
+    recorder = Recorder(generation)
+
+    start = time.perf_counter()
+    assert generation.result() == LOCAL_TASKS
+    assert time.perf_counter() - start < 1.0
+    assert recorder.done.wait(5)
+    assert recorder.events == [("finished",)]
+
+
+def test_callbacks_added_after_the_model_finished_run_at_once():
+    generation = hedge(model(delay=0.1), deadline=0.01)
+    assert generation.result() == LOCAL_TASKS
+    assert generation.finished.wait(5)
+
+    recorder = Recorder(generation)
+    assert recorder.events == [("upgrade", MODEL_TASKS), ("finished",)]
+
+
+def test_no_deadline_waits_for_the_model():
+    generation = hedge(model(delay=0.2), deadline=None)
+
+    assert generation.result() == MODEL_TASKS
+    assert not generation.local
+
+
+def test_local_tasks_follow_the_goals_category():
+    local = LocalTaskGenerator()
+
+    assert local.category("Run a 5k") == "fitness"
+    assert local.category("Learn 20 Spanish words") == "study"
+    assert local.category("Prune the roses") == "generic"
+    tasks = local.generate_tasks("  Run a 5k ")
+    assert tasks[0] == {"task": "Lay out your clothes and gear for 'Run a 5k'", "completed": False}
+    assert len(tasks) == 6
+    assert local.generate_tasks("Run a 5k") == tasks
+    assert local.generate_tasks("Something else entirely")[0]["task"] == (
+        "Write down why 'Something else entirely' matters to you today")
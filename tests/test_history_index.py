@@ -0,0 +1,114 @@
+import datetime
+import json
+import os
+
+import pytest
+
+from storage.backend import create_backend
+from storage.data_cache import shared_cache
+from storage.history_index import HistoryIndex, write_indexed_snapshot
+from storage.journal_store import JournalStore
+
+
+def days(count):
+    start = datetime.date(2026, 1, 1)
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def entry(date, user=None):
+    entry = {"date": date, "goal": f"goal {date}", "tasks": [{"task": "a", "completed": False}], "version": 1}
+    if user:
+        entry["user"] = user
+    return entry
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    yield str(tmp_path / "user_data.json")
+    shared_cache.clear()
+
+
+def index_file(data_file):
+    return os.path.splitext(data_file)[0] + ".index"
+
+
+def test_entries_are_read_at_their_offsets(data_file):
+    goals = [entry(date) for date in days(5)] + [entry(days(1)[0], user="sam")]
+    write_indexed_snapshot(data_file, index_file(data_file), {"goals": goals, "generation": 3})
+
+    with open(data_file) as f:
+        assert json.load(f)["goals"] == goals
+    index = HistoryIndex.load(index_file(data_file))
+    assert index.generation == 3
+    assert index.dates() == days(5)
+    assert index.dates("sam") == days(1)
+    assert index.locate("2030-01-01") is None
+    keys = [("default", days(5)[3]), ("sam", days(1)[0]), ("sam", days(5)[3])]
+    assert index.read_entries(data_file, keys) == {keys[0]: goals[3], keys[1]: goals[5]}
+
+
+def test_an_index_for_another_snapshot_reads_nothing(data_file):
+    write_indexed_snapshot(data_file, index_file(data_file), {"goals": [entry(days(1)[0])]})
+    index = HistoryIndex.load(index_file(data_file))
+    write_indexed_snapshot(data_file, index_file(data_file), {"goals": [entry(days(1)[0]), entry(days(2)[1])]})
+
+    assert index.read_entries(data_file, [("default", days(1)[0])]) is None
+    assert HistoryIndex.load(data_file + ".missing") is None
+
+
+PAGES = [
+    {},
+    {"limit": 3},
+    {"limit": 3, "offset": 3},
+    {"limit": 4, "offset": 8},
+    {"limit": 3, "newest_first": False},
+    {"limit": 3, "offset": 9, "newest_first": False},
+    {"start_date": days(10)[2], "end_date": days(10)[6], "limit": 2, "offset": 1},
+    {"start_date": days(10)[8]},
+    {"end_date": "2025-12-31"},
+]
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_pages_from_the_index_match_the_full_state(data_file, page):
+    store = JournalStore(data_file)
+    for date in days(8):
+        store.save_goal_and_tasks(date, f"goal {date}", [{"task": "a", "completed": False}])
+    store.compact()
+    # Journal records on top of the indexed snapshot: a change and two new days
+    store.set_task_completed(days(8)[2], 0, True)
+    for date in days(10)[8:]:
+        store.save_goal_and_tasks(date, f"goal {date}", [{"task": "a", "completed": False}])
+
+    shared_cache.clear()
+    store = JournalStore(data_file)
+    indexed = store.get_history(**page), store.count_history(page.get("start_date"), page.get("end_date"))
+    store.load_all()
+    full = store.get_history(**page), store.count_history(page.get("start_date"), page.get("end_date"))
+
+    assert indexed == full
+    dates = days(10)
+    if page.get("start_date"):
+        dates = [d for d in dates if d >= page["start_date"]]
+    if page.get("end_date"):
+        dates = [d for d in dates if d <= page["end_date"]]
+    if page.get("newest_first", True):
+        dates = dates[::-1]
+    offset = page.get("offset", 0)
+    limit = page.get("limit")
+    assert [e["date"] for e in indexed[0]] == dates[offset:None if limit is None else offset + limit]
+    assert indexed[1] == len(dates)
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_sqlite_pages_match_the_journal(data_file, page):
+    journal = create_backend("journal", data_file)
+    for date in days(10):
+        journal.save_goal_and_tasks(date, f"goal {date}", [{"task": "a", "completed": False}])
+    sqlite = create_backend("sqlite", data_file)
+    try:
+        assert sqlite.get_history(**page) == journal.get_history(**page)
+        assert (sqlite.count_history(page.get("start_date"), page.get("end_date"))
+                == journal.count_history(page.get("start_date"), page.get("end_date")))
+    finally:
+        sqlite.close()
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from ai.fake_server import FakeOpenAIServer
+from ai.openai_client import OpenAIClient
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+from tasks import job_queue
+from tasks.job_queue import GenerationQueue, JobStore
+from tasks.task_generator import TaskGenerator
+
+DATE = "2026-10-01"
+
+
+@pytest.fixture
+def server():
+    # Five tasks of about 60 characters each, 20 characters every 20 ms
+    with FakeOpenAIServer(token_latency=0.02, chunk_size=20) as server:
+        yield server
+
+
+@pytest.fixture
+def queue(server, tmp_path):
+    generator = TaskGenerator(OpenAIClient("test-key", base_url=server.base_url))
+    store = JournalStore(str(tmp_path / "user_data.json"))
+    queue = GenerationQueue(generator, str(tmp_path / "jobs.db"), store=store).start()
+    yield queue
+    queue.stop()
+    shared_cache.clear()
+
+
+def test_tasks_are_published_as_they_are_parsed(queue):
+    parsed = []
+    seen_while_running = []
+
+    def on_task(index, task):
+        parsed.append((index, task["task"]))
+        job = queue.status(job_id)
+        seen_while_running.append((job["status"], len(job["tasks"])))
+
+    done = threading.Event()
+    job_id = queue.submit("run a 5k", date=DATE, on_task=on_task, on_done=lambda job: done.set())
+    job = queue.wait(job_id, timeout=10)
+
+    assert done.wait(5)
+    assert job["status"] == "done" and job["source"] == "model"
+    assert [index for index, _ in parsed] == list(range(len(job["tasks"])))
+    assert [text for _, text in parsed] == [task["task"] for task in job["tasks"]]
+    # Each task was on the job row before the next one arrived
+    assert seen_while_running == [("running", i + 1) for i in range(len(parsed))]
+    assert queue.store.get_entry(DATE)["tasks"] == job["tasks"]
+
+
+def test_model_failure_falls_back_to_local_tasks(tmp_path):
+    with FakeOpenAIServer(error_rate=1.0, error_status=400) as server:
+        generator = TaskGenerator(OpenAIClient("test-key", base_url=server.base_url))
+        store = JournalStore(str(tmp_path / "user_data.json"))
+        queue = GenerationQueue(generator, str(tmp_path / "jobs.db"), store=store).start()
+        parsed = []
+        try:
+            job = queue.wait(queue.submit("run a 5k", date=DATE, on_task=lambda i, task: parsed.append(task)),
+                             timeout=10)
+        finally:
+            queue.stop()
+            shared_cache.clear()
+
+    assert job["status"] == "done" and job["source"] == "local"
+    assert parsed == job["tasks"]
+
+
+def test_waiting_for_an_upgrade_holds_no_worker(tmp_path):
+    with FakeOpenAIServer(latency=1.0) as server:
+        generator = TaskGenerator(OpenAIClient("test-key", base_url=server.base_url), hedge_deadline=0.05)
+        store = JournalStore(str(tmp_path / "user_data.json"))
+        queue = GenerationQueue(generator, str(tmp_path / "jobs.db"), store=store, max_workers=1).start()
+        try:
+            first = queue.wait(queue.submit("run a 5k", date=DATE), timeout=10)
+            # The only worker is free while the model is still answering the first goal
+            second = queue.wait(queue.submit("read a book", date="2026-10-02"), timeout=0.8)
+            assert first["source"] == second["source"] == "local"
+            assert first["upgrade_pending"]
+
+            deadline = time.monotonic() + 10
+            while queue.status(first["id"])["upgrade_pending"] and time.monotonic() < deadline:
+                time.sleep(0.05)
+            upgraded = queue.status(first["id"])
+        finally:
+            queue.stop()
+            shared_cache.clear()
+
+    assert not upgraded["upgrade_pending"] and upgraded["source"] == "model"
+    assert upgraded["tasks"][0]["task"] == "Write down why 'run a 5k' matters to you"
+
+
+def test_a_job_run_elsewhere_is_watched_off_the_pool(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "POLL_INTERVAL", 0.05)
+    queue.stop()
+    queue.max_workers = 1
+    elsewhere = JobStore(str(tmp_path / "jobs.db"))
+    done = threading.Event()
+    parsed = []
+    job_id = queue.submit("run a 5k", date=DATE, on_done=lambda job: done.set(),
+                          on_task=lambda index, task: parsed.append(task))
+    # Another process claims the job before this queue starts
+    assert elsewhere.claim(job_id, "other-host:1", lease=60)
+    queue.start()
+
+    # The watched job leaves the single worker free for the next one
+    other = queue.wait(queue.submit("read a book", date="2026-10-02"), timeout=10)
+    assert other["status"] == "done" and not done.is_set()
+
+    elsewhere.finish(job_id, "done", tasks=[{"task": "stretch", "completed": False}], source="model")
+    assert done.wait(5)
+    assert parsed == [{"task": "stretch", "completed": False}]
@@ -0,0 +1,215 @@
+import datetime
+import os
+import threading
+import time
+
+import pytest
+
+import storage.history_index
+import storage.journal_store
+from storage.backend import ConflictError
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+
+DATE = "2026-10-01"
+
+
+def tasks(*names):
+    return [{"task": name, "completed": False} for name in names]
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    yield str(tmp_path / "user_data.json")
+    shared_cache.clear()
+
+
+def reopen(data_file):
+    """A store on the same files with nothing cached, as a freshly started process sees them"""
+    shared_cache.clear()
+    return JournalStore(data_file)
+
+
+def crash_on(module, monkeypatch):
+    def crash(*args, **kwargs):
+        raise KeyboardInterrupt("simulated crash")
+    monkeypatch.setattr(module, "atomic_write", crash)
+
+
+def days(count):
+    start = datetime.date(2020, 1, 1)
+    return [(start + datetime.timedelta(days=i)).isoformat() for i in range(count)]
+
+
+def test_writes_are_replayed_from_the_journal(data_file):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    store.set_task_completed(DATE, 1, True)
+    store.save_goal_and_tasks(DATE, "read", tasks("c"), user="sam")
+
+    store = reopen(data_file)
+    assert store.get_entry(DATE) == {"date": DATE, "goal": "run", "version": 2,
+                                     "tasks": [{"task": "a", "completed": False}, {"task": "b", "completed": True}]}
+    assert store.get_entry(DATE, user="sam")["goal"] == "read"
+    assert store.list_users() == ["default", "sam"]
+
+
+def test_a_toggle_appends_the_same_bytes_however_long_the_history(data_file):
+    store = JournalStore(data_file, compact_threshold=10 ** 6)
+    growth = []
+    for count in (1, 300):
+        for date in days(count):
+            store.save_goal_and_tasks(date, "run", tasks("a"))
+        size = os.path.getsize(store.journal_file)
+        store.set_task_completed(days(1)[0], 0, True)
+        growth.append(os.path.getsize(store.journal_file) - size)
+
+    assert growth[0] == growth[1]
+
+
+def test_a_toggle_reads_the_same_however_long_the_history(data_file, monkeypatch):
+    work = []
+
+    def count(name, method, size):
+        def wrapper(*args):
+            result = method(*args)
+            work.append((name, size(args, result)))
+            return result
+        return wrapper
+
+    HistoryIndex = storage.history_index.HistoryIndex
+    monkeypatch.setattr(HistoryIndex, "load", classmethod(
+        count("index", HistoryIndex.load.__func__, lambda args, result: 1)))
+    monkeypatch.setattr(HistoryIndex, "read_entries", count(
+        "entries", HistoryIndex.read_entries, lambda args, result: len(args[2])))
+    monkeypatch.setattr(JournalStore, "_read_journal", count(
+        "journal", JournalStore._read_journal, lambda args, result: result[1] - args[1]))
+
+    costs = []
+    for count_days in (10, 5000):
+        dates = days(count_days)
+        goals = [{"date": date, "goal": "run", "tasks": tasks("a"), "version": 1} for date in dates]
+        storage.history_index.write_indexed_snapshot(
+            data_file, os.path.splitext(data_file)[0] + ".index", {"goals": goals})
+        store = reopen(data_file)
+        store.compact_threshold = 10 ** 6
+        store.set_task_completed(dates[-1], 0, True)
+        work.clear()
+        for i in range(5):
+            store.set_task_completed(dates[-1], 0, i % 2 == 0)
+        costs.append(sorted(work))
+        os.remove(store.journal_file)
+
+    # No index parse and no snapshot reads: each toggle replays just its own line
+    assert costs[0] == costs[1]
+    assert {name for name, _ in costs[1]} == {"journal"}
+
+
+def test_compaction_folds_the_journal_into_the_snapshot(data_file):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    store.set_task_completed(DATE, 1, True)
+    before = store.get_entry(DATE)
+
+    store.compact()
+
+    with open(store.journal_file) as f:
+        assert f.read() == '{"op":"generation","generation":1}\n'
+    assert reopen(data_file).get_entry(DATE) == before
+
+
+
+def test_journal_is_compacted_past_the_threshold(data_file):
+    store = JournalStore(data_file, compact_threshold=20)
+    for date in days(25):
+        store.save_goal_and_tasks(date, "run", tasks("a"))
+
+    def compacted():
+        with open(store.journal_file) as f:
+            return f.readline().startswith('{"op":"generation"')
+
+    deadline = time.monotonic() + 5
+    while not compacted() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert compacted()
+    assert reopen(data_file).count_history() == 25
+
+
+def test_stale_version_raises_conflict(data_file):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    version = store.get_entry(DATE)["version"]
+    store.update_tasks(DATE, tasks("c"), version=version)
+
+    with pytest.raises(ConflictError):
+        store.update_tasks(DATE, tasks("d"), version=version)
+    assert store.get_entry(DATE)["tasks"] == tasks("c")
+
+
+def test_replace_tasks_only_while_unchanged(data_file):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+
+    assert not store.replace_tasks(DATE, tasks("x"), tasks("c"))
+    store.set_task_completed(DATE, 0, True)
+    assert not store.replace_tasks(DATE, tasks("a", "b"), tasks("c"))
+    assert store.get_entry(DATE)["tasks"][0]["completed"] is True
+
+    assert store.replace_tasks(DATE, store.get_entry(DATE)["tasks"], tasks("c"))
+    assert store.get_entry(DATE)["tasks"] == tasks("c")
+
+
+def test_racing_writers_lose_no_updates(data_file):
+    names = [str(i) for i in range(8)]
+    JournalStore(data_file).save_goal_and_tasks(DATE, "run", tasks(*names))
+    stores = [JournalStore(data_file, max_retries=50) for _ in range(2)]
+    threads = [threading.Thread(target=stores[i % 2].set_task_completed, args=(DATE, i, True))
+               for i in range(len(names))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entry = reopen(data_file).get_entry(DATE)
+    assert all(task["completed"] for task in entry["tasks"])
+    assert entry["version"] == 1 + len(names)
+
+
+def test_crash_before_the_snapshot_is_replaced(data_file, monkeypatch):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    store.set_task_completed(DATE, 0, True)
+    before = store.get_entry(DATE)
+
+    crash_on(storage.history_index, monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact()
+    monkeypatch.undo()
+
+    store = reopen(data_file)
+    assert store.get_entry(DATE) == before
+    assert store.set_task_completed(DATE, 1, True)
+    assert reopen(data_file).get_entry(DATE)["version"] == before["version"] + 1
+
+
+def test_crash_between_snapshot_and_journal(data_file, monkeypatch):
+    store = JournalStore(data_file)
+    store.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    store.update_tasks(DATE, tasks("c", "d"))
+    store.set_task_completed(DATE, 0, True)
+    before = store.get_entry(DATE)
+
+    # The new snapshot lands but the old journal stays next to it
+    crash_on(storage.journal_store, monkeypatch)
+    with pytest.raises(KeyboardInterrupt):
+        store.compact()
+    monkeypatch.undo()
+
+    # Its records are already in the snapshot and must not apply twice
+    store = reopen(data_file)
+    assert store.get_entry(DATE) == before
+    # Writes go on, and the leftover journal is replaced on the first one
+    assert store.set_task_completed(DATE, 1, True)
+    entry = reopen(data_file).get_entry(DATE)
+    assert [task["completed"] for task in entry["tasks"]] == [True, True]
+    assert entry["version"] == before["version"] + 1
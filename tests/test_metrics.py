@@ -0,0 +1,48 @@
+import json
+import os
+
+import pytest
+
+import storage.atomic_file
+from monitoring.metrics import Metrics
+
+
+@pytest.fixture
+def metrics():
+    metrics = Metrics()
+    metrics.incr("tasks.source", source="model")
+    metrics.observe("openai.chat", 0.02)
+    return metrics
+
+
+def test_metrics_are_written_as_json_or_prometheus_text(metrics, tmp_path):
+    json_path = str(tmp_path / "out" / "metrics.json")
+    text_path = str(tmp_path / "metrics.prom")
+
+    metrics.write(json_path)
+    metrics.write(text_path)
+
+    with open(json_path) as f:
+        assert json.load(f)["counters"] == [{"name": "tasks.source", "labels": {"source": "model"}, "value": 1}]
+    with open(text_path) as f:
+        assert 'tasks_source_total{source="model"} 1' in f.read()
+    assert sorted(os.listdir(tmp_path)) == ["metrics.prom", "out"]
+
+
+def test_a_failed_write_keeps_the_previous_file(metrics, tmp_path, monkeypatch):
+    path = str(tmp_path / "metrics.prom")
+    metrics.write(path)
+    with open(path) as f:
+        before = f.read()
+
+    def crash(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(storage.atomic_file.os, "fsync", crash)
+    metrics.incr("tasks.source", source="local")
+    with pytest.raises(OSError):
+        metrics.write(path)
+
+    with open(path) as f:
+        assert f.read() == before
+    assert os.listdir(tmp_path) == ["metrics.prom"]
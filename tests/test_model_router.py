@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from ai.fake_server import FakeOpenAIServer, default_responder
+from ai.model_router import (COMPACT_TASK_PROMPT, ModelRouter, Route, default_router,
+                             estimate_completion_tokens, goal_complexity)
+from ai.openai_client import OpenAIClient
+from tasks.task_generator import TASK_PROMPT, TaskGenerator
+
+SHORT = "Run a 5k"
+LONG = "Plan the team offsite, book the venue and then draft the agenda while collecting feedback"
+
+
+def test_goal_complexity_counts_words_and_clauses():
+    assert goal_complexity(SHORT) == (3, 1)
+    assert goal_complexity("Clean the house and cook, then rest") == (7, 4)
+
+
+def test_short_goals_start_on_the_small_route():
+    router = default_router("small-model", None, TASK_PROMPT)
+    small, large = router.routes
+
+    assert router.plan(SHORT) == [small, large]
+    assert router.plan(LONG) == [large]
+    assert default_router(None, None, TASK_PROMPT).plan(SHORT)[0].name == "large"
+
+
+def test_the_reply_budget_scales_with_the_goal():
+    route = Route("small", "m", COMPACT_TASK_PROMPT, max_tokens=400, headroom=1.5)
+
+    assert route.budget(SHORT) == int(estimate_completion_tokens(SHORT) * 1.5)
+    assert route.budget(SHORT) < route.budget(LONG * 3) == 400
+    assert Route("fixed", None, TASK_PROMPT, 300, headroom=None).budget(LONG) == 300
+
+
+def small_replies_fall_short(messages):
+    """The compact prompt gets a single task, too few to use"""
+    if messages[-1]["content"].startswith("Plan today"):
+        return json.dumps([{"task": "Run", "completed": False}])
+    return default_responder(messages)
+
+
+@pytest.fixture
+def generator():
+    with FakeOpenAIServer(responder=small_replies_fall_short) as server:
+        router = default_router("small-model", None, TASK_PROMPT)
+        yield TaskGenerator(OpenAIClient("test-key", base_url=server.base_url), router=router)
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_a_short_reply_falls_back_to_the_strong_route(generator, stream):
+    if stream:
+        tasks = list(generator.stream_tasks(SHORT))
+    else:
+        tasks = generator.generate_tasks(SHORT)
+
+    # A streamed task already shown stays, and the strong route's list tops it up
+    assert len(tasks) == 5
+    assert tasks[0]["task"] == ("Run" if stream else f"Write down why '{SHORT}' matters to you")
+    stats = generator.router.stats()
+    assert stats["small"]["calls"] == stats["small"]["rejected"] == 1
+    assert stats["large"]["calls"] == stats["large"]["ok"] == 1
+    assert stats["large"]["prompt_tokens"] > stats["small"]["prompt_tokens"] > 0
+
+
+def test_a_failing_route_falls_through():
+    with FakeOpenAIServer(fail_first=1) as server:
+        router = ModelRouter([Route("first", None, TASK_PROMPT, 500), Route("second", None, TASK_PROMPT, 500)])
+        client = OpenAIClient("test-key", base_url=server.base_url, max_retries=0)
+        tasks = TaskGenerator(client, router=router).generate_tasks(SHORT)
+
+    assert len(tasks) == 5
+    assert router.stats()["first"]["error"] == 1
+    assert router.stats()["second"]["ok"] == 1
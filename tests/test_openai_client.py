@@ -0,0 +1,113 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from ai.fake_server import FakeOpenAIServer
+from ai.openai_client import OpenAIClient, OpenAIError
+
+PROMPT = "Generate a list of tasks for the goal: 'run a 5k'"
+
+
+def client(server, **kwargs):
+    kwargs.setdefault("backoff_base", 0.01)
+    return OpenAIClient("test-key", base_url=server.base_url, **kwargs)
+
+
+def test_reply_is_returned():
+    with FakeOpenAIServer() as server:
+        reply = client(server).call_openai(PROMPT)
+
+    assert json.loads(reply)[0]["task"] == "Write down why 'run a 5k' matters to you"
+
+
+def test_transient_errors_are_retried():
+    with FakeOpenAIServer(fail_first=2) as server:
+        reply = client(server, max_retries=3).call_openai(PROMPT)
+
+    assert json.loads(reply)
+    assert (server.requests, server.errors) == (3, 2)
+
+
+def test_gives_up_after_max_retries():
+    with FakeOpenAIServer(fail_first=10) as server:
+        with pytest.raises(OpenAIError) as error:
+            client(server, max_retries=2).call_openai(PROMPT)
+
+    assert error.value.status == 503
+    assert server.requests == 3
+
+
+def test_client_errors_are_not_retried():
+    with FakeOpenAIServer(fail_first=1, error_status=400) as server:
+        with pytest.raises(OpenAIError) as error:
+            client(server, max_retries=3).call_openai(PROMPT)
+
+    assert error.value.status == 400
+    assert server.requests == 1
+
+
+def test_deadline_bounds_a_slow_reply():
+    with FakeOpenAIServer(latency=2.0) as server:
+        start = time.monotonic()
+        with pytest.raises(OpenAIError):
+            client(server, max_retries=5).call_openai(PROMPT, timeout=0.3)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 1.0
+
+
+def test_deadline_bounds_the_retries():
+    with FakeOpenAIServer(fail_first=100) as server:
+        start = time.monotonic()
+        with pytest.raises(OpenAIError):
+            client(server, max_retries=100, backoff_base=0.2).call_openai(PROMPT, timeout=0.5)
+        elapsed = time.monotonic() - start
+
+    assert elapsed < 0.6
+    assert server.requests < 100
+
+
+def test_a_spent_deadline_fails_without_sending():
+    with FakeOpenAIServer() as server:
+        with pytest.raises(OpenAIError):
+            client(server).call_openai(PROMPT, timeout=1e-9)
+
+    assert server.requests == 0
+
+
+def test_stream_is_retried_before_the_first_byte():
+    with FakeOpenAIServer(fail_first=1, chunk_size=7) as server:
+        pieces = list(client(server, max_retries=2).stream_openai(PROMPT))
+
+    assert len(pieces) > 1
+    assert json.loads("".join(pieces))[0]["task"] == "Write down why 'run a 5k' matters to you"
+    assert server.requests == 2
+
+
+def test_async_calls_run_concurrently_on_one_loop():
+    async def main(openai):
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticking = asyncio.create_task(ticker())
+        replies = await asyncio.gather(*(openai.acall_openai(PROMPT) for _ in range(5)))
+        ticking.cancel()
+        return replies, ticks
+
+    with FakeOpenAIServer(latency=0.3) as server:
+        start = time.monotonic()
+        replies, ticks = asyncio.run(main(client(server, pool_size=5)))
+        elapsed = time.monotonic() - start
+
+    assert len(replies) == 5
+    assert all(json.loads(reply)[0]["task"] == "Write down why 'run a 5k' matters to you" for reply in replies)
+    # Five 0.3 s requests overlapped, and the loop kept running meanwhile
+    assert elapsed < 1.0
+    assert ticks > 10
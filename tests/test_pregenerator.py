@@ -0,0 +1,114 @@
+import datetime
+import time
+
+import pytest
+
+from ai.openai_client import OpenAIError
+from ai.scheduler import INTERACTIVE, SCHEDULED, _priority
+from goals.goal_handler import GoalHandler
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+from tasks.pregenerator import TaskPregenerator
+
+TASKS = [{"task": "Stretch", "completed": False}]
+
+
+class FakeGenerator:
+    def __init__(self, error=None):
+        self.error = error
+        self.calls = []
+
+    def generate_tasks(self, goal):
+        self.calls.append((goal, _priority.get()))
+        if self.error is not None:
+            raise self.error
+        return [{"task": f"Plan {goal}", "completed": False}]
+
+
+def days_ago(count):
+    return (datetime.date.today() - datetime.timedelta(days=count)).strftime("%Y-%m-%d")
+
+
+@pytest.fixture
+def handler(tmp_path):
+    yield GoalHandler(JournalStore(str(tmp_path / "user_data.json")))
+    shared_cache.clear()
+
+
+@pytest.fixture
+def make(handler):
+    started = []
+
+    def make(generator=None, next_due=lambda: None, **kwargs):
+        pregenerator = TaskPregenerator(generator or FakeGenerator(), handler, next_due, **kwargs)
+        started.append(pregenerator)
+        return pregenerator
+
+    yield make
+    for pregenerator in started:
+        pregenerator.stop()
+
+
+def history(handler, *goals):
+    """Save `goals` on consecutive days, the last one yesterday"""
+    for i, goal in enumerate(goals):
+        handler.store.save_goal_and_tasks(days_ago(len(goals) - i), goal, TASKS)
+
+
+def test_the_most_frequent_recent_goal_is_predicted(handler, make):
+    handler.store.save_goal_and_tasks(days_ago(30), "Read a book", TASKS)
+    handler.store.save_goal_and_tasks(days_ago(29), "Read a book", TASKS)
+    history(handler, "run a 5k", "Learn Spanish", "Run a 5K!", "Write a poem")
+
+    assert make().predict_goal() == "Run a 5K!"
+
+
+def test_without_a_repeat_the_latest_goal_is_predicted(handler, make):
+    pregenerator = make()
+    assert pregenerator.predict_goal() is None
+
+    history(handler, "Learn Spanish", "Write a poem")
+    assert pregenerator.predict_goal() == "Write a poem"
+
+
+def test_a_candidate_is_generated_at_scheduled_priority_and_taken_once(handler, make):
+    history(handler, "Run a 5k")
+    generator = FakeGenerator()
+    pregenerator = make(generator)
+
+    candidate = pregenerator.pregenerate()
+
+    assert generator.calls == [("Run a 5k", SCHEDULED)]
+    assert _priority.get() == INTERACTIVE
+    assert pregenerator.take() is candidate
+    assert pregenerator.take() is None
+    pregenerator.record(candidate, accepted=True)
+    stats = pregenerator.stats()
+    assert stats["generated"] == stats["offered"] == stats["accepted"] == 1
+    assert stats["hit_rate"] == 1.0
+
+
+def test_a_model_failure_prepares_nothing(handler, make):
+    history(handler, "Run a 5k")
+    pregenerator = make(FakeGenerator(OpenAIError("down", 503)))
+
+    assert pregenerator.pregenerate() is None
+    assert pregenerator.take() is None
+
+
+def test_tasks_are_prepared_once_ahead_of_the_next_alarm(handler, make):
+    history(handler, "Run a 5k")
+    generator = FakeGenerator()
+    due = time.time() + 0.5
+    pregenerator = make(generator, next_due=lambda: due, lead_time=0.3, window=0.0)
+
+    deadline = time.monotonic() + 5
+    while not generator.calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert generator.calls == [("Run a 5k", SCHEDULED)]
+    assert time.time() < due
+    # Waking the loop again for the same alarm prepares nothing new
+    pregenerator.reschedule()
+    time.sleep(0.1)
+    assert len(generator.calls) == 1
+    assert pregenerator.take()["tasks"] == [{"task": "Plan Run a 5k", "completed": False}]
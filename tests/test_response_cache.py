@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+import ai.response_cache
+from ai.response_cache import ResponseCache, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ai.response_cache.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "responses.db")
+
+
+def test_key_ignores_trivial_differences_in_the_goal():
+    assert cache_key("Run a 5k!", "prompt", "gpt-4") == cache_key("  run a 5K ", "prompt", "gpt-4")
+    assert cache_key("run a 5k", "prompt", "gpt-4") != cache_key("run a 10k", "prompt", "gpt-4")
+    assert cache_key("run", "prompt", "gpt-4") != cache_key("run", "prompt", "gpt-4o-mini")
+    assert cache_key("run", "prompt", "gpt-4", temperature=0.7) != cache_key("run", "prompt", "gpt-4")
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    assert cache.get("a") == [1]
+    cache.put("c", [3])
+
+    assert cache.get("b") is None
+    assert cache.get("a") == [1] and cache.get("c") == [3]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_disk_tier_survives_a_restart(path):
+    ResponseCache(path).put("a", {"tasks": ["x"]})
+
+    cache = ResponseCache(path)
+    assert cache.get("a") == {"tasks": ["x"]}
+    assert cache.get("a") == {"tasks": ["x"]}
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["disk_entries"]) == (1, 1, 1)
+
+
+def test_entries_expire_from_both_tiers(path, clock):
+    cache = ResponseCache(path, ttl=60)
+    cache.put("a", [1])
+    clock.now += 61
+
+    assert cache.get("a") is None
+    assert ResponseCache(path, ttl=60).get("a") is None
+    assert cache.stats()["disk_entries"] == 0
+
+
+def test_disk_tier_evicts_the_least_recently_used_past_its_size(path, clock):
+    value = ["x" * 100]
+    cache = ResponseCache(path, max_entries=1, max_disk_bytes=250)
+    cache.put("a", value)
+    clock.now += 1
+    cache.put("b", value)
+    clock.now += 1
+    assert cache.get("a") == value
+    clock.now += 1
+    cache.put("c", value)
+
+    fresh = ResponseCache(path)
+    assert fresh.get("b") is None
+    assert fresh.get("a") == value and fresh.get("c") == value
+
+
+def test_threads_share_the_disk_tier(path):
+    cache = ResponseCache(path, max_entries=1)
+    threads = [threading.Thread(target=cache.put, args=(str(i), [i])) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [ResponseCache(path).get(str(i)) for i in range(8)] == [[i] for i in range(8)]
+    cache.clear()
+    assert ResponseCache(path).get("0") is None
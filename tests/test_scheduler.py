@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+from ai.openai_client import OpenAIError
+from ai.scheduler import SCHEDULED, GenerationScheduler, TokenBucket, generation_priority
+
+
+class FakeClient:
+    """Stands in for OpenAIClient; calls block on `gate` until it is set"""
+
+    model = "fake-model"
+
+    def __init__(self, reply="ok", error=None):
+        self.reply = reply
+        self.error = error
+        self.gate = threading.Event()
+        self.gate.set()
+        self.prompts = []
+
+    def call_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        self.prompts.append(prompt)
+        self.gate.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+    def stream_openai(self, prompt, model=None, max_tokens=500, temperature=0.7, timeout=None):
+        self.prompts.append(prompt)
+        yield from self.reply
+
+
+def start(target, *args):
+    thread = threading.Thread(target=target, args=args)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_token_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, capacity=100)
+    now = bucket.updated
+
+    assert bucket.delay(100, now) == 0
+    bucket.take(100)
+    assert bucket.delay(50, now) == 5.0
+    assert bucket.delay(50, now + 2) == 3.0
+    # More than the bucket holds waits for a full bucket, not forever
+    assert bucket.delay(500, now + 2) == 8.0
+    bucket.give_back(1000)
+    assert bucket.level == 100
+
+
+def test_no_more_than_max_concurrency_calls_run():
+    client = FakeClient()
+    client.gate.clear()
+    scheduler = GenerationScheduler(client, max_concurrency=2)
+    threads = [start(scheduler.call_openai, f"goal {i}") for i in range(3)]
+
+    assert wait_for(lambda: scheduler.stats()["active"] == 2 and scheduler.stats()["queue_depth"] == 1)
+    assert len(client.prompts) == 2
+    client.gate.set()
+    for thread in threads:
+        thread.join()
+    assert scheduler.stats()["admitted"] == 3 and scheduler.stats()["active"] == 0
+
+
+def test_interactive_calls_go_before_scheduled_ones():
+    client = FakeClient()
+    client.gate.clear()
+    scheduler = GenerationScheduler(client, max_concurrency=1)
+
+    def scheduled(prompt):
+        with generation_priority(SCHEDULED):
+            scheduler.call_openai(prompt)
+
+    threads = [start(scheduler.call_openai, "first")]
+    assert wait_for(lambda: scheduler.stats()["active"] == 1)
+    threads.append(start(scheduled, "scheduled"))
+    assert wait_for(lambda: scheduler.stats()["queue_depth"] == 1)
+    threads.append(start(scheduler.call_openai, "interactive"))
+    assert wait_for(lambda: scheduler.stats()["queue_depth"] == 2)
+    client.gate.set()
+    for thread in threads:
+        thread.join()
+
+    assert client.prompts == ["first", "interactive", "scheduled"]
+    assert set(scheduler.stats()["waits"]) == {"interactive", "scheduled"}
+
+
+def test_unused_tokens_are_refunded():
+    # 100 tokens of burst; each call is charged about 90 but uses a handful
+    scheduler = GenerationScheduler(FakeClient(), tokens_per_minute=600)
+    start_time = time.monotonic()
+    for _ in range(3):
+        scheduler.call_openai("goal", max_tokens=85)
+    assert "".join(scheduler.stream_openai("goal", max_tokens=85)) == "ok"
+
+    assert time.monotonic() - start_time < 1.0
+
+
+def test_a_429_pauses_admissions():
+    client = FakeClient(error=OpenAIError("rate limited", 429))
+    scheduler = GenerationScheduler(client, cooldown=0.3)
+    with pytest.raises(OpenAIError):
+        scheduler.call_openai("goal")
+    client.error = None
+
+    start_time = time.monotonic()
+    assert scheduler.call_openai("goal") == "ok"
+    assert time.monotonic() - start_time >= 0.25
+    assert scheduler.stats()["rate_limited"] == 1
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from ai.semantic_cache import CANDIDATES, SemanticGoalIndex, goal_vector, goal_vectors
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+
+TASKS = [{"task": "Run 2 km", "completed": True}, {"task": "Stretch", "completed": False}]
+
+
+def test_vectors_are_unit_length_and_batch_independent():
+    goals = ["Run a 5k", "Read a book", "Learn Spanish"]
+    vectors = goal_vectors(goals)
+
+    assert vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.allclose(vectors[1], goal_vector("read a book!"))
+
+
+def test_a_paraphrase_gets_the_stored_tasks_unchecked():
+    index = SemanticGoalIndex(threshold=0.8)
+    index.add("Run a 5k this weekend", TASKS)
+    index.add("Learn Spanish", [{"task": "Learn 10 words", "completed": False}])
+
+    tasks, similarity, goal = index.lookup("run 5k this weekend")
+
+    assert goal == "Run a 5k this weekend"
+    assert 0.8 <= similarity <= 1.0
+    assert tasks == [{"task": "Run 2 km", "completed": False}, {"task": "Stretch", "completed": False}]
+    assert TASKS[0]["completed"] is True
+
+
+def test_an_unrelated_goal_misses():
+    index = SemanticGoalIndex(threshold=0.8)
+    index.add("Run a 5k this weekend", TASKS)
+
+    assert index.lookup("Read a book") is None
+    assert index.stats()["hits"] == 0 and index.stats()["misses"] == 1
+
+
+def test_repeats_and_empty_task_lists_are_not_indexed():
+    index = SemanticGoalIndex()
+
+    assert index.add("Run a 5k", TASKS)
+    assert not index.add("  run a 5K ", TASKS)
+    assert not index.add("Read a book", [])
+    assert len(index) == 1
+
+
+def test_the_coarse_scan_finds_the_match_among_many_goals():
+    index = SemanticGoalIndex()
+    entries = [{"goal": f"Practice scale number {i} on the piano", "tasks": TASKS} for i in range(CANDIDATES * 20)]
+    entries.append({"goal": "Train for the city marathon in spring", "tasks": TASKS})
+    assert index.add_entries(entries) == len(entries)
+
+    similarity, goal = index.search("train for the spring city marathon")[0]
+
+    assert goal == "Train for the city marathon in spring"
+    assert similarity > 0.8
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = JournalStore(str(tmp_path / "user_data.json"))
+    yield store
+    shared_cache.clear()
+
+
+def test_a_store_is_indexed_in_the_background(store):
+    store.save_goal_and_tasks("2026-10-01", "Run a 5k", TASKS)
+    store.save_goal_and_tasks("2026-10-02", "Read a book", TASKS, user="sam")
+    index = SemanticGoalIndex(store=store)
+    assert not index.ready.is_set()
+
+    index.warm()
+
+    assert index.ready.wait(5)
+    assert len(index) == 2
+    assert index.lookup("read a book")[2] == "Read a book"
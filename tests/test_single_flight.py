@@ -0,0 +1,140 @@
+import threading
+
+import pytest
+
+from ai.fake_server import FakeOpenAIServer
+from ai.openai_client import OpenAIClient
+from ai.single_flight import Flight, SingleFlight
+from tasks.task_generator import TaskGenerator
+
+
+def run_concurrently(flights, key, fn, count):
+    """Call flights.do(key, fn) from `count` threads; returns their results or errors"""
+    outcomes = [None] * count
+
+    def call(i):
+        try:
+            outcomes[i] = flights.do(key, fn)
+        except Exception as e:
+            outcomes[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return ["tasks"]
+
+    threads, outcomes = run_concurrently(flights, "goal", fn, 5)
+    while flights.stats()["leaders"] + flights.stats()["coalesced"] < 5:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert outcomes == [["tasks"]] * 5
+    assert flights.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4, "coalesced_ratio": 0.8}
+
+
+def test_waiters_get_the_leaders_error():
+    flights = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait(5)
+        raise ValueError("model down")
+
+    threads, outcomes = run_concurrently(flights, "goal", fn, 3)
+    while flights.stats()["coalesced"] < 2:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_a_finished_call_is_not_reused():
+    flights = SingleFlight()
+    results = iter([1, 2])
+
+    assert flights.do("goal", lambda: next(results)) == 1
+    assert flights.do("goal", lambda: next(results)) == 2
+    assert flights.stats()["coalesced"] == 0
+
+
+def test_an_interrupted_leader_fails_its_waiters_with_a_plain_error():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def interrupted():
+        started.set()
+        release.wait(5)
+        raise KeyboardInterrupt
+
+    def lead():
+        with pytest.raises(KeyboardInterrupt):
+            flights.do("goal", interrupted)
+
+    thread = threading.Thread(target=lead)
+    thread.start()
+    assert started.wait(5)
+    flight, leader = flights.begin("goal")
+    release.set()
+    thread.join(5)
+
+    assert not leader
+    with pytest.raises(RuntimeError, match="KeyboardInterrupt"):
+        flight.wait(5)
+    # The key was freed; the next caller leads again
+    assert flights.do("goal", lambda: 1) == 1
+
+
+def test_followers_see_items_as_they_are_published():
+    flight = Flight()
+    seen = []
+    published = threading.Event()
+
+    def follow():
+        for item in flight.follow():
+            seen.append(item)
+            published.set()
+
+    thread = threading.Thread(target=follow)
+    thread.start()
+    assert not flight.started(0.01)
+    flight.publish("a")
+    assert published.wait(5) and seen == ["a"]
+    flight.publish("b")
+    flight.finish(["a", "b", "c"])
+    thread.join(5)
+
+    assert seen == ["a", "b", "c"]
+    assert flight.started(0) and flight.wait(0) == ["a", "b", "c"]
+
+
+def test_identical_goals_reach_the_model_once():
+    with FakeOpenAIServer(latency=0.2) as server:
+        generator = TaskGenerator(OpenAIClient("test-key", base_url=server.base_url))
+        results = []
+        threads = [threading.Thread(target=lambda goal=goal: results.append(generator.generate_tasks(goal)))
+                   for goal in ("Run a 5k", "run a 5K ", "Run a 5k")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert server.requests == 1
+    assert len(results) == 3 and results[0] == results[1] == results[2]
+    # Each caller can check off its own copy
+    assert results[0] is not results[1] and results[0][0] is not results[1][0]
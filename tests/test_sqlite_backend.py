@@ -0,0 +1,116 @@
+import json
+import threading
+
+import pytest
+
+from storage.backend import ConflictError
+from storage.data_cache import shared_cache
+from storage.sqlite_backend import SQLiteBackend
+
+DATE = "2026-10-01"
+
+
+def tasks(*names):
+    return [{"task": name, "completed": False} for name in names]
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "user_data.db"))
+    yield backend
+    backend.close()
+    shared_cache.clear()
+
+
+def test_entries_round_trip(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    backend.save_goal_and_tasks("2026-10-02", "read", ["plain", "strings"])
+    backend.save_goal_and_tasks("2026-10-03", "rest", "1. Raw model text")
+
+    assert backend.get_entry(DATE) == {"date": DATE, "goal": "run", "tasks": tasks("a", "b"), "version": 1}
+    assert backend.get_entry("2026-10-02")["tasks"] == ["plain", "strings"]
+    assert backend.get_entry("2026-10-03")["tasks"] == "1. Raw model text"
+    assert backend.get_entry("2026-10-04") is None
+
+
+def test_users_are_kept_apart(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks("a"))
+    backend.save_goal_and_tasks(DATE, "read", tasks("b"), user="sam")
+
+    assert backend.get_entry(DATE)["goal"] == "run"
+    assert backend.get_entry(DATE, user="sam")["goal"] == "read"
+    assert backend.list_users() == ["default", "sam"]
+    assert [e["goal"] for e in backend.load_all("sam")["goals"]] == ["read"]
+
+
+def test_completion_changes_bump_the_version(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks("a", "b", "c"))
+    assert backend.set_task_completed(DATE, 1, True)
+    assert backend.set_tasks_completed(DATE, {0: True, 2: True})
+    assert not backend.set_task_completed(DATE, 5, True)
+
+    entry = backend.get_entry(DATE)
+    assert [task["completed"] for task in entry["tasks"]] == [True, True, True]
+    assert entry["version"] == 3
+
+
+def test_stale_versions_raise_conflict(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks("a"))
+    backend.update_tasks(DATE, tasks("b"), version=1)
+
+    with pytest.raises(ConflictError):
+        backend.update_tasks(DATE, tasks("c"), version=1)
+    with pytest.raises(ConflictError):
+        backend.save_goal_and_tasks(DATE, "walk", tasks("d"), version=1)
+    assert backend.get_entry(DATE)["tasks"] == tasks("b")
+    assert backend.replace_tasks(DATE, tasks("b"), tasks("e"))
+    assert not backend.replace_tasks(DATE, tasks("b"), tasks("f"))
+
+
+def test_history_pages_and_ranges(backend):
+    dates = [f"2026-09-{day:02d}" for day in range(1, 21)]
+    for date in dates:
+        backend.save_goal_and_tasks(date, f"goal {date}", tasks("a"))
+
+    assert [e["date"] for e in backend.get_history(limit=3)] == dates[:-4:-1]
+    assert [e["date"] for e in backend.get_history(limit=3, offset=3)] == dates[-4:-7:-1]
+    assert [e["date"] for e in backend.get_history("2026-09-05", "2026-09-07", newest_first=False)] == dates[4:7]
+    assert backend.count_history() == 20
+    assert backend.count_history(start_date="2026-09-15") == 6
+
+
+def test_racing_writers_lose_no_toggles(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks(*map(str, range(8))))
+    threads = [threading.Thread(target=backend.set_task_completed, args=(DATE, i, True)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    entry = backend.get_entry(DATE)
+    assert all(task["completed"] for task in entry["tasks"])
+    assert entry["version"] == 9
+
+
+def test_tasks_go_with_their_goal(backend):
+    backend.save_goal_and_tasks(DATE, "run", tasks("a", "b"))
+    conn = backend._conn()
+
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.execute("DELETE FROM goals")
+    assert conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] == 0
+
+
+def test_json_data_is_imported_once(tmp_path):
+    data_file = tmp_path / "user_data.json"
+    data_file.write_text(json.dumps({"goals": [{"date": DATE, "goal": "run", "tasks": tasks("a")}]}))
+    db_file = str(tmp_path / "user_data.db")
+
+    backend = SQLiteBackend(db_file, import_from=str(data_file))
+    assert backend.get_entry(DATE)["goal"] == "run"
+    backend.save_goal_and_tasks(DATE, "walk", tasks("b"))
+    backend.close()
+    shared_cache.clear()
+
+    assert SQLiteBackend(db_file, import_from=str(data_file)).get_entry(DATE)["goal"] == "walk"
+    shared_cache.clear()
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from tasks.task_parser import IncrementalTaskParser, parse_list_line, parse_tasks
+
+NAMES = ["Stretch for five minutes", "Drink water", "Walk outside"]
+ITEMS = json.dumps([{"task": name, "completed": False} for name in NAMES], indent=2)
+EXPECTED = [{"task": name, "completed": False} for name in NAMES]
+
+REPLIES = {
+    "json array": ITEMS,
+    "tasks object": json.dumps({"tasks": json.loads(ITEMS)}),
+    "bare strings": json.dumps(NAMES),
+    "json fence": f"```json\n{ITEMS}\n```",
+    "plain fence": f"```\n{ITEMS}\n```",
+    "prose before fence": f"Sure! Here are your tasks:\n\n```json\n{ITEMS}\n```\nGood luck!",
+    "prose before json": f"Here is the plan:\n{ITEMS}",
+    "dash list": "\n".join(f"- {name}" for name in NAMES),
+    "bullet list": "\n".join(f"• {name}" for name in NAMES),
+    "star list": "\n".join(f"* {name}" for name in NAMES),
+    "numbered list": "\n".join(f"{i}. {name}" for i, name in enumerate(NAMES, 1)),
+    "parenthesis list": "\n".join(f"{i}) {name}" for i, name in enumerate(NAMES, 1)),
+    "unspaced list": "\n".join(f"{i}.{name}" for i, name in enumerate(NAMES, 1)),
+    "prose before list": "Try these:\n\n" + "\n".join(f"- {name}" for name in NAMES),
+    "salvaged keys": json.dumps([{"title": NAMES[0]}, {"task": NAMES[1]}, {"name": NAMES[2], "completed": "no"}]),
+}
+
+
+@pytest.mark.parametrize("reply", REPLIES.values(), ids=REPLIES.keys())
+def test_parse_tasks(reply):
+    assert parse_tasks(reply) == EXPECTED
+
+
+@pytest.mark.parametrize("reply", REPLIES.values(), ids=REPLIES.keys())
+def test_incremental_parser_matches_whole_reply(reply):
+    parser = IncrementalTaskParser()
+    streamed = []
+    for i in range(0, len(reply), 5):
+        streamed += parser.feed(reply[i:i + 5])
+    streamed += parser.close()
+
+    assert streamed == EXPECTED
+
+
+def test_incremental_parser_yields_tasks_before_the_reply_ends():
+    reply = f"Sure!\n```json\n{ITEMS}\n```"
+    parser = IncrementalTaskParser()
+    cut = reply.index(NAMES[1])
+
+    assert parser.feed(reply[:cut]) == EXPECTED[:1]
+    assert parser.feed(reply[cut:]) + parser.close() == EXPECTED[1:]
+
+
+def test_bad_items_are_dropped():
+    reply = json.dumps([{"task": NAMES[0]}, {"task": ""}, {"task": {"text": 1}}, {"task": NAMES[1]}])
+    parser = IncrementalTaskParser()
+
+    assert parser.feed(reply) + parser.close() == EXPECTED[:2]
+    assert parser.rejected == 2
+    assert parse_tasks(reply) == EXPECTED[:2]
+
+
+def test_truncated_reply_keeps_complete_items():
+    assert parse_tasks(ITEMS[:ITEMS.index(NAMES[2]) + 5]) == EXPECTED[:2]
+
+
+@pytest.mark.parametrize("line, text", [
+    ("1.5 hours of reading", None),
+    ("Plain prose", None),
+    ("  2) Walk  ", "Walk"),
+    ("-", None),
+])
+def test_parse_list_line(line, text):
+    assert parse_list_line(line) == text
@@ -0,0 +1,100 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from alarm.timer_scheduler import TimerScheduler, next_occurrence, parse_recurrence
+
+# A Friday
+FRIDAY = datetime.datetime(2026, 10, 16, 9, 30)
+
+
+def soon(seconds=0.3):
+    return (datetime.datetime.now() + datetime.timedelta(seconds=seconds)).time()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def fired():
+    return []
+
+
+@pytest.fixture
+def scheduler(fired):
+    lock = threading.Lock()
+
+    def on_fire(alarm):
+        with lock:
+            fired.append((alarm.id, time.time()))
+
+    scheduler = TimerScheduler(on_fire).start()
+    yield scheduler
+    scheduler.stop()
+
+
+def test_recurrence_rules():
+    assert parse_recurrence("daily") == frozenset(range(7))
+    assert parse_recurrence(" Weekends ") == frozenset((5, 6))
+    assert parse_recurrence("mon,Wednesday,fri") == frozenset((0, 2, 4))
+    assert parse_recurrence("once") is None
+    with pytest.raises(ValueError):
+        parse_recurrence("fortnightly")
+
+
+def test_next_occurrence_skips_to_an_allowed_day():
+    seven = datetime.time(7, 0)
+
+    assert next_occurrence(datetime.time(10, 0), None, FRIDAY) == datetime.datetime(2026, 10, 16, 10, 0)
+    assert next_occurrence(seven, None, FRIDAY) == datetime.datetime(2026, 10, 17, 7, 0)
+    assert next_occurrence(seven, parse_recurrence("weekdays"), FRIDAY) == datetime.datetime(2026, 10, 19, 7, 0)
+    assert next_occurrence(seven, parse_recurrence("fri"), FRIDAY) == datetime.datetime(2026, 10, 23, 7, 0)
+
+
+def test_a_daily_alarm_fires_on_time_and_is_rescheduled(scheduler, fired):
+    alarm = scheduler.add(soon())
+    due = alarm.due
+
+    assert wait_for(lambda: fired)
+    assert fired[0][0] == alarm.id
+    assert fired[0][1] >= due
+    assert scheduler.stats()["max_lateness"] < 0.5
+    # The next occurrence is a day later, and this one does not fire again
+    tomorrow = next_occurrence(alarm.time, None, datetime.datetime.fromtimestamp(due)).timestamp()
+    assert alarm.due == scheduler.stats()["next_due"] == tomorrow
+    time.sleep(0.2)
+    assert len(fired) == 1
+
+
+def test_a_one_off_alarm_is_dropped_after_firing(scheduler, fired):
+    alarm = scheduler.add(soon(), user="sam", recurrence="once")
+    assert scheduler.alarms_for("sam") == [alarm]
+
+    assert wait_for(lambda: fired)
+    assert wait_for(lambda: not scheduler.alarms_for("sam"))
+    assert len(scheduler) == 0
+
+
+def test_a_cancelled_alarm_does_not_fire(scheduler, fired):
+    alarm = scheduler.add(soon(0.2))
+    assert not scheduler.cancel(alarm.id, user="someone else")
+
+    assert scheduler.cancel(alarm.id)
+    time.sleep(0.4)
+    assert fired == []
+    assert len(scheduler) == 0
+
+
+def test_an_earlier_alarm_wakes_the_sleeping_loop(scheduler, fired):
+    scheduler.add(soon(30))
+    time.sleep(0.05)
+    alarm = scheduler.add(soon(0.2))
+
+    assert wait_for(lambda: fired, timeout=2)
+    assert fired[0][0] == alarm.id
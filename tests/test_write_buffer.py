@@ -0,0 +1,80 @@
+import pytest
+
+from storage.data_cache import shared_cache
+from storage.journal_store import JournalStore
+from storage.write_buffer import WriteBehindBuffer
+
+DATE = "2026-10-01"
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = JournalStore(str(tmp_path / "user_data.json"))
+    backend.save_goal_and_tasks(DATE, "run", [{"task": str(i), "completed": False} for i in range(4)])
+    backend.writes = []
+    set_tasks_completed = backend.set_tasks_completed
+
+    def record(date, changes, user="default"):
+        backend.writes.append((date, dict(changes)))
+        return set_tasks_completed(date, changes, user)
+
+    monkeypatch.setattr(backend, "set_tasks_completed", record)
+    yield backend
+    shared_cache.clear()
+
+
+def completed(entry):
+    return [task["completed"] for task in entry["tasks"]]
+
+
+def test_toggles_of_a_day_coalesce_into_one_write(backend):
+    buffer = WriteBehindBuffer(backend, delay=60, max_delay=60)
+    buffer.set_task_completed(DATE, 0, True)
+    buffer.set_task_completed(DATE, 1, True)
+    buffer.set_task_completed(DATE, 0, False)
+    buffer.set_task_completed(DATE, 2, True)
+
+    assert backend.writes == []
+    buffer.flush()
+
+    assert backend.writes == [(DATE, {0: False, 1: True, 2: True})]
+    assert completed(backend.get_entry(DATE)) == [False, True, True, False]
+    assert buffer.stats() == {"toggles": 4, "writes": 1, "pending_days": 0}
+
+
+def test_reads_see_pending_toggles(backend):
+    buffer = WriteBehindBuffer(backend, delay=60, max_delay=60)
+    buffer.set_task_completed(DATE, 3, True)
+
+    assert completed(buffer.get_entry(DATE)) == [False, False, False, True]
+    assert completed(buffer.get_history()[0]) == [False, False, False, True]
+    assert backend.writes == []
+
+
+def test_close_flushes_pending_toggles(backend):
+    buffer = WriteBehindBuffer(backend, delay=60, max_delay=60)
+    buffer.set_task_completed(DATE, 1, True)
+    buffer.close()
+
+    assert backend.writes == [(DATE, {1: True})]
+    assert completed(backend.get_entry(DATE)) == [False, True, False, False]
+
+
+def test_other_writes_to_a_day_flush_it_first(backend):
+    buffer = WriteBehindBuffer(backend, delay=60, max_delay=60)
+    buffer.set_task_completed(DATE, 0, True)
+    entry = buffer.get_entry(DATE)
+
+    # The version the caller saw includes the pending toggle
+    buffer.update_tasks(DATE, entry["tasks"] + [{"task": "4", "completed": False}], version=entry["version"])
+
+    assert backend.writes == [(DATE, {0: True})]
+    assert completed(backend.get_entry(DATE)) == [True, False, False, False, False]
+
+
+def test_timer_flushes_after_the_delay(backend):
+    buffer = WriteBehindBuffer(backend, delay=0.01, max_delay=1)
+    buffer.set_task_completed(DATE, 2, True)
+    buffer._timer.join()
+
+    assert backend.writes == [(DATE, {2: True})]